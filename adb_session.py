@@ -0,0 +1,183 @@
+import time
+import socket
+import threading
+import itertools
+
+from link_supervisor import Backoff
+
+
+class ShellResult:
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.output = ""
+        self.exit_code = None
+        self.completed = False
+        self.elapsed = 0.0
+        self.error = None
+
+
+class AdbShellSession:
+    """单设备持久 ADB shell 会话：在一条 shell 连接上流水线执行多条命令
+
+    每条命令后追加 echo 结束标记（含退出码），一次性发送整批命令，再按标记切分输出。
+    连接断开（如执行 reboot）后，下次执行时自动等待设备重新上线并重建会话。
+    device_factory() 返回 adbutils 的设备对象（或接口相同的替身）；wait_device(timeout) 可选，
+    阻塞到设备上线（如 LinkSupervisor.wait_adb），提供时重连不再轮询设备。
+    """
+
+    def __init__(self, device_factory, timeout=30.0, reconnect_timeout=120.0, on_event=None, wait_device=None):
+        self.device_factory = device_factory
+        self.timeout = timeout
+        self.reconnect_timeout = reconnect_timeout
+        self.on_event = on_event
+        self.wait_device = wait_device
+        self._stream = None
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def _open(self):
+        device = self.device_factory()
+        self._stream = device.shell("sh", stream=True)
+        # 合并 stderr，保证错误信息与输出按顺序出现
+        self._stream.conn.sendall(b"exec 2>&1\n")
+
+    def _reopen(self, wait):
+        """重建会话；wait 为真时一直重试到 reconnect_timeout（设备重启中）"""
+        self.close()
+        deadline = time.monotonic() + (self.reconnect_timeout if wait else 0)
+        start = time.monotonic()
+        backoff = Backoff(0.25, 2.0)
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                self._open()
+                if wait:
+                    self._event(f"[ℹ] ADB shell 会话已重连 ({time.monotonic() - start:.1f}s，第 {attempts} 次尝试)")
+                return
+            except Exception:
+                if time.monotonic() >= deadline:
+                    raise
+                if self.wait_device is not None:
+                    self.wait_device(deadline - time.monotonic())
+                time.sleep(min(backoff.next(), max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+            self._stream = None
+
+    def run(self, cmd, timeout=None):
+        return self.run_batch([cmd], timeout)[0]
+
+    def run_batch(self, cmds, timeout=None):
+        """流水线执行一批命令，按顺序返回 ShellResult 列表"""
+        if timeout is None:
+            timeout = self.timeout
+        results = [ShellResult(cmd) for cmd in cmds]
+        with self._lock:
+            todo = list(results)
+            wait = False
+            while todo:
+                if self._stream is None or wait:
+                    self._reopen(wait)
+                todo, wait = self._pipeline(todo, timeout)
+        return results
+
+    def _pipeline(self, todo, timeout):
+        """发送并收取一批命令；返回 (尚未执行的命令, 是否需要等待设备重连)"""
+        markers = []
+        payload = []
+        for result in todo:
+            n = next(self._seq)
+            markers.append(b"__CDT_%d__" % n)
+            # 命令的 stdin 指向 /dev/null，避免吞掉后续命令
+            payload.append(f"{{ {result.cmd}\n}} </dev/null\necho __CDT_''{n}__$?\n")
+        sock = self._stream.conn
+        sock.settimeout(timeout)
+        buf = bytearray()
+        idx = 0
+        last = time.perf_counter()
+        try:
+            sock.sendall("".join(payload).encode())
+            while idx < len(todo):
+                pos = buf.find(markers[idx])
+                if pos >= 0:
+                    nl = buf.find(b"\n", pos)
+                    if nl >= 0:
+                        result = todo[idx]
+                        code = bytes(buf[pos + len(markers[idx]):nl]).strip()
+                        result.output = bytes(buf[:pos]).decode("utf-8", errors="replace").strip()
+                        result.exit_code = int(code) if code.isdigit() else None
+                        result.completed = True
+                        now = time.perf_counter()
+                        result.elapsed = now - last
+                        last = now
+                        del buf[:nl + 1]
+                        idx += 1
+                        continue
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionError("shell 连接已关闭")
+                buf.extend(data)
+        except socket.timeout:
+            # 当前命令卡住：放弃它，重建会话后继续后面的命令
+            result = todo[idx]
+            result.output = bytes(buf).decode("utf-8", errors="replace").strip()
+            result.error = f"超时 {timeout}s"
+            result.elapsed = time.perf_counter() - last
+            self.close()
+            return todo[idx + 1:], False
+        except (OSError, ConnectionError) as e:
+            # 连接断开（通常是 reboot），当前命令视为已发送，等设备回来再执行剩余命令
+            result = todo[idx]
+            result.output = bytes(buf).decode("utf-8", errors="replace").strip()
+            result.error = f"连接断开: {e}"
+            result.elapsed = time.perf_counter() - last
+            self.close()
+            rest = todo[idx + 1:]
+            if rest:
+                self._event("[ℹ] ADB 连接断开，等待设备重新上线...")
+            return rest, bool(rest)
+        return [], False
+
+
+def benchmark_session(device_factory, cmds, rounds=5):
+    """对比逐条 d.shell(cmd) 与持久会话流水线执行同一批命令的耗时（秒）"""
+    device = device_factory()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for cmd in cmds:
+            device.shell(cmd)
+    per_command = (time.perf_counter() - start) / rounds
+
+    session = AdbShellSession(device_factory)
+    session.run("true")  # 建立连接不计入
+    start = time.perf_counter()
+    for _ in range(rounds):
+        session.run_batch(cmds)
+    pipelined = (time.perf_counter() - start) / rounds
+    session.close()
+    return {
+        "commands": len(cmds),
+        "per_command_shell_s": per_command,
+        "session_batch_s": pipelined,
+        "speedup": per_command / pipelined if pipelined else None,
+    }
+
+
+if __name__ == "__main__":
+    from adbutils import adb
+
+    sample = ["getprop ro.build.fingerprint", "getprop ro.product.model", "cat /proc/version",
+              "ls /system", "id", "uptime", "df", "ps -A | head -5"] * 5
+    r = benchmark_session(adb.device, sample)
+    print(f"{r['commands']} 条命令：逐条 shell() {r['per_command_shell_s']:.3f}s，"
+          f"持久会话 {r['session_batch_s']:.3f}s，加速 {r['speedup']:.1f}x")
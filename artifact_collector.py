@@ -0,0 +1,277 @@
+import os
+import time
+import heapq
+import shlex
+import tarfile
+import posixpath
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 设备端列出文件：每行 “大小 路径”，最后一行为 find 的退出码（区分空目录与路径不存在/无权限）
+LIST_CMD = "find {path} -type f -exec stat -c '%s %n' {{}} + 2>/dev/null; echo __CDT_RC__$?"
+LIST_DIR = "/data/local/tmp"
+
+
+class CollectResult:
+    def __init__(self, name, remote):
+        self.name = name
+        self.remote = remote
+        self.files = 0          # 设备端列出的文件数
+        self.size = 0           # 设备端文件总大小
+        self.received = 0       # 实际收到（解包）的文件数；归档模式下等于列出的文件数
+        self.wire_bytes = 0     # 经 ADB 传输的字节数（压缩后）
+        self.streams = 0
+        self.started = None
+        self.finished = None
+        self.output = None      # 本地目录或归档文件
+        self.error = None
+
+    @property
+    def seconds(self):
+        """第一路开始到最后一路结束的耗时"""
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        """传输速率（MB/s，按传输字节计）"""
+        if self.seconds <= 0:
+            return 0.0
+        return self.wire_bytes / self.seconds / (1024 * 1024)
+
+
+class _StreamReader:
+    """把 exec: 套接字包装成 tarfile 可读的文件对象，统计收到的字节数并响应取消"""
+
+    def __init__(self, sock, counter, cancelled):
+        self.sock = sock
+        self.counter = counter
+        self.cancelled = cancelled
+
+    def read(self, size=-1):
+        if self.cancelled():
+            raise RuntimeError("已取消")
+        data = self.sock.recv(size if size and size > 0 else 1024 * 1024)
+        self.counter(len(data))
+        return data
+
+
+def split_groups(files, count):
+    """按大小把 [(大小, 相对路径)] 分成 count 组，各组总量尽量接近（大文件优先放入当前最轻的组）"""
+    heap = [(0, i, []) for i in range(count)]
+    for size, rel in sorted(files, reverse=True):
+        total, i, group = heapq.heappop(heap)
+        group.append(rel)
+        heapq.heappush(heap, (total + size, i, group))
+    return [group for _, _, group in sorted(heap, key=lambda g: g[1]) if group]
+
+
+class ArtifactCollector:
+    """批量拉取设备目录：设备端 tar（可 gzip 压缩）经 exec: 原始流传回，边收边解包（或原样存为 .tar.gz），不落临时文件
+
+    清单中每项为 {"name": 名称, "path": 设备路径}，结果保存在 dest/<名称>/（归档模式为 dest/<名称>.tar.gz）。
+    目录总大小超过 split_bytes 时按文件大小分成最多 streams 组，每组一条 tar 流；所有流共用 streams 个并发。
+    device_factory() 返回 adbutils 的设备对象（或接口相同的替身）。
+    """
+
+    def __init__(self, device_factory, dest, streams=3, split_bytes=16 * 1024 * 1024, compress=True,
+                 mode="extract", timeout=60.0, on_event=None, cancelled=None):
+        self.device_factory = device_factory
+        self.dest = dest
+        self.streams = max(1, int(streams))
+        self.split_bytes = max(1, int(split_bytes))
+        self.compress = compress
+        self.mode = mode
+        self.timeout = timeout
+        self.on_event = on_event
+        self.cancelled = cancelled or (lambda: False)
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def collect(self, manifest):
+        """按清单拉取，返回 CollectResult 列表"""
+        start = time.perf_counter()
+        os.makedirs(self.dest, exist_ok=True)
+        device = self.device_factory()
+        results = []
+        tasks = []
+        listings = []
+        try:
+            for entry in manifest:
+                result = CollectResult(entry["name"], entry["path"])
+                results.append(result)
+                try:
+                    tasks.extend(self._plan(device, result, listings))
+                except Exception as e:
+                    result.error = str(e)
+            with ThreadPoolExecutor(max_workers=self.streams) as pool:
+                for future in [pool.submit(self._run_task, *task) for task in tasks]:
+                    future.result()
+        finally:
+            self._remove_listings(device, listings)
+        self.seconds = time.perf_counter() - start
+        for result in results:
+            self._report(result)
+        return results
+
+    def _remove_listings(self, device, listings):
+        """删除推送到设备上的分组清单：tar 命令结束时会删除自己的清单，任务被跳过或传输失败时在此兜底"""
+        if not listings:
+            return
+        try:
+            device.shell("rm -f " + " ".join(shlex.quote(path) for path in listings), timeout=self.timeout)
+        except Exception as e:
+            self._event(f"[⚠] 删除设备端临时清单失败: {e}")
+
+    def _plan(self, device, result, listings):
+        """列出设备端文件并决定分几路传输，返回 [(result, 设备端基准目录, 成员参数, 清单文件, 序号)]
+
+        推送到设备的清单文件路径追加到 listings，由 collect() 结束时统一清理。
+        """
+        remote = result.remote.rstrip("/") or "/"
+        output = device.shell(LIST_CMD.format(path=shlex.quote(remote)), timeout=self.timeout)
+        files = []
+        rc = None
+        for line in output.splitlines():
+            line = line.strip()
+            if line.startswith("__CDT_RC__"):
+                rc = line[len("__CDT_RC__"):]
+                continue
+            size, _, path = line.partition(" ")
+            if size.isdigit() and path:
+                files.append((int(size), path))
+        if not files:
+            if rc == "0":
+                result.output = "（空目录）"
+                return []
+            raise RuntimeError("路径不存在或无权限读取（需要时先执行 adb root）")
+        if len(files) == 1 and files[0][1] == remote:
+            # 清单项是单个文件
+            base, members = posixpath.dirname(remote) or "/", [posixpath.basename(remote)]
+        else:
+            base, members = remote, None
+        result.files = len(files)
+        result.size = sum(size for size, _ in files)
+        count = min(self.streams, len(files), -(-result.size // self.split_bytes)) if members is None else 1
+        if count <= 1:
+            result.streams = 1
+            return [(result, base, shlex.quote(members[0]) if members else ".", None, 0)]
+        groups = split_groups([(size, posixpath.relpath(path, base)) for size, path in files], count)
+        result.streams = len(groups)
+        if self.mode != "archive":
+            # 多路同时解包到同一目录，先建好所有上级目录，避免并发创建冲突
+            for folder in {posixpath.dirname(rel) for group in groups for rel in group}:
+                os.makedirs(os.path.join(self.dest, result.name, folder), exist_ok=True)
+        self._event(f"[ℹ] {result.name}: {result.files} 个文件 {format_size(result.size)}，分 {len(groups)} 路传输")
+        tasks = []
+        for i, group in enumerate(groups, 1):
+            listing = f"{LIST_DIR}/.cdt_collect_{os.getpid()}_{next(self._seq)}.lst"
+            listings.append(listing)
+            device.sync.push(("\n".join(group) + "\n").encode("utf-8"), listing, mode=0o644)
+            tasks.append((result, base, f"-T {shlex.quote(listing)}", listing, i))
+        return tasks
+
+    def _run_task(self, result, base, members, listing, index):
+        if result.error or self.cancelled():
+            return
+        flags = "-czf" if self.compress else "-cf"
+        cmd = f"cd {shlex.quote(base)} && tar {flags} - {members} 2>/dev/null"
+        if listing:
+            cmd += f"; rm -f {shlex.quote(listing)}"
+        with self._lock:
+            if result.started is None:
+                result.started = time.perf_counter()
+        try:
+            conn = self.device_factory().open_transport()
+            conn.send_command("exec:" + cmd)
+            conn.check_okay()
+            conn.conn.settimeout(self.timeout)
+            try:
+                reader = _StreamReader(conn.conn, lambda n: self._count(result, "wire_bytes", n), self.cancelled)
+                if self.mode == "archive":
+                    self._save_archive(result, reader, index)
+                else:
+                    self._extract(result, reader)
+            finally:
+                conn.close()
+        except Exception as e:
+            with self._lock:
+                result.error = result.error or str(e)
+        with self._lock:
+            result.finished = time.perf_counter()
+
+    def _count(self, result, field, n):
+        with self._lock:
+            setattr(result, field, getattr(result, field) + n)
+
+    def _extract(self, result, reader):
+        folder = os.path.join(self.dest, result.name)
+        result.output = folder
+        with tarfile.open(fileobj=reader, mode="r|gz" if self.compress else "r|") as tar:
+            for member in tar:
+                if not _safe_member(member):
+                    continue
+                if hasattr(tarfile, "data_filter"):
+                    tar.extract(member, folder, filter="data")
+                else:
+                    tar.extract(member, folder)
+                if member.isfile():
+                    self._count(result, "received", 1)
+
+    def _save_archive(self, result, reader, index):
+        suffix = ".tar.gz" if self.compress else ".tar"
+        path = os.path.join(self.dest, f"{result.name}{f'.part{index}' if index else ''}{suffix}")
+        with self._lock:
+            result.output = path if not index else os.path.join(self.dest, f"{result.name}.part*{suffix}")
+        with open(path, "wb") as f:
+            while True:
+                data = reader.read(1024 * 1024)
+                if not data:
+                    break
+                f.write(data)
+        with self._lock:
+            result.received = result.files
+
+    def _report(self, result):
+        if result.error and not result.received:
+            self._event(f"[✗] {result.name} ({result.remote}): {result.error}")
+            return
+        if not result.files:
+            self._event(f"[ℹ] {result.name} ({result.remote}): 空目录")
+            return
+        missing = result.files - result.received
+        mark = "⚠" if result.error or missing else "✓"
+        msg = (f"[{mark}] {result.name}: {result.received}/{result.files} 个文件 {format_size(result.size)}"
+               f"（传输 {format_size(result.wire_bytes)}），{result.streams} 路 {result.seconds:.1f}s，"
+               f"{result.throughput:.1f} MB/s → {result.output}")
+        if result.error:
+            msg += f"；出错: {result.error}"
+        self._event(msg)
+
+
+def format_size(n):
+    return f"{n / (1024 * 1024):.1f} MB" if n >= 1024 * 1024 else f"{n / 1024:.0f} KB"
+
+
+def _safe_member(member):
+    """只解包普通文件与目录，拒绝绝对路径和 .. 逃逸"""
+    name = member.name
+    if name.startswith("/") or ".." in name.split("/"):
+        return False
+    return member.isfile() or member.isdir()
+
+
+def summarize(results, seconds):
+    """seconds 为整次拉取的耗时（各项并发进行，不能简单相加）"""
+    ok = [r for r in results if not r.error and r.received == r.files]
+    wire = sum(r.wire_bytes for r in results)
+    return {"items": len(results), "ok": len(ok), "files": sum(r.received for r in results),
+            "bytes": sum(r.size for r in results), "wire_bytes": wire, "seconds": seconds,
+            "rate_mb_s": wire / seconds / (1024 * 1024) if seconds else 0.0}
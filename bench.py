@@ -0,0 +1,685 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+
+import serial
+
+from debugger_core import DEFAULT_CONFIG, DebugPipeline
+from adb_session import AdbShellSession
+from log_history import LogHistory
+from log_search import LogIndex
+
+EPILOG = """示例：
+  python bench.py                           运行全部场景，结果写入 bench_results/<时间>.json
+  python bench.py --quick                   缩小数据量，快速检查
+  python bench.py --only serial_ingest,gui  只运行指定场景
+  python bench.py --compare bench_results/20240501-120000.json
+
+场景：""" + "、".join(["serial_ingest", "serial_commands", "adb_commands", "memory", "gui", "render",
+                      "serial_replay", "logcat_parser", "trigger_match", "log_search"])
+
+# 各场景的数据量（--quick 使用第二组）
+SIZES = {
+    "full": {"ingest_lines": 200000, "probes": 200, "commands": 200, "memory_rounds": 10,
+             "memory_lines": 100000, "gui_lines": 100000, "gui_probes": 100, "replay_lines": 200000,
+             "logcat_entries": 200000, "trigger_lines": 200000, "search_lines": 500000,
+             "render_lines": 100000, "render_legacy_lines": 2000},
+    "quick": {"ingest_lines": 50000, "probes": 50, "commands": 50, "memory_rounds": 5,
+              "memory_lines": 20000, "gui_lines": 20000, "gui_probes": 30, "replay_lines": 50000,
+              "logcat_entries": 50000, "trigger_lines": 50000, "search_lines": 100000,
+              "render_lines": 20000, "render_legacy_lines": 500},
+}
+
+LINE_BYTES = 100
+RENDER_BATCH = 100   # render 场景每次刷新交给日志窗口的行数
+SERIAL_COMMANDS = ["getprop ro.build.fingerprint", "getprop ro.product.model", "cat /proc/version",
+                   "uptime", "dmesg | tail -20"]
+
+# 替身设备对常见命令的回复，其余命令回复 "<命令>: ok"
+RESPONSES = {
+    "getprop ro.build.fingerprint": "bench/car_fake/car:12/SQ1A/eng.bench:userdebug/test-keys",
+    "getprop ro.product.model": "BenchCar",
+    "cat /proc/version": "Linux version 5.10.110-bench (gcc version 12) #1 SMP PREEMPT",
+    "uptime": " 12:00:00 up 1 min,  0 users,  load average: 0.00, 0.00, 0.00",
+    "dmesg | tail -20": "\n".join(f"[{i:5d}.000000] bench: kernel message {i}" for i in range(20)),
+}
+
+
+def respond(cmd):
+    return RESPONSES.get(cmd, f"{cmd}: ok")
+
+
+def percentiles(values):
+    """秒 → 毫秒的分位数统计"""
+    if not values:
+        return None
+    v = sorted(values)
+
+    def pick(p):
+        return v[min(len(v) - 1, int(len(v) * p))] * 1000
+
+    return {"n": len(v), "p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99), "max_ms": v[-1] * 1000}
+
+
+def data_line(i):
+    return f"D{i:09d} ".encode().ljust(LINE_BYTES - 1, b"x") + b"\n"
+
+
+def probe_line():
+    return f"T{time.perf_counter():.6f} ".encode().ljust(LINE_BYTES - 1, b"x") + b"\n"
+
+
+def probe_latency(line):
+    """探测行自写入到现在经过的秒数（探测行以 T<perf_counter> 开头）"""
+    return time.perf_counter() - float(line[1:].split(" ", 1)[0])
+
+
+class FakeShell:
+    """设备 shell 替身：逐行解释输入并回复
+
+    echo 行按 shell 语义输出（去掉 '' 引号，$? 换成 0）；其它命令等待 latency 秒后输出 respond(cmd)。
+    tty=True 时模拟串口控制台：回显输入、\\r\\n 换行，并在每条命令后输出提示符。
+    """
+
+    PROMPT = b"console:/ # "
+
+    def __init__(self, sock, latency=0.0, tty=False):
+        self.sock = sock
+        self.latency = latency
+        self.tty = tty
+        self.newline = b"\r\n" if tty else b"\n"
+
+    def serve(self):
+        buf = b""
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buf += data
+                *lines, buf = buf.split(b"\n")
+                out = bytearray()
+                for raw in lines:
+                    out += self._handle(raw.decode("utf-8", errors="replace").rstrip("\r"))
+                if out:
+                    self.sock.sendall(out)
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+    def _handle(self, line):
+        out = bytearray()
+        if self.tty:
+            out += line.encode() + self.newline
+        cmd = line.strip()
+        if cmd.startswith("{ "):
+            cmd = cmd[2:]
+        if not cmd or cmd.startswith("}") or cmd in ("exec 2>&1", "\x03"):
+            pass
+        elif cmd.startswith("echo "):
+            out += cmd[5:].replace("''", "").replace("$?", "0").encode() + self.newline
+        else:
+            if self.latency:
+                time.sleep(self.latency)
+            out += respond(cmd).replace("\n", self.newline.decode()).encode() + self.newline
+        if self.tty:
+            out += self.PROMPT
+        return out
+
+
+class FakeConsole:
+    """串口控制台替身：本机 TCP 端口上的 FakeShell，通过 pyserial 的 socket://127.0.0.1:<端口> 连接
+
+    send() 向已连接的客户端直接灌入数据（模拟串口日志输出）。
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(1)
+        self.url = f"socket://127.0.0.1:{self._server.getsockname()[1]}"
+        self._client = None
+        self._connected = threading.Event()
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._serve, name="FakeConsole", daemon=True).start()
+
+    def _serve(self):
+        try:
+            conn, _ = self._server.accept()
+        except OSError:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._client = conn
+        self._connected.set()
+        FakeShell(conn, self.latency, tty=True).serve()
+
+    def send(self, data):
+        if not self._connected.wait(10):
+            raise RuntimeError("串口替身未被连接")
+        with self._send_lock:
+            self._client.sendall(data)
+
+    def close(self):
+        self._server.close()
+        if self._client is not None:
+            try:
+                self._client.close()
+            except OSError:
+                pass
+
+
+class _FakeShellStream:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def close(self):
+        self.conn.close()
+
+
+class FakeAdbDevice:
+    """adbutils 设备替身：shell(cmd) 直接返回输出，shell("sh", stream=True) 返回由 FakeShell 应答的套接字"""
+
+    serial = "bench-0001"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def shell(self, cmd, stream=False, timeout=None):
+        if stream:
+            ours, theirs = socket.socketpair()
+            threading.Thread(target=FakeShell(theirs, self.latency).serve, daemon=True).start()
+            return _FakeShellStream(ours)
+        if self.latency:
+            time.sleep(self.latency)
+        return respond(cmd)
+
+
+def _config(tmp, **overrides):
+    config = dict(DEFAULT_CONFIG)
+    config.update({"log_dir": tmp, "push_cache_file": os.path.join(tmp, "push_cache.json"),
+                   "boot_results_file": os.path.join(tmp, "boot_times.jsonl")})
+    config.update(overrides)
+    return config
+
+
+def _noop(msg):
+    pass
+
+
+def _flood(console, lines, start=0, chunk_lines=500):
+    for i in range(start, start + lines, chunk_lines):
+        console.send(b"".join(data_line(k) for k in range(i, min(i + chunk_lines, start + lines))))
+
+
+def bench_serial_ingest(tmp, size, args):
+    """串口日志吞吐：经 socket:// 向 DebugPipeline 灌入日志（含触发器匹配），另测 loop:// 上的字节到回调延迟"""
+    received = [0]
+    target = [size["ingest_lines"]]
+    latencies = []
+    done = threading.Event()
+
+    def on_line(msg):
+        if msg.startswith("D"):
+            received[0] += 1
+        elif msg.startswith("T"):
+            latencies.append(probe_latency(msg))
+            received[0] += 1
+        else:
+            return
+        if received[0] >= target[0]:
+            done.set()
+
+    console = FakeConsole()
+    pipeline = DebugPipeline(_config(tmp), on_line, _noop)
+    try:
+        if not pipeline.connect_serial(console.url, 921600):
+            raise RuntimeError("无法连接串口替身")
+        start = time.perf_counter()
+        _flood(console, size["ingest_lines"])
+        complete = done.wait(120)
+        seconds = time.perf_counter() - start
+
+        # socket:// 上的延迟（逐行写入，间隔 10ms）
+        done.clear()
+        target[0] = received[0] + size["probes"]
+        for _ in range(size["probes"]):
+            console.send(probe_line())
+            time.sleep(0.01)
+        done.wait(10)
+        socket_latency = percentiles(latencies)
+    finally:
+        pipeline.close()
+        console.close()
+
+    # loop:// 逐字节排队，只用来测延迟（大流量吞吐受 pyserial 自身限制）
+    latencies.clear()
+    received[0] = 0
+    target[0] = size["probes"]
+    done.clear()
+    pipeline = DebugPipeline(_config(tmp), on_line, _noop)
+    try:
+        if not pipeline.connect_serial("loop://", 921600):
+            raise RuntimeError("无法打开 loop://")
+        for _ in range(size["probes"]):
+            pipeline.serial_conn.write(probe_line())
+            time.sleep(0.01)
+        done.wait(10)
+    finally:
+        pipeline.close()
+
+    total_bytes = size["ingest_lines"] * LINE_BYTES
+    return {"lines": size["ingest_lines"], "complete": complete, "seconds": seconds,
+            "lines_per_s": size["ingest_lines"] / seconds, "mb_per_s": total_bytes / seconds / (1024 * 1024),
+            "latency_socket": socket_latency, "latency_loop": percentiles(latencies)}
+
+
+def bench_serial_commands(tmp, size, args):
+    """串口命令往返：socket:// 控制台替身，sentinel 模式逐条执行，另测整步（run_serial_commands）耗时"""
+    console = FakeConsole(latency=args.serial_latency / 1000)
+    pipeline = DebugPipeline(_config(tmp, serial_cmd_mode="sentinel", serial_cmd_timeout=10), _noop, _noop)
+    try:
+        if not pipeline.connect_serial(console.url, 115200):
+            raise RuntimeError("无法连接串口替身")
+        engine = pipeline.serial_engine
+        engine.execute("true")  # 丢弃启动阶段
+        results = [engine.execute(SERIAL_COMMANDS[i % len(SERIAL_COMMANDS)], 5)
+                   for i in range(size["commands"])]
+        text = "\n".join(SERIAL_COMMANDS * max(1, size["commands"] // len(SERIAL_COMMANDS)))
+        start = time.perf_counter()
+        ok = pipeline.run_serial_commands(text)
+        step_seconds = time.perf_counter() - start
+    finally:
+        pipeline.close()
+        console.close()
+    step_commands = len(text.splitlines())
+    return {"commands": len(results), "failed": sum(1 for r in results if not r.completed),
+            "rtt": percentiles([r.elapsed for r in results]), "device_latency_ms": args.serial_latency,
+            "step_commands": step_commands, "step_ok": ok, "step_s": step_seconds,
+            "step_commands_per_s": step_commands / step_seconds}
+
+
+def bench_adb_commands(tmp, size, args):
+    """ADB 命令往返：替身设备上的持久 shell 会话，逐条往返与整步（run_adb_commands，流水线批量）耗时"""
+    device = FakeAdbDevice(latency=args.adb_latency / 1000)
+    pipeline = DebugPipeline(_config(tmp, adb_session=True), _noop, _noop)
+    pipeline.adb_session = AdbShellSession(lambda: device, timeout=10)
+    try:
+        session = pipeline.adb_session
+        session.run("true")  # 建立会话不计入
+        results = [session.run(SERIAL_COMMANDS[i % len(SERIAL_COMMANDS)]) for i in range(size["commands"])]
+        text = "\n".join(SERIAL_COMMANDS * max(1, size["commands"] // len(SERIAL_COMMANDS)))
+        start = time.perf_counter()
+        ok = pipeline.run_adb_commands(text)
+        step_seconds = time.perf_counter() - start
+    finally:
+        pipeline.close()
+    step_commands = len(text.splitlines())
+    return {"commands": len(results), "failed": sum(1 for r in results if not r.completed),
+            "rtt": percentiles([r.elapsed for r in results]), "device_latency_ms": args.adb_latency,
+            "step_commands": step_commands, "step_ok": ok, "step_s": step_seconds,
+            "step_commands_per_s": step_commands / step_seconds}
+
+
+def bench_memory(tmp, size, args):
+    """长时间运行的内存增长：日志经 DebugPipeline → 队列 → LogHistory/LogIndex（与界面相同的消费路径），
+    每轮结束后记录 tracemalloc 统计的 Python 堆占用；第一轮视为预热"""
+    log_queue = queue.Queue()
+    console = FakeConsole()
+    tracemalloc.start()
+    pipeline = DebugPipeline(_config(tmp), log_queue.put, _noop)
+    history = LogHistory(os.path.join(tmp, "bench_serial.history"), ring_size=int(DEFAULT_CONFIG["history_ring_lines"]))
+    index = LogIndex(history)
+    samples = []
+    lines = size["memory_lines"]
+    try:
+        if not pipeline.connect_serial(console.url, 921600):
+            raise RuntimeError("无法连接串口替身")
+        for r in range(size["memory_rounds"]):
+            writer = threading.Thread(target=_flood, args=(console, lines, r * lines), daemon=True)
+            writer.start()
+            got = 0
+            while got < lines:
+                batch = [log_queue.get(timeout=30)]
+                try:
+                    while len(batch) < 20000:
+                        batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    pass
+                got += sum(1 for msg in batch if msg.startswith("D"))
+                history.append(batch)
+            writer.join()
+            index.index_pending()
+            samples.append(tracemalloc.get_traced_memory()[0])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        pipeline.close()
+        console.close()
+        index.close()
+        history.close()
+    growth = (samples[-1] - samples[0]) / (len(samples) - 1) if len(samples) > 1 else 0.0
+    return {"rounds": len(samples), "lines": len(samples) * lines,
+            "samples_mb": [round(s / (1024 * 1024), 2) for s in samples], "peak_mb": peak / (1024 * 1024),
+            "growth_kb_per_100k_lines": growth / 1024 * 100000 / lines}
+
+
+def bench_gui(tmp, size, args):
+    """界面渲染：真实的 CarDebuggerApp 经 socket:// 自动连接串口替身，
+    测量渲染吞吐、字节到屏幕的延迟（写入 → 插入日志窗口后的首个空闲回调）与 Tk 主循环卡顿"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {"skipped": f"无法创建 Tk 窗口（无显示器？）: {e}"}
+    import car_debugger_pro
+
+    console = FakeConsole()
+    cwd = os.getcwd()
+    os.chdir(tmp)  # 配置文件与日志写入临时目录
+    with open("debugger_config.json", "w", encoding="utf-8") as f:
+        json.dump({"serial_port": console.url, "serial_baud": "921600", "log_dir": "logs"}, f)
+    state = {"rendered": 0, "active": False, "done": False, "error": None}
+    latencies = []
+    stalls = []
+    tick = 0.01
+    try:
+        app = car_debugger_pro.CarDebuggerApp(root)
+        append_log = app._append_log
+
+        def measured_append_log(widget, msgs, name):
+            append_log(widget, msgs, name)
+            if name != "serial":
+                return
+            for msg in msgs:
+                if msg.startswith("D"):
+                    state["rendered"] += 1
+                elif msg.startswith("T"):
+                    sent = msg
+                    root.after_idle(lambda m=sent: latencies.append(probe_latency(m)))
+
+        app._append_log = measured_append_log
+        last = [time.perf_counter()]
+
+        def ticker():
+            now = time.perf_counter()
+            if state["active"]:
+                stalls.append(max(0.0, now - last[0] - tick))
+            last[0] = now
+            if state["done"]:
+                root.quit()
+                return
+            root.after(int(tick * 1000), ticker)
+
+        result = {}
+
+        def driver():
+            try:
+                deadline = time.time() + 10
+                while not app.pipeline.serial_running and time.time() < deadline:
+                    time.sleep(0.05)
+                state["active"] = True
+                start = time.perf_counter()
+                _flood(console, size["gui_lines"])
+                deadline = time.time() + 120
+                while state["rendered"] < size["gui_lines"] and time.time() < deadline:
+                    time.sleep(0.01)
+                result["seconds"] = time.perf_counter() - start
+                for _ in range(size["gui_probes"]):
+                    console.send(probe_line())
+                    time.sleep(0.02)
+                deadline = time.time() + 10
+                while len(latencies) < size["gui_probes"] and time.time() < deadline:
+                    time.sleep(0.01)
+            except Exception as e:
+                state["error"] = str(e)
+            state["done"] = True
+
+        root.after(0, ticker)
+        threading.Thread(target=driver, daemon=True).start()
+        root.mainloop()
+        app.on_closing()
+    finally:
+        os.chdir(cwd)
+        console.close()
+    if state["error"]:
+        raise RuntimeError(state["error"])
+    seconds = result.get("seconds", 0.0)
+    stall = percentiles(stalls) or {}
+    stall.update({"over_50ms": sum(1 for s in stalls if s > 0.05), "total_s": sum(stalls)})
+    return {"lines": size["gui_lines"], "rendered": state["rendered"], "seconds": seconds,
+            "lines_per_s": state["rendered"] / seconds if seconds else 0.0,
+            "widget_lines_per_s": app.render_rate("serial"),
+            "latency": percentiles(latencies), "stall": stall,
+            "interactive_ms": app.startup.interactive * 1000 if app.startup.interactive is not None else None}
+
+
+def _legacy_update_log(widget, lines, filepath):
+    """旧版 _update_log：每条消息清空窗口、重新插入最近 500 行并重写文件（仅用于对比）"""
+    import tkinter as tk
+    widget.config(state='normal')
+    widget.delete(1.0, tk.END)
+    content = "\n".join(lines[-500:])
+    widget.insert(tk.END, content)
+    widget.see(tk.END)
+    widget.config(state='disabled')
+    try:
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+    except Exception:
+        pass
+
+
+def bench_render(tmp, size, args):
+    """日志窗口渲染上限（行/秒）：同一个串口日志窗口上，旧版逐条重绘（_update_log）与按批增量追加（_append_log）对比
+
+    每 RENDER_BATCH 行模拟一次队列刷新，之后执行 update_idletasks() 让 Tk 完成重绘。
+    """
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {"skipped": f"无法创建 Tk 窗口（无显示器？）: {e}"}
+    import car_debugger_pro
+
+    cwd = os.getcwd()
+    os.chdir(tmp)
+    with open("debugger_config.json", "w", encoding="utf-8") as f:
+        json.dump({"log_dir": "logs", "auto_connect": False}, f)
+    filler = "x" * (LINE_BYTES - 12)
+    try:
+        app = car_debugger_pro.CarDebuggerApp(root)
+        root.update()
+        widget = app.serial_log
+
+        def run(render, count):
+            lines = [f"D{i:09d} {filler}" for i in range(count)]
+            start = time.perf_counter()
+            for pos in range(0, count, RENDER_BATCH):
+                render(lines[pos:pos + RENDER_BATCH])
+                root.update_idletasks()
+            return count / (time.perf_counter() - start)
+
+        history = []
+        legacy_path = os.path.join(tmp, "legacy_serial.log")
+
+        def legacy(batch):
+            for line in batch:
+                history.append(line)
+                _legacy_update_log(widget, history, legacy_path)
+
+        legacy_rate = run(legacy, size["render_legacy_lines"])
+        app._replace_view(widget, [])
+        batched_rate = run(lambda batch: app._append_log(widget, batch, "serial"), size["render_lines"])
+        app.on_closing()
+    finally:
+        os.chdir(cwd)
+    return {"batch": RENDER_BATCH, "legacy_lines_per_s": legacy_rate, "batched_lines_per_s": batched_rate,
+            "speedup": batched_rate / legacy_rate if legacy_rate else None}
+
+
+def bench_serial_replay(tmp, size, args):
+    """全速回放合成录制文件（切行、解码、触发器与实时串口相同）"""
+    from serial_capture import synthesize, benchmark_replay
+    from trigger_engine import Trigger
+    path = synthesize(os.path.join(tmp, "bench.cdtcap"), size["replay_lines"])
+    return benchmark_replay(path, triggers=[Trigger("panic", "Kernel panic"), Trigger("wd", "watchdog")])
+
+
+def bench_logcat_parser(tmp, size, args):
+    """logcat 二进制流解析与过滤"""
+    from logcat_capture import LogcatFilter, benchmark_parser
+    return {"all": benchmark_parser(size["logcat_entries"]),
+            "tag_filter": benchmark_parser(size["logcat_entries"], log_filter=LogcatFilter(tags="CarService,VehicleHal"))}
+
+
+def bench_trigger_match(tmp, size, args):
+    """200 条签名的触发器匹配"""
+    from trigger_engine import benchmark
+    return benchmark(size["trigger_lines"])
+
+
+def bench_log_search(tmp, size, args):
+    """历史日志建索引与查询"""
+    from log_search import benchmark
+    return benchmark(size["search_lines"], path=os.path.join(tmp, "bench.history"))
+
+
+SCENARIOS = {
+    "serial_ingest": bench_serial_ingest,
+    "serial_commands": bench_serial_commands,
+    "adb_commands": bench_adb_commands,
+    "memory": bench_memory,
+    "gui": bench_gui,
+    "render": bench_render,
+    "serial_replay": bench_serial_replay,
+    "logcat_parser": bench_logcat_parser,
+    "trigger_match": bench_trigger_match,
+    "log_search": bench_log_search,
+}
+
+
+def flatten(data, prefix=""):
+    """嵌套结果 → {"场景.指标": 数值}（只保留数值）"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(name):
+    """1 表示越大越好，-1 表示越小越好，0 表示不判断（计数、参数等）"""
+    last = name.rsplit(".", 1)[-1]
+    if last.endswith(("per_s", "speedup")):
+        return 1
+    if (last == "ms" or last.endswith(("_ms", "_s", "seconds", "_mb", "growth_kb_per_100k_lines"))) \
+            and not last.startswith("device_"):
+        return -1
+    return 0
+
+
+def compare(old, new, threshold=0.1):
+    """逐项对比两次结果，返回输出文本；变差超过 threshold 的指标标为 [⚠]"""
+    a = flatten(old.get("results", {}))
+    b = flatten(new.get("results", {}))
+    rows = [f"对比 {old.get('time', '?')}（{old.get('commit', '?')}） → {new.get('time', '?')}（{new.get('commit', '?')}）"]
+    for name in sorted(set(a) & set(b)):
+        before, after = a[name], b[name]
+        if not before:
+            continue
+        change = (after - before) / abs(before)
+        mark = "[⚠]" if -change * direction(name) > threshold else "   "
+        rows.append(f"{mark} {name:<48} {before:>12.4g} → {after:<12.4g} {change * 100:+7.1f}%")
+    return "\n".join(rows)
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _summary(result):
+    flat = flatten(result)
+    keys = [k for k in flat if k.endswith(("per_s", "p50_ms", "p99_ms", "growth_kb_per_100k_lines", "step_s",
+                                           "index_s", ".ms", "speedup"))]
+    return ", ".join(f"{k}={flat[k]:.4g}" for k in keys[:6])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="车机调试工具性能基准（串口/ADB 替身，无需硬件）",
+                                     epilog=EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="缩小数据量")
+    parser.add_argument("--only", help="逗号分隔的场景名")
+    parser.add_argument("--out", help="结果文件（默认 bench_results/<时间>.json）")
+    parser.add_argument("--compare", metavar="FILE", help="与之前的结果文件对比")
+    parser.add_argument("--serial-latency", type=float, default=0.0, help="串口替身每条命令的模拟耗时（毫秒）")
+    parser.add_argument("--adb-latency", type=float, default=0.0, help="ADB 替身每条命令的模拟耗时（毫秒）")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    size = SIZES["quick" if args.quick else "full"]
+
+    report = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": _commit(), "host": socket.gethostname(),
+              "platform": platform.platform(), "python": platform.python_version(),
+              "pyserial": serial.VERSION, "quick": args.quick, "sizes": size, "results": {}}
+    tmp = tempfile.mkdtemp(prefix="cdt_bench_")
+    failed = False
+    try:
+        for name in names:
+            start = time.perf_counter()
+            try:
+                result = SCENARIOS[name](tmp, size, args)
+            except Exception as e:
+                result = {"error": str(e)}
+                failed = True
+            result["wall_s"] = time.perf_counter() - start
+            report["results"][name] = result
+            if "error" in result:
+                print(f"[✗] {name}: {result['error']}", flush=True)
+            elif "skipped" in result:
+                print(f"[⚠] {name}: {result['skipped']}", flush=True)
+            else:
+                print(f"[✓] {name} ({result['wall_s']:.1f}s): {_summary(result)}", flush=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    out = args.out or os.path.join("bench_results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    directory = os.path.dirname(out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[ℹ] 结果已写入 {out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(json.load(f), report))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
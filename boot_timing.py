@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import time
+import threading
+import statistics
+
+# 固定的计时节点（其余为配置中的串口里程碑）
+REBOOT = "reboot"
+FIRST_SERIAL = "first_serial"
+ADB_OFFLINE = "adb_offline"
+ADB_READY = "adb_ready"
+BOOT_COMPLETED = "boot_completed"
+
+
+class BootTimer:
+    """一次重启的启动计时：以发送重启命令为零点，记录各节点相对耗时（秒）
+
+    串口节点由 feed_serial() 在串口读取线程中记录（首行输出 + 配置的里程碑正则，各取第一次匹配）；
+    ADB 节点由 wait_boot() 记录：设备下线 → 重新上线 → sys.boot_completed=1。
+    传入 tracker（LinkSupervisor，已在跟踪 track-devices）时上下线由推送唤醒，不再轮询 device_list()；
+    未在跟踪时退回按 poll_interval 轮询。sys.boot_completed 只能经 shell 读取，仍按 poll_interval 轮询。
+    """
+
+    def __init__(self, milestones=(), on_event=None, timeout=180.0, poll_interval=0.2):
+        self.milestones = [(m["name"], re.compile(m["pattern"])) for m in milestones]
+        self.on_event = on_event
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.t0 = None
+        self.started_at = None
+        self.marks = {}
+        self.device = None
+        self.ok = False
+        self._lock = threading.Lock()
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def begin(self):
+        """在发送重启命令前调用"""
+        self.t0 = time.time()
+        self.started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.marks = {REBOOT: 0.0}
+
+    def mark(self, name, at=None):
+        with self._lock:
+            if self.t0 is None or name in self.marks:
+                return
+            self.marks[name] = max(0.0, (at or time.time()) - self.t0)
+        self._event(f"[ℹ] 启动计时 {name}: +{self.marks[name]:.2f}s")
+
+    def feed_serial(self, line, received_at):
+        """串口读取线程回调"""
+        if self.t0 is None or received_at < self.t0:
+            return
+        if FIRST_SERIAL not in self.marks:
+            self.mark(FIRST_SERIAL, received_at)
+        for name, pattern in self.milestones:
+            if name not in self.marks and pattern.search(line):
+                self.mark(name, received_at)
+
+    def _online(self, client, tracker=None):
+        if tracker is not None and tracker.adb_tracking:
+            return tracker.adb_devices.get(self.device) == "device"
+        try:
+            return any(d.serial == self.device for d in client.device_list())
+        except Exception:
+            return False
+
+    def _serial_booting(self):
+        """串口已出现配置的启动里程碑，说明设备确实已经重启"""
+        return any(name in self.marks for name, _ in self.milestones)
+
+    def wait_boot(self, client, device_serial, cancelled=None, tracker=None):
+        """阻塞等待设备启动完成（或超时），返回是否完成"""
+        self.device = device_serial
+        deadline = self.t0 + self.timeout
+        cancelled = cancelled or (lambda: False)
+
+        def wait_until(check, tracked=False):
+            while time.time() < deadline and not cancelled():
+                version = tracker.adb_version if tracker is not None else None
+                if check():
+                    return True
+                if tracked and tracker is not None and tracker.adb_tracking:
+                    # 由设备状态变化唤醒；定期醒来检查取消与串口里程碑
+                    tracker.wait_adb_change(version, min(0.5, max(0.0, deadline - time.time())))
+                else:
+                    time.sleep(self.poll_interval)
+            return False
+
+        # 1. 等待设备下线（重启生效）；串口已出现启动里程碑也视为已下线
+        if not wait_until(lambda: not self._online(client, tracker) or self._serial_booting(), tracked=True):
+            if cancelled():
+                self._event("[⚠] 启动计时已取消")
+                return False
+            self._event("[✗] 启动计时：设备未下线，重启命令可能未生效")
+            return False
+        self.mark(ADB_OFFLINE)
+        # 2. 等待设备重新出现在 adb 中
+        if not wait_until(lambda: self._online(client, tracker), tracked=True):
+            if cancelled():
+                self._event("[⚠] 启动计时已取消")
+                return False
+            self._event(f"[✗] 启动计时：{self.timeout:.0f}s 内设备未重新上线")
+            return False
+        self.mark(ADB_READY)
+
+        # 3. 等待 sys.boot_completed=1
+        def completed():
+            try:
+                return client.device(serial=device_serial).shell("getprop sys.boot_completed", timeout=5).strip() == "1"
+            except Exception:
+                return False
+
+        if not wait_until(completed):
+            if cancelled():
+                self._event("[⚠] 启动计时已取消")
+                return False
+            self._event(f"[✗] 启动计时：{self.timeout:.0f}s 内未等到 sys.boot_completed=1")
+            return False
+        self.mark(BOOT_COMPLETED)
+        self.ok = True
+        return True
+
+    def record(self):
+        return {"time": self.started_at, "device": self.device, "ok": self.ok,
+                "marks": {k: round(v, 3) for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])}}
+
+    def save(self, path):
+        """把本次结果追加到结果文件（每行一条 JSON），返回与历史结果的对比说明"""
+        record = self.record()
+        return compare(record, append_result(path, record))
+
+
+def append_result(path, record):
+    """把一条结果追加到结果文件（每行一条 JSON），返回追加之前的全部结果（启动计时与启动剖析共用）"""
+    previous = load_results(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return previous
+
+
+def trend(value, history, window=10, scale=1, unit="s", digits=2):
+    """本次数值与上一次、最近 window 次中位数的对比说明；history 为按时间顺序的历史数值，为空时返回空串"""
+    history = history[-window:]
+    if not history:
+        return ""
+    return (f"较上次 {(value - history[-1]) * scale:+.{digits}f}{unit}，"
+            f"最近 {len(history)} 次中位数 {statistics.median(history) * scale:.{digits}f}{unit}")
+
+
+def load_results(path):
+    results = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    continue
+    return results
+
+
+def compare(record, previous, window=10):
+    """本次启动总耗时与上一次、最近 window 次中位数的对比"""
+    total = record["marks"].get(BOOT_COMPLETED)
+    if total is None:
+        return "启动未完成"
+    history = [r["marks"][BOOT_COMPLETED] for r in previous
+               if r.get("ok") and BOOT_COMPLETED in r.get("marks", {})]
+    text = f"启动完成 {total:.2f}s"
+    change = trend(total, history, window)
+    return f"{text}，{change}" if change else text
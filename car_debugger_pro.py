@@ -1,18 +1,32 @@
+import time
+
+# 尽早记录启动时间，启动剖析从这里开始计时
+_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
-import threading
-import time
 import os
-import json
-import serial
-from adbutils import adb
-import subprocess
+import re
 import queue  # 用于线程间通信
+import threading
+from log_writer import LogWriter
+from log_history import LogHistory, session_path, remove_stale
+from log_search import LogIndex, LogQuery, parse_time
+from debugger_core import DebugPipeline, load_config, save_config, push_pairs
+from logcat_capture import format_stats as format_logcat_stats
+from job_scheduler import STATE_LABELS, RUNNING
+from startup_profile import StartupProfile
+
+MAX_VIEW_LINES = 500        # 日志窗口最多保留的行数
+MAX_LINES_PER_TICK = 20000  # 每次刷新最多处理的消息数
+HEARTBEAT_MS = 100          # 主循环卡顿检测间隔
+HISTORY_PAGE_LINES = 500    # 历史回看窗口每页行数
 
 
 class CarDebuggerApp:
-    def __init__(self, root):
+    def __init__(self, root, startup=None):
         self.root = root
+        self.startup = startup or StartupProfile()
         self.root.title("车机自动化调试工具 - Windows命令版 v1.1")
         # 获取屏幕的高度
         screen_height = self.root.winfo_screenheight()
@@ -22,12 +36,20 @@ class CarDebuggerApp:
         app_height = screen_height - 50 
         self.root.geometry(f"1300x{app_height}")
 
-        self.serial_conn = None
-        self.serial_thread = None
-        self.serial_running = False
-        self.serial_log_path = "serial.log"
-        self.adb_log_path = "adb.log"
+        self.serial_log_name = "serial.log"
+        self.adb_log_name = "adb.log"
         self.config_file = "debugger_config.json"
+        # 日志窗口统计：收到的行数、渲染的行数/耗时，用于计算每秒可渲染行数
+        self.render_stats = {
+            "serial": {"received": 0, "lines": 0, "seconds": 0.0},
+            "adb": {"received": 0, "lines": 0, "seconds": 0.0},
+        }
+        # 日志窗口的实时过滤条件（None 表示显示全部）
+        self.view_filters = {"serial": None, "adb": None}
+        self.search_bars = {}
+        # 后台检索：进行中的查询（新查询使旧结果作废），结果经队列回到主线程
+        self.search_pending = {"serial": None, "adb": None}
+        self.search_queue = queue.Queue()
 
         # 线程安全队列
         self.serial_queue = queue.Queue()  # 串口数据队列
@@ -35,69 +57,120 @@ class CarDebuggerApp:
 
         # 加载配置
         self.config = self.load_config()
+        self.startup.mark("config")
+        # 串口/ADB 步骤逻辑（与命令行入口共用），日志经队列回到主线程
+        self.pipeline = DebugPipeline(self.config, self.serial_queue.put, self.adb_queue.put)
+
+        # 后台日志写入线程（追加写入 log_dir，按大小轮转）
+        self.serial_writer = self.create_log_writer(self.serial_log_name, self.serial_queue)
+        self.adb_writer = self.create_log_writer(self.adb_log_name, self.adb_queue)
+        self.startup.mark("pipeline")
 
         self.create_ui()
+        self.startup.mark("ui")
         self.clear_logs()
+        self.startup.mark("history")
+        self.register_metrics()
+        self.pipeline.start_metrics_export()
 
         # 启动队列检查循环（主线程定期刷新UI）
         self.check_serial_queue()
         self.check_adb_queue()
+        self.update_logcat_status()
+        self.update_job_view()
+        self.update_broker_status()
+        self.update_metrics_status()
+        self._heartbeat_due = time.perf_counter() + HEARTBEAT_MS / 1000
+        self.root.after(HEARTBEAT_MS, self.heartbeat)
+        # 主循环首次空闲后再连接设备，窗口不等串口/ADB
+        self.root.after_idle(self.on_startup_idle)
 
     def load_config(self):
         """加载上次的配置"""
-        default_config = {
-            "serial_port": "COM3",
-            "serial_baud": "115200",
-            "file1_path": "",
-            "file1_target": "/data/local/tmp/",
-            "file2_path": "",
-            "file2_target": "/data/local/tmp/",
-            "log_dir": "./logs/",
-            "step1_cmd": "getprop\nls /system\n",
-            "step2_cmd": "getprop ro.build.fingerprint\ngetprop ro.product.model\n",
-            "step3_cmd": "reboot\n",
-            "step4_cmd": "cat /proc/version\ngetprop ro.build.fingerprint\n",
-            "step5_cmd": "dmesg | tail -20\nlogread | tail -20\n",
-            "step6_cmd": "adb pull /sdcard/test1114phone5.txt .\nadb logcat -d > logcat.txt\n"
-        }
-        
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    saved = json.load(f)
-                    default_config.update(saved)
-                    return default_config
-            except:
-                pass
-        return default_config
+        return load_config(self.config_file)
 
     def save_config(self):
         """保存当前配置"""
-        config = {
-            "serial_port": self.config["serial_port"],
-            "serial_baud": self.config["serial_baud"],
-            "file1_path": self.config["file1_path"],
-            "file1_target": self.config["file1_target"],
-            "file2_path": self.config["file2_path"],
-            "file2_target": self.config["file2_target"],
-            "log_dir": self.config["log_dir"],
+        config = dict(self.config)
+        config.update({
             "step1_cmd": self.step1_cmd_text.get("1.0", tk.END),
             "step2_cmd": self.step2_cmd_text.get("1.0", tk.END),
             "step3_cmd": self.step3_cmd_text.get("1.0", tk.END),
             "step4_cmd": self.step4_cmd_text.get("1.0", tk.END),
             "step5_cmd": self.step5_cmd_text.get("1.0", tk.END),
-            "step6_cmd": self.step6_cmd_text.get("1.0", tk.END)
-        }
-        
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-        except:
-            pass
+            "step6_cmd": self.step6_cmd_text.get("1.0", tk.END),
+            "push_list": self.push_list_text.get("1.0", tk.END),
+            "pool_mode": self.pool_mode.get(),
+            "pool_serial_ports": self.pool_ports_entry.get().strip(),
+            "pool_workers": self.pool_workers_entry.get().strip(),
+            "logcat_tags": self.logcat_tags_entry.get().strip(),
+            "logcat_priority": self.logcat_priority.get(),
+            "logcat_pids": self.logcat_pids_entry.get().strip(),
+            "boot_timing": self.boot_timing.get(),
+            "boot_chain_steps": self.boot_chain_entry.get().strip(),
+            "serial_capture": self.serial_capture.get(),
+            "broker_enabled": self.broker_enabled.get(),
+            "broker_port": self.broker_port_entry.get().strip()
+        })
+        save_config(self.config_file, config)
+
+    def create_log_writer(self, name, log_queue):
+        return LogWriter(
+            self.config["log_dir"], name,
+            max_bytes=int(self.config["log_max_bytes"]),
+            backup_count=int(self.config["log_backup_count"]),
+            flush_bytes=int(self.config["log_flush_bytes"]),
+            flush_interval=float(self.config["log_flush_interval"]),
+            compress=bool(self.config["log_compress"]),
+            on_error=log_queue.put,
+        ).start()
+
+    def register_metrics(self):
+        """界面侧指标：日志队列深度、收到/渲染的行数、日志写入与丢弃的行数"""
+        m = self.pipeline.metrics
+        for name, log_queue, writer in (("serial", self.serial_queue, self.serial_writer),
+                                        ("adb", self.adb_queue, self.adb_writer)):
+            stats = self.render_stats[name]
+            m.sample(f'cdt_log_queue_depth{{log="{name}"}}', log_queue.qsize)
+            m.sample(f'cdt_log_received_lines_total{{log="{name}"}}', lambda s=stats: s["received"], "counter")
+            m.sample(f'cdt_log_rendered_lines_total{{log="{name}"}}', lambda s=stats: s["lines"], "counter")
+            m.sample(f'cdt_log_written_lines_total{{log="{name}"}}', lambda w=writer: w.lines_written, "counter")
+            m.sample(f'cdt_log_dropped_lines_total{{log="{name}"}}', lambda w=writer: w.dropped_lines, "counter")
+            m.sample(f'cdt_log_writer_backlog{{log="{name}"}}', writer.backlog)
+        m.sample("cdt_startup_interactive_seconds", lambda: self.startup.interactive)
+        m.describe("cdt_ui_render_seconds", "Time spent appending one batch to a log widget")
+        m.describe("cdt_ui_stall_seconds", "Tk main loop lateness measured by a periodic heartbeat")
+
+    def heartbeat(self):
+        """主循环卡顿：定时回调实际执行时间比预定晚多少"""
+        now = time.perf_counter()
+        self.pipeline.metrics.observe("cdt_ui_stall_seconds", max(0.0, now - self._heartbeat_due))
+        self._heartbeat_due = now + HEARTBEAT_MS / 1000
+        self.root.after(HEARTBEAT_MS, self.heartbeat)
+
+    def update_metrics_status(self):
+        """每秒刷新性能指标栏"""
+        self.metrics_status.config(text=self.pipeline.metrics_status())
+        self.root.after(1000, self.update_metrics_status)
 
     def clear_logs(self):
-        self.serial_lines = []
-        self.adb_lines = []
+        """开始新的日志历史：内存只保留最近若干行，其余写入 log_dir 下本次会话的段文件（关闭时删除，并清理异常退出遗留的段文件），并在后台建立搜索索引"""
+        for index in (getattr(self, "serial_index", None), getattr(self, "adb_index", None)):
+            if index is not None:
+                index.close()
+        for history in (getattr(self, "serial_lines", None), getattr(self, "adb_lines", None)):
+            if history is not None:
+                history.close()
+        ring = int(self.config["history_ring_lines"])
+        max_bytes = int(self.config["history_max_bytes"])
+        log_dir = self.config["log_dir"]
+        for name in ("serial", "adb"):
+            if os.path.isdir(log_dir):
+                remove_stale(log_dir, name)
+        self.serial_lines = LogHistory(session_path(log_dir, "serial"), ring_size=ring, max_bytes=max_bytes)
+        self.adb_lines = LogHistory(session_path(log_dir, "adb"), ring_size=ring, max_bytes=max_bytes)
+        self.serial_index = LogIndex(self.serial_lines).start()
+        self.adb_index = LogIndex(self.adb_lines).start()
 
     def create_ui(self):
         # 顶部：双日志窗口（横向并列）
@@ -106,16 +179,82 @@ class CarDebuggerApp:
 
         # 串口日志
         serial_frame = ttk.LabelFrame(log_pane, text="串口日志 (UART) - 实时滚动", padding=5)
+        self.create_search_bar(serial_frame, "serial")
         self.serial_log = scrolledtext.ScrolledText(serial_frame, height=10, state='disabled', wrap=tk.WORD)
         self.serial_log.pack(fill="both", expand=True)
+        ttk.Button(serial_frame, text="历史回看",
+                   command=lambda: self.open_history_viewer(self.serial_lines, "串口历史日志")).pack(anchor="e", pady=(5, 0))
         log_pane.add(serial_frame, weight=1)
 
         # ADB 日志
         adb_frame = ttk.LabelFrame(log_pane, text="ADB 日志 - 实时滚动", padding=5)
+        self.create_search_bar(adb_frame, "adb")
         self.adb_log = scrolledtext.ScrolledText(adb_frame, height=10, state='disabled', wrap=tk.WORD)
         self.adb_log.pack(fill="both", expand=True)
+        ttk.Button(adb_frame, text="历史回看",
+                   command=lambda: self.open_history_viewer(self.adb_lines, "ADB 历史日志")).pack(anchor="e", pady=(5, 0))
         log_pane.add(adb_frame, weight=1)
 
+        # 多设备并行：勾选后各步骤分发到所有 ADB 设备 / 串口列表
+        pool_bar = ttk.Frame(self.root)
+        pool_bar.pack(fill="x", padx=10, pady=(0, 5))
+        self.pool_mode = tk.BooleanVar(value=bool(self.config["pool_mode"]))
+        ttk.Checkbutton(pool_bar, text="多设备并行（所有 ADB 设备 + 串口列表）", variable=self.pool_mode).pack(side="left")
+        ttk.Label(pool_bar, text="串口列表(逗号分隔):").pack(side="left", padx=(15, 5))
+        self.pool_ports_entry = ttk.Entry(pool_bar, width=40)
+        self.pool_ports_entry.insert(0, self.config["pool_serial_ports"])
+        self.pool_ports_entry.pack(side="left")
+        ttk.Label(pool_bar, text="并发数:").pack(side="left", padx=(15, 5))
+        self.pool_workers_entry = ttk.Entry(pool_bar, width=5)
+        self.pool_workers_entry.insert(0, str(self.config["pool_workers"]))
+        self.pool_workers_entry.pack(side="left")
+        # 启动计时：步骤 3 重启后记录各阶段耗时，启动完成后自动执行指定步骤
+        self.boot_timing = tk.BooleanVar(value=bool(self.config["boot_timing"]))
+        ttk.Checkbutton(pool_bar, text="启动计时", variable=self.boot_timing).pack(side="left", padx=(30, 0))
+        ttk.Label(pool_bar, text="启动完成后执行步骤:").pack(side="left", padx=(15, 5))
+        self.boot_chain_entry = ttk.Entry(pool_bar, width=8)
+        self.boot_chain_entry.insert(0, str(self.config["boot_chain_steps"]))
+        self.boot_chain_entry.pack(side="left")
+
+        # logcat 持续抓取：过滤后写入 log_dir/logcat.log（轮转时 gzip 压缩）
+        logcat_bar = ttk.Frame(self.root)
+        logcat_bar.pack(fill="x", padx=10, pady=(0, 5))
+        self.logcat_btn = ttk.Button(logcat_bar, text="开始抓取 logcat", width=16, command=self.toggle_logcat)
+        self.logcat_btn.pack(side="left")
+        ttk.Label(logcat_bar, text="标签(逗号分隔，-排除):").pack(side="left", padx=(15, 5))
+        self.logcat_tags_entry = ttk.Entry(logcat_bar, width=30)
+        self.logcat_tags_entry.insert(0, self.config["logcat_tags"])
+        self.logcat_tags_entry.pack(side="left")
+        ttk.Label(logcat_bar, text="最低级别:").pack(side="left", padx=(15, 5))
+        self.logcat_priority = ttk.Combobox(logcat_bar, values=["V", "D", "I", "W", "E", "F"], width=3, state="readonly")
+        self.logcat_priority.set(self.config["logcat_priority"])
+        self.logcat_priority.pack(side="left")
+        ttk.Label(logcat_bar, text="PID:").pack(side="left", padx=(15, 5))
+        self.logcat_pids_entry = ttk.Entry(logcat_bar, width=12)
+        self.logcat_pids_entry.insert(0, self.config["logcat_pids"])
+        self.logcat_pids_entry.pack(side="left")
+        self.logcat_status = ttk.Label(logcat_bar, text="logcat: 未抓取")
+        self.logcat_status.pack(side="left", padx=(15, 0))
+
+        # 性能指标：吞吐、队列深度、丢弃行数、命令延迟与主循环卡顿（可按 metrics_* 配置导出）
+        self.metrics_status = ttk.Label(self.root, text="", anchor="w")
+        self.metrics_status.pack(fill="x", padx=10, pady=(0, 5))
+
+        # 任务队列：同一串口/设备上的步骤排队依次执行，可取消排队中或运行中的任务
+        job_frame = ttk.LabelFrame(self.root, text="任务队列", padding=5)
+        job_frame.pack(fill="x", padx=10, pady=(0, 5))
+        columns = ("id", "name", "resources", "state", "wait", "run")
+        self.job_tree = ttk.Treeview(job_frame, columns=columns, show="headings", height=4)
+        for col, title, width in zip(columns, ("#", "任务", "资源", "状态", "排队", "耗时"), (40, 320, 100, 70, 70, 70)):
+            self.job_tree.heading(col, text=title)
+            self.job_tree.column(col, width=width, stretch=(col == "name"), anchor="w" if col == "name" else "center")
+        self.job_tree.pack(side="left", fill="x", expand=True)
+        job_buttons = ttk.Frame(job_frame)
+        job_buttons.pack(side="left", padx=(10, 0))
+        ttk.Button(job_buttons, text="取消所选", command=self.cancel_selected_jobs).pack(fill="x")
+        ttk.Button(job_buttons, text="全部取消", command=lambda: self.pipeline.jobs.cancel_all()).pack(fill="x", pady=(5, 0))
+        self.job_view_version = -1
+
         # 中间：双列步骤布局
         main_pane = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
         main_pane.pack(fill="both", expand=True, padx=10, pady=(0, 10))
@@ -131,13 +270,15 @@ class CarDebuggerApp:
             [],
             self.config["step2_cmd"],
             self.run_step2,
-            height=3)
+            height=3,
+            stop_callback=self.cancel_adb_commands)
         # 步骤3: 上传文件+重启
         self.create_step_in_column(left_frame, 3, "上传文件并重启车机",
             [("文件1 - 本地路径:", self.config["file1_path"]), ("目标路径1:", self.config["file1_target"]),
              ("文件2 - 本地路径:", self.config["file2_path"]), ("目标路径2:", self.config["file2_target"])],
             self.config["step3_cmd"],
-            self.run_step3)
+            self.run_step3,
+            file_list=self.config["push_list"])
         main_pane.add(left_frame, weight=1)
 
         # 右列：步骤4-5-6
@@ -157,23 +298,141 @@ class CarDebuggerApp:
             [],
             self.config["step6_cmd"],
             self.run_step6,
-            height=10)
+            height=10,
+            stop_callback=self.cancel_adb_commands)
         main_pane.add(right_frame, weight=1)
 
-        # 启动时自动连接
-        self.root.after(100, self.auto_connect)
+    def on_startup_idle(self):
+        """主循环首次空闲（界面已可交互）：记录启动耗时，然后在后台自动连接"""
+        if not self.config["auto_connect"]:
+            self.startup.expect = tuple(n for n in self.startup.expect if n != "serial")
+        finished = self.startup.mark_interactive()
+        self.auto_connect()
+        if finished:
+            self.save_startup_profile()
 
     def auto_connect(self):
-        """启动时自动连接串口"""
+        """启动时自动连接串口并发现 ADB 设备：都在后台任务中执行（打开不存在或被占用的串口可能阻塞数秒），
+        结果经日志队列回到主线程"""
+        if self.config["auto_connect"]:
+            self.pipeline.submit("自动连接串口", lambda: self._startup_task(
+                "serial", lambda: self.pipeline.connect_serial(auto=True)), ("serial",))
+        self.pipeline.submit("ADB 设备发现", lambda: self._startup_task("adb", self.pipeline.discover_devices), ())
+
+    def _startup_task(self, name, func):
+        try:
+            return func()
+        finally:
+            if self.startup.mark_background(name):
+                self.save_startup_profile()
+
+    def save_startup_profile(self):
+        """启动剖析追加到 log_dir 下的 startup_results_file，并在串口日志中报告（可在任意线程调用）"""
+        path = os.path.join(self.config["log_dir"], self.config["startup_results_file"])
         try:
-            port = self.config["serial_port"]
-            baud = int(self.config["serial_baud"])
-            self.serial_conn = serial.Serial(port, baud, timeout=1)
-            self.serial_queue.put(f"[✓] 自动连接串口 {port} @ {baud}")
-            self.start_serial_monitor()
-            self.serial_queue.put("[ℹ] 串口实时监控已启动")
+            summary = self.startup.save(path)
         except Exception as e:
-            self.serial_queue.put(f"[⚠] 自动连接串口失败: {e}")
+            summary = f"保存失败: {e}"
+        self.serial_queue.put(f"[ℹ] {self.startup.report()}" + (f"；{summary}" if summary else ""))
+
+    def create_search_bar(self, parent, name):
+        """日志窗口上方的查询栏：子串/正则、大小写、到达时间范围；过滤后窗口只显示匹配行（含新日志）"""
+        bar = ttk.Frame(parent)
+        bar.pack(fill="x", pady=(0, 5))
+        widgets = {"regex": tk.BooleanVar(value=False), "case": tk.BooleanVar(value=False)}
+        widgets["text"] = ttk.Entry(bar, width=24)
+        widgets["text"].pack(side="left")
+        widgets["text"].bind("<Return>", lambda e: self.apply_view_filter(name))
+        ttk.Checkbutton(bar, text="正则", variable=widgets["regex"]).pack(side="left", padx=(5, 0))
+        ttk.Checkbutton(bar, text="大小写", variable=widgets["case"]).pack(side="left")
+        ttk.Label(bar, text="从").pack(side="left", padx=(5, 2))
+        widgets["since"] = ttk.Entry(bar, width=9)
+        widgets["since"].pack(side="left")
+        ttk.Label(bar, text="到").pack(side="left", padx=(5, 2))
+        widgets["until"] = ttk.Entry(bar, width=9)
+        widgets["until"].pack(side="left")
+        ttk.Button(bar, text="过滤", width=5, command=lambda: self.apply_view_filter(name)).pack(side="left", padx=(5, 0))
+        ttk.Button(bar, text="清除", width=5, command=lambda: self.clear_view_filter(name)).pack(side="left")
+        widgets["status"] = ttk.Label(bar, text="")
+        widgets["status"].pack(side="left", padx=(5, 0))
+        self.search_bars[name] = widgets
+
+    def _log_target(self, name):
+        if name == "serial":
+            return self.serial_log, self.serial_lines, self.serial_index
+        return self.adb_log, self.adb_lines, self.adb_index
+
+    def _replace_view(self, widget, lines):
+        widget.config(state='normal')
+        widget.delete("1.0", tk.END)
+        widget.insert(tk.END, "\n".join(lines))
+        widget.see(tk.END)
+        widget.config(state='disabled')
+
+    def apply_view_filter(self, name):
+        """按查询条件过滤：在后台线程用索引检索全部历史中最近的匹配行，之后新日志只显示匹配的行"""
+        widgets = self.search_bars[name]
+        try:
+            query = LogQuery(widgets["text"].get(), regex=widgets["regex"].get(), case=widgets["case"].get(),
+                             since=parse_time(widgets["since"].get()), until=parse_time(widgets["until"].get()))
+        except (re.error, ValueError) as e:
+            widgets["status"].config(text=f"查询无效: {e}")
+            return
+        if query.pattern is None and query.since is None and query.until is None:
+            self.clear_view_filter(name)
+            return
+        widget, history, index = self._log_target(name)
+        polling = any(q is not None for q in self.search_pending.values())
+        self.search_pending[name] = query
+        self.view_filters[name] = query
+        widgets["status"].config(text="检索中...")
+        # 没有索引命中时需要扫描整段历史，放到后台线程，界面不卡顿
+        threading.Thread(target=lambda: self.search_queue.put(
+            (name, query, index.search(query, limit=MAX_VIEW_LINES, newest_first=True))),
+            name="LogSearch", daemon=True).start()
+        if not polling:
+            self.root.after(50, self.check_search_queue)
+
+    def check_search_queue(self):
+        """主线程显示后台检索结果（有检索进行中时每 50ms 检查一次）"""
+        try:
+            while True:
+                self._show_search_result(*self.search_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if any(q is not None for q in self.search_pending.values()):
+            self.root.after(50, self.check_search_queue)
+
+    def _show_search_result(self, name, query, result):
+        if self.search_pending[name] is not query:
+            return  # 已被更新的查询或“清除”取代
+        self.search_pending[name] = None
+        widget, history, index = self._log_target(name)
+        lines = [line for _, line in result.lines]
+        # 检索期间到达的新行不在结果中，补上其中匹配的行
+        now = time.time()
+        lines += [line for line in history.get_lines(result.end, len(history) - result.end)
+                  if query.match_line(line, now)]
+        self._replace_view(widget, lines[-MAX_VIEW_LINES:])
+        more = "+" if result.truncated else ""
+        self.search_bars[name]["status"].config(
+            text=f"匹配 {len(result.lines)}{more} 行 · 扫描 {result.scanned_blocks}/"
+                 f"{result.total_blocks} 块 · {result.seconds * 1000:.0f} ms")
+
+    def clear_view_filter(self, name):
+        self.search_pending[name] = None
+        self.view_filters[name] = None
+        widget, history, index = self._log_target(name)
+        self._replace_view(widget, history.tail(MAX_VIEW_LINES))
+        self.search_bars[name]["status"].config(text="")
+
+    def _filter_view(self, name, msgs):
+        """过滤模式下只把匹配的新行交给日志窗口（历史与日志文件仍记录全部内容）"""
+        query = self.view_filters[name]
+        if query is None:
+            return msgs
+        now = time.time()
+        return [line for msg in msgs for line in msg.split("\n") if query.match_line(line, now)]
 
     def create_step_with_serial_params(self, parent, step_num, title, placeholder, callback):
         frame = ttk.LabelFrame(parent, text=f"步骤 {step_num}: {title}", padding=10)
@@ -192,6 +451,29 @@ class CarDebuggerApp:
         self.serial_baud_entry.insert(0, self.config["serial_baud"])
         self.serial_baud_entry.pack(side="left", padx=(5, 0))
 
+        # 原始串口录制 / 回放：录制文件保存在 log_dir/captures/，回放经与实时串口相同的处理流程
+        self.serial_capture = tk.BooleanVar(value=bool(self.config["serial_capture"]))
+        ttk.Checkbutton(params_frame, text="录制原始串口", variable=self.serial_capture,
+                        command=self._sync_capture_config).pack(side="left", padx=(20, 0))
+        ttk.Button(params_frame, text="回放...", command=self.replay_capture).pack(side="left", padx=(15, 5))
+        ttk.Label(params_frame, text="速度:").pack(side="left")
+        self.replay_speed = ttk.Combobox(params_frame, values=["1", "10", "全速"], width=5)
+        speed = float(self.config["replay_speed"])
+        self.replay_speed.set("全速" if speed <= 0 else f"{speed:g}")
+        self.replay_speed.pack(side="left", padx=(5, 0))
+
+        # 串口共享：其他工具/同事通过 socket://<主机>:<端口> 同时查看并按行写入
+        broker_frame = ttk.Frame(frame)
+        broker_frame.pack(fill="x", pady=2)
+        self.broker_enabled = tk.BooleanVar(value=bool(self.config["broker_enabled"]))
+        ttk.Checkbutton(broker_frame, text="共享串口，TCP 端口:", variable=self.broker_enabled,
+                        command=self.toggle_broker).pack(side="left")
+        self.broker_port_entry = ttk.Entry(broker_frame, width=7)
+        self.broker_port_entry.insert(0, str(self.config["broker_port"]))
+        self.broker_port_entry.pack(side="left", padx=(5, 0))
+        self.broker_status = ttk.Label(broker_frame, text="")
+        self.broker_status.pack(side="left", padx=(15, 0))
+
         cmd_label = ttk.Label(frame, text="命令区域（每行一条命令）:")
         cmd_label.pack(anchor="w", pady=(10, 2))
         cmd_text = scrolledtext.ScrolledText(frame, height=5, wrap=tk.WORD)
@@ -200,7 +482,7 @@ class CarDebuggerApp:
 
         self.step1_cmd_text = cmd_text
 
-        btn = ttk.Button(frame, text="执行", command=lambda: self.run_in_thread(lambda: callback([self.serial_port_entry, self.serial_baud_entry], cmd_text)))
+        btn = ttk.Button(frame, text="执行", command=lambda: self.submit_step(step_num, callback, [self.serial_port_entry, self.serial_baud_entry], cmd_text))
         btn.pack(side="right")
         return frame
 
@@ -222,12 +504,13 @@ class CarDebuggerApp:
         interrupt_btn = ttk.Button(button_frame, text="中断log", command=self.send_interrupt_to_serial)
         interrupt_btn.pack(side="right", padx=(5, 0))
         
-        exec_btn = ttk.Button(button_frame, text="执行", command=lambda: self.run_in_thread(lambda: callback([], cmd_text)))
+        exec_btn = ttk.Button(button_frame, text="执行", command=lambda: self.submit_step(step_num, callback, [], cmd_text))
         exec_btn.pack(side="right")
         
         return frame
 
-    def create_step_in_column(self, parent, step_num, title, fields, placeholder, callback, height=5):
+    def create_step_in_column(self, parent, step_num, title, fields, placeholder, callback, height=5, stop_callback=None,
+                              file_list=None):
         frame = ttk.LabelFrame(parent, text=f"步骤 {step_num}: {title}", padding=10)
         frame.pack(fill="x", pady=5)
 
@@ -246,6 +529,12 @@ class CarDebuggerApp:
                                  command=lambda e=entry: self.select_file_to_entry(e))
                 btn.pack(side="right", padx=(5, 0))
 
+        if file_list is not None:
+            ttk.Label(frame, text="更多文件（每行：本地路径 => 目标路径）:").pack(anchor="w", pady=(10, 2))
+            self.push_list_text = scrolledtext.ScrolledText(frame, height=3, wrap=tk.NONE)
+            self.push_list_text.insert("1.0", file_list.strip())
+            self.push_list_text.pack(fill="x")
+
         cmd_text = None
         if placeholder:
             cmd_label = ttk.Label(frame, text="命令区域（每行一条命令）:")
@@ -261,10 +550,53 @@ class CarDebuggerApp:
         elif step_num == 5: self.step5_cmd_text = cmd_text
         elif step_num == 6: self.step6_cmd_text = cmd_text
 
-        btn = ttk.Button(frame, text="执行", command=lambda: self.run_in_thread(lambda: callback(entries, cmd_text)))
+        if stop_callback:
+            stop_btn = ttk.Button(frame, text="停止", command=stop_callback)
+            stop_btn.pack(side="right", padx=(5, 0))
+        if step_num == 6:
+            ttk.Button(frame, text="批量拉取日志", command=self.collect_artifacts).pack(side="left")
+
+        btn = ttk.Button(frame, text="执行", command=lambda: self.submit_step(step_num, callback, entries, cmd_text))
         btn.pack(side="right")
         return frame
 
+    def _sync_capture_config(self):
+        self.config["serial_capture"] = self.serial_capture.get()
+
+    def toggle_broker(self):
+        enabled = self.broker_enabled.get()
+        port = self.broker_port_entry.get().strip()
+        if enabled and not port.isdigit():
+            self.log_serial(f"[✗] 无效的共享端口: {port}")
+            self.broker_enabled.set(False)
+            return
+        if enabled:
+            self.config["broker_port"] = int(port)
+        self.pipeline.submit("开启串口共享" if enabled else "关闭串口共享",
+                             lambda: self.pipeline.set_broker(enabled), ("serial",))
+
+    def update_broker_status(self):
+        """每秒刷新串口共享的客户端数与积压"""
+        self.broker_status.config(text=self.pipeline.broker_status() or "")
+        self.root.after(1000, self.update_broker_status)
+
+    def replay_capture(self):
+        path = filedialog.askopenfilename(
+            title="选择串口录制文件",
+            initialdir=os.path.join(self.config["log_dir"], "captures"),
+            filetypes=[("串口录制", "*.cdtcap"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        text = self.replay_speed.get().strip()
+        try:
+            speed = 0.0 if text in ("全速", "0") else float(text)
+        except ValueError:
+            self.log_serial(f"[✗] 无效的回放速度: {text}")
+            return
+        self.config["replay_speed"] = speed
+        self.pipeline.submit(f"回放 {os.path.basename(path)}", lambda: self.pipeline.connect_replay(path, speed), ("serial",))
+
     def select_file_to_entry(self, entry):
         path = filedialog.askopenfilename(
             title="选择文件",
@@ -277,292 +609,247 @@ class CarDebuggerApp:
     # 安全的日志更新方法
     def log_serial(self, msg):
         """仅由主线程调用！"""
-        self.serial_lines.append(msg)
-        self._update_log(self.serial_log, self.serial_lines, self.serial_log_path)
+        self.log_serial_batch([msg])
 
     def log_adb(self, msg):
         """仅由主线程调用！"""
-        self.adb_lines.append(msg)
-        self._update_log(self.adb_log, self.adb_lines, self.adb_log_path)
-
-    def _update_log(self, widget, lines, filepath):
+        self.log_adb_batch([msg])
+
+    def log_serial_batch(self, msgs):
+        """仅由主线程调用！一次追加一批串口日志"""
+        self.render_stats["serial"]["received"] += len(msgs)
+        self.serial_lines.append(msgs)
+        self._append_log(self.serial_log, self._filter_view("serial", msgs), "serial")
+        self.serial_writer.write_lines(msgs)
+
+    def log_adb_batch(self, msgs):
+        """仅由主线程调用！一次追加一批ADB日志"""
+        self.render_stats["adb"]["received"] += len(msgs)
+        self.adb_lines.append(msgs)
+        self._append_log(self.adb_log, self._filter_view("adb", msgs), "adb")
+        self.adb_writer.write_lines(msgs)
+
+    def _append_log(self, widget, msgs, name):
+        """增量渲染：整批追加一次，只裁剪顶部溢出行，仅在用户位于底部时自动滚动"""
+        if not msgs:
+            return
+        start = time.perf_counter()
+        # 插入前判断是否停留在底部，用户向上翻看时不打扰
+        at_bottom = widget.yview()[1] >= 0.999
         widget.config(state='normal')
-        widget.delete(1.0, tk.END)
-        content = "\n".join(lines[-500:])
-        widget.insert(tk.END, content)
-        widget.see(tk.END)
+        prefix = "\n" if widget.index("end-1c") != "1.0" else ""
+        widget.insert(tk.END, prefix + "\n".join(msgs))
+        total = int(widget.index("end-1c").split(".")[0])
+        overflow = total - MAX_VIEW_LINES
+        if overflow > 0:
+            widget.delete("1.0", f"{overflow + 1}.0")
+        if at_bottom:
+            widget.see(tk.END)
         widget.config(state='disabled')
+        elapsed = time.perf_counter() - start
+        stats = self.render_stats[name]
+        stats["lines"] += len(msgs)
+        stats["seconds"] += elapsed
+        self.pipeline.metrics.observe(f'cdt_ui_render_seconds{{log="{name}"}}', elapsed)
+
+    def open_history_viewer(self, history, title):
+        """历史日志回看窗口：按页经 mmap 读取，不把全部历史载入内存"""
+        win = tk.Toplevel(self.root)
+        win.title(title)
+        win.geometry("1000x600")
+
+        bar = ttk.Frame(win, padding=5)
+        bar.pack(fill="x", side="bottom")
+        text = scrolledtext.ScrolledText(win, state='disabled', wrap=tk.NONE)
+        text.pack(fill="both", expand=True)
+
+        info = ttk.Label(bar, width=36)
+        current = [0]
+
+        def show(start):
+            total = len(history)
+            start = max(history.first_line, min(int(start), total - HISTORY_PAGE_LINES))
+            lines = history.get_lines(start, HISTORY_PAGE_LINES)
+            current[0] = start
+            text.config(state='normal')
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, "\n".join(lines))
+            text.config(state='disabled')
+            info.config(text=f"第 {start + 1}-{start + len(lines)} 行 / 共 {total} 行")
+
+        def jump(start):
+            scale.config(from_=history.first_line, to=max(history.first_line, len(history) - 1))
+            scale.set(start)
+            show(start)
+
+        scale = ttk.Scale(bar, from_=0, to=max(0, len(history) - 1), orient=tk.HORIZONTAL,
+                          command=lambda v: show(float(v)))
+        ttk.Button(bar, text="最早", command=lambda: jump(history.first_line)).pack(side="left")
+        ttk.Button(bar, text="上一页", command=lambda: jump(current[0] - HISTORY_PAGE_LINES)).pack(side="left")
+        ttk.Button(bar, text="下一页", command=lambda: jump(current[0] + HISTORY_PAGE_LINES)).pack(side="left")
+        ttk.Button(bar, text="最新", command=lambda: jump(len(history))).pack(side="left")
+        info.pack(side="right")
+        scale.pack(side="left", fill="x", expand=True, padx=10)
+        jump(len(history))
+
+    def render_rate(self, name):
+        """返回日志窗口的渲染上限（行/秒），用于衡量主线程吞吐"""
+        stats = self.render_stats[name]
+        if stats["seconds"] <= 0:
+            return 0.0
+        return stats["lines"] / stats["seconds"]
+
+    def _drain_queue(self, q):
+        """一次取出队列中积压的消息（单次上限 MAX_LINES_PER_TICK，防止主线程卡死）"""
+        batch = []
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-        except:
+            while len(batch) < MAX_LINES_PER_TICK:
+                batch.append(q.get_nowait())
+        except queue.Empty:
             pass
+        return batch
 
     # 队列检查循环（主线程）
     def check_serial_queue(self):
         """主线程定期检查串口队列"""
-        try:
-            while True:
-                msg = self.serial_queue.get_nowait()
-                self.log_serial(msg)
-        except queue.Empty:
-            pass
+        batch = self._drain_queue(self.serial_queue)
+        if batch:
+            self.log_serial_batch(batch)
         self.root.after(50, self.check_serial_queue)  # 每50ms检查一次
 
     def check_adb_queue(self):
         """主线程定期检查ADB队列"""
-        try:
-            while True:
-                msg = self.adb_queue.get_nowait()
-                self.log_adb(msg)
-        except queue.Empty:
-            pass
+        batch = self._drain_queue(self.adb_queue)
+        if batch:
+            self.log_adb_batch(batch)
         self.root.after(50, self.check_adb_queue)
 
-    def run_in_thread(self, func):
-        t = threading.Thread(target=func, daemon=True)
-        t.start()
-
-    # 实时串口日志监控（线程安全）
-    def start_serial_monitor(self):
-        if self.serial_conn and not self.serial_running:
-            self.serial_running = True
-            self.serial_thread = threading.Thread(target=self._monitor_serial, daemon=True)
-            self.serial_thread.start()
-
-    def stop_serial_monitor(self):
-        self.serial_running = False
-
-    def _monitor_serial(self):
-        """改进的串口监控线程，增加超时和状态检查"""
-        buffer = ""
-        while self.serial_running and self.serial_conn and self.serial_conn.is_open:
-            try:
-                # 非阻塞检查，避免设备重启时阻塞
-                if self.serial_conn.in_waiting > 0:
-                    data = self.serial_conn.read(self.serial_conn.in_waiting).decode('utf-8', errors='ignore')
-                    buffer += data
-                    lines = buffer.split('\n')
-                    buffer = lines[-1]
-                    for line in lines[:-1]:
-                        self.serial_queue.put(line)
-                # 短暂休眠，降低CPU占用并允许线程响应退出信号
-                time.sleep(0.05)
-            except serial.SerialException as e:
-                self.serial_queue.put(f"[⚠] 串口通信错误: {e}")
-                # 设备可能已断开，尝试重新连接
-                self._reconnect_serial()
-                break
-            except Exception as e:
-                self.serial_queue.put(f"[⚠] 监控错误: {e}")
-                time.sleep(1)  # 出错后稍等再继续
-        self.serial_running = False
-
-    def _reconnect_serial(self):
-        """串口断开后的重连逻辑"""
-        if not self.serial_running:
-            return
-            
-        self.serial_queue.put("[ℹ] 尝试重新连接串口...")
+    def submit_step(self, step_num, callback, entries, cmd_text):
+        """在主线程读取界面输入，把步骤交给调度器排队执行（同一串口/设备上的步骤依次执行）"""
         try:
-            if self.serial_conn and self.serial_conn.is_open:
-                self.serial_conn.close()
-                
-            # 使用当前配置重新连接
-            port = self.config["serial_port"]
-            baud = int(self.config["serial_baud"])
-            self.serial_conn = serial.Serial(port, baud, timeout=1)
-            self.serial_queue.put(f"[✓] 重新连接串口 {port} @ {baud} 成功")
-            self.start_serial_monitor()
-        except Exception as e:
-            self.serial_queue.put(f"[✗] 重新连接失败: {e}")
-            # 5秒后再次尝试
-            threading.Timer(5, self._reconnect_serial).start()
+            work = callback(entries, cmd_text)
+        except ValueError as e:
+            self.log_serial(f"[✗] 参数错误: {e}")
+            return
+        self.pipeline.submit_step(step_num, work)
+
+    def cancel_selected_jobs(self):
+        for item in self.job_tree.selection():
+            self.pipeline.jobs.cancel(int(item))
+
+    def update_job_view(self):
+        """刷新任务队列（状态有变化或有任务在运行时）"""
+        jobs = self.pipeline.jobs.jobs()
+        version = self.pipeline.jobs.version
+        if version != self.job_view_version or any(j.state == RUNNING for j in jobs):
+            self.job_view_version = version
+            selected = set(self.job_tree.selection())
+            self.job_tree.delete(*self.job_tree.get_children())
+            # 最新的任务在最上面
+            for job in reversed(jobs):
+                run = "" if job.run_s is None else f"{job.run_s:.1f}s"
+                self.job_tree.insert("", tk.END, iid=str(job.id), values=(
+                    job.id, job.name, ",".join(job.resources), STATE_LABELS[job.state], f"{job.wait_s:.1f}s", run))
+            self.job_tree.selection_set([iid for iid in selected if self.job_tree.exists(iid)])
+        self.root.after(500, self.update_job_view)
 
     def send_interrupt_to_serial(self):
-        if self.serial_conn and self.serial_conn.is_open:
-            self.serial_conn.write(b'\x03')
-            self.serial_queue.put("[✓] 已发送中断信号 (Ctrl+C)")
-        else:
-            self.serial_queue.put("[✗] 串口未连接，无法发送中断")
-
-    # 步骤逻辑（ADB部分也使用队列）
-    def run_step1(self, entries, cmd_text):
-        port = entries[0].get().strip()
-        baud = int(entries[1].get().strip())
-        self.config["serial_port"] = port
-        self.config["serial_baud"] = str(baud)
-        self.save_config()
-
-        try:
-            if self.serial_conn:
-                self.stop_serial_monitor()
-                self.serial_conn.close()
-            
-            self.serial_conn = serial.Serial(port, baud, timeout=1)
-            self.serial_queue.put(f"[✓] 连接串口 {port} @ {baud}")
-            self.start_serial_monitor()
-        except Exception as e:
-            self.serial_queue.put(f"[✗] 串口连接失败: {e}")
+        self.pipeline.send_interrupt()
+
+    def cancel_adb_commands(self):
+        """停止按钮：取消排队与运行中的 ADB 任务（终止本地命令，跳过剩余命令）"""
+        if not self.pipeline.jobs.cancel_all("adb"):
+            self.pipeline.cancel_adb_commands()
+
+    def toggle_logcat(self):
+        """开始/停止 logcat 抓取（过滤条件在开始时读取）"""
+        if self.pipeline.logcat_stats():
+            self.pipeline.submit("停止 logcat", self.pipeline.stop_logcat, ("logcat",))
+            self.logcat_btn.config(text="开始抓取 logcat")
             return
+        self.config["logcat_tags"] = self.logcat_tags_entry.get().strip()
+        self.config["logcat_priority"] = self.logcat_priority.get()
+        self.config["logcat_pids"] = self.logcat_pids_entry.get().strip()
+        self.logcat_btn.config(text="停止抓取 logcat")
+        self.pipeline.submit("开始 logcat", self.pipeline.start_logcat, ("logcat",))
+
+    def update_logcat_status(self):
+        """每秒刷新 logcat 吞吐量"""
+        stats = self.pipeline.logcat_stats()
+        self.logcat_status.config(text=format_logcat_stats(stats) if stats else "logcat: 未抓取")
+        self.root.after(1000, self.update_logcat_status)
+
+    # 步骤逻辑：读取界面输入后交给 DebugPipeline（日志均经队列回到主线程）
+    def _sync_pool_config(self):
+        self.config["pool_mode"] = self.pool_mode.get()
+        self.config["pool_serial_ports"] = self.pool_ports_entry.get().strip()
+        self.config["pool_workers"] = self.pool_workers_entry.get().strip() or 8
 
-        cmds = cmd_text.get("1.0", tk.END).strip().splitlines()
-        for cmd in cmds:
-            cmd = cmd.strip()
-            if not cmd or cmd.startswith("#"): continue
-            try:
-                self.serial_conn.write((cmd + "\n").encode())
-                # 使用分段读取代替一次性读取，避免长时间阻塞
-                start_time = time.time()
-                response = ""
-                while time.time() - start_time < 2:  # 2秒超时
-                    if self.serial_conn.in_waiting > 0:
-                        response += self.serial_conn.read(self.serial_conn.in_waiting).decode(errors='ignore')
-                    time.sleep(0.1)
-                    
-                self.serial_queue.put(f"$ {cmd}")
-                if response.strip():
-                    self.serial_queue.put(response.strip())
-            except Exception as e:
-                self.serial_queue.put(f"[✗] 串口命令 '{cmd}' 失败: {e}")
+    def run_step1(self, entries, cmd_text):
+        self._sync_pool_config()
+        if not self.config["pool_mode"]:
+            port = entries[0].get().strip()
+            baud = int(entries[1].get().strip())
+            self.config["serial_port"] = port
+            self.config["serial_baud"] = str(baud)
+            self.save_config()
+        text = cmd_text.get("1.0", tk.END)
+        return lambda: self.pipeline.step1(text)
 
     def run_step2(self, entries, cmd_text):
-        cmds = cmd_text.get("1.0", tk.END).strip().splitlines()
-        try:
-            d = adb.device()
-            for cmd in cmds:
-                cmd = cmd.strip()
-                if not cmd or cmd.startswith("#"): continue
-                
-                if cmd.startswith("adb "):
-                    result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-                    self.adb_queue.put(f"[ADB TOOL] {cmd}")
-                    self.adb_queue.put(result.stdout + result.stderr)
-                else:
-                    out = d.shell(cmd).strip()
-                    self.adb_queue.put(f"$ {cmd}")
-                    self.adb_queue.put(out if out else "(无输出)")
-        except Exception as e:
-            self.adb_queue.put(f"[✗] 命令失败: {e}")
+        self._sync_pool_config()
+        text = cmd_text.get("1.0", tk.END)
+        return lambda: self.pipeline.step2(text)
 
     def run_step3(self, entries, cmd_text):
+        self._sync_pool_config()
         self.config["file1_path"] = entries[0].get().strip()
         self.config["file1_target"] = entries[1].get().strip()
         self.config["file2_path"] = entries[2].get().strip()
         self.config["file2_target"] = entries[3].get().strip()
+        self.config["push_list"] = self.push_list_text.get("1.0", tk.END)
+        # 启动完成后自动执行的步骤使用界面上当前的命令
+        self.config["boot_timing"] = self.boot_timing.get()
+        self.config["boot_chain_steps"] = self.boot_chain_entry.get().strip()
+        for n in range(1, 7):
+            self.config[f"step{n}_cmd"] = getattr(self, f"step{n}_cmd_text").get("1.0", tk.END)
         self.save_config()
-
-        paths = [
-            (entries[0].get().strip(), entries[1].get().strip()),
-            (entries[2].get().strip(), entries[3].get().strip())
-        ]
-        try:
-            d = adb.device()
-            for local, remote in paths:
-                if local and remote:
-                    if not os.path.isfile(local):
-                        self.adb_queue.put(f"[⚠] 文件不存在，跳过: {local}")
-                        continue
-                    d.push(local, remote)
-                    self.adb_queue.put(f"[✓] 推送: {local} → {remote}")
-        except Exception as e:
-            self.adb_queue.put(f"[✗] ADB 上传失败: {e}")
-            return
-
-        reboot_cmds = cmd_text.get("1.0", tk.END).strip().splitlines()
-        for cmd in reboot_cmds:
-            cmd = cmd.strip()
-            if not cmd or cmd.startswith("#"): continue
-            try:
-                d.shell(cmd)
-                self.adb_queue.put(f"$ {cmd} → 已发送")
-                # 重启命令后短暂休眠，避免连续发送
-                time.sleep(1)
-            except Exception as e:
-                self.adb_queue.put(f"[✗] 重启命令 '{cmd}' 失败: {e}")
+        pairs = push_pairs(self.config)
+        text = cmd_text.get("1.0", tk.END)
+        return lambda: self.pipeline.step3(pairs, text)
 
     def run_step4(self, entries, cmd_text):
-        if not (self.serial_conn and self.serial_conn.is_open):
-            self.serial_queue.put("[✗] 串口未连接")
-            return
-
-        cmds = cmd_text.get("1.0", tk.END).strip().splitlines()
-        for cmd in cmds:
-            cmd = cmd.strip()
-            if not cmd or cmd.startswith("#"): continue
-            try:
-                self.serial_conn.write((cmd + "\n").encode())
-                # 带超时的响应读取
-                start_time = time.time()
-                response = ""
-                while time.time() - start_time < 2:  # 2秒超时
-                    if self.serial_conn.in_waiting > 0:
-                        response += self.serial_conn.read(self.serial_conn.in_waiting).decode(errors='ignore')
-                    time.sleep(0.1)
-                    
-                self.serial_queue.put(f"$ {cmd}")
-                if response.strip():
-                    self.serial_queue.put(response.strip())
-            except Exception as e:
-                self.serial_queue.put(f"[✗] 串口命令失败: {e}")
+        self._sync_pool_config()
+        text = cmd_text.get("1.0", tk.END)
+        return lambda: self.pipeline.step4(text)
 
     def run_step5(self, entries, cmd_text):
-        if not (self.serial_conn and self.serial_conn.is_open):
-            self.serial_queue.put("[✗] 串口未连接")
-            return
-
-        cmds = cmd_text.get("1.0", tk.END).strip().splitlines()
-        for cmd in cmds:
-            cmd = cmd.strip()
-            if not cmd or cmd.startswith("#"): continue
-            try:
-                self.serial_conn.write((cmd + "\n").encode())
-                # 带超时的响应读取
-                start_time = time.time()
-                response = ""
-                while time.time() - start_time < 2:  # 2秒超时
-                    if self.serial_conn.in_waiting > 0:
-                        response += self.serial_conn.read(self.serial_conn.in_waiting).decode(errors='ignore')
-                    time.sleep(0.1)
-                    
-                self.serial_queue.put(f"$ {cmd}")
-                if response.strip():
-                    self.serial_queue.put(response.strip())
-            except Exception as e:
-                self.serial_queue.put(f"[✗] 串口命令失败: {e}")
+        return self.run_step4(entries, cmd_text)
 
     def run_step6(self, entries, cmd_text):
-        cmds = cmd_text.get("1.0", tk.END).strip().splitlines()
-        try:
-            d = adb.device()
-            for cmd in cmds:
-                cmd = cmd.strip()
-                if not cmd or cmd.startswith("#"): continue
-                
-                if cmd.startswith("adb "):
-                    result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-                    self.adb_queue.put(f"[ADB TOOL] {cmd}")
-                    self.adb_queue.put(result.stdout + result.stderr)
-                else:
-                    out = d.shell(cmd).strip()
-                    self.adb_queue.put(f"$ {cmd}")
-                    self.adb_queue.put(out if out else "(无输出)")
-        except Exception as e:
-            self.adb_queue.put(f"[✗] 命令失败: {e}")
+        return self.run_step2(entries, cmd_text)
+
+    def collect_artifacts(self):
+        """按 collect_manifest 批量拉取 tombstones/anr/log 等目录"""
+        self.pipeline.submit("批量拉取日志", self.pipeline.collect_artifacts, ("adb",), unique=True)
 
     def on_closing(self):
-        self.stop_serial_monitor()
-        if self.serial_conn:
-            try:
-                self.serial_conn.close()
-            except:
-                pass
+        self.pipeline.close()
         self.save_config()
+        self.serial_writer.close()
+        self.adb_writer.close()
+        self.serial_index.close()
+        self.adb_index.close()
+        self.serial_lines.close()
+        self.adb_lines.close()
         self.root.destroy()
 
 
 if __name__ == "__main__":
+    startup = StartupProfile(_START)
+    startup.mark("imports")
     root = tk.Tk()
-    app = CarDebuggerApp(root)
+    startup.mark("window")
+    app = CarDebuggerApp(root, startup)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
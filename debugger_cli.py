@@ -0,0 +1,223 @@
+import time
+
+# 尽早记录启动时间，--startup-time 用来衡量导入开销
+_START = time.perf_counter()
+
+import sys
+import argparse
+import threading
+
+from log_writer import LogWriter
+from debugger_core import DebugPipeline, STEP_NAMES, load_config, parse_script
+from startup_profile import StartupProfile
+
+
+EPILOG = """示例：
+  python debugger_cli.py --steps 1,2
+  python debugger_cli.py --script smoke.txt --log-dir ./ci_logs
+  python debugger_cli.py --steps 4 --port /dev/ttyUSB0 --baud 921600
+  python debugger_cli.py --replay logs/captures/serial_20240501-143000.cdtcap --replay-speed 0
+  python debugger_cli.py --port COM3 --broker 7000      （共享串口，直到 Ctrl+C）
+  python debugger_cli.py --collect tombstones,anr
+  python debugger_cli.py --steps 1-6 --metrics-prom /var/lib/node_exporter/cdt.prom --metrics-interval 5
+
+退出码：0 全部成功，1 有步骤失败，2 参数错误"""
+
+
+class ConsoleLog:
+    """不依赖 Tk 的日志输出：线程安全地打印到标准输出，并可同时写入日志文件"""
+
+    # 串口与 ADB 日志共用一把锁，避免多线程输出交错
+    _lock = threading.Lock()
+
+    def __init__(self, tag, writer=None, quiet=False):
+        self.tag = tag
+        self.writer = writer
+        self.quiet = quiet
+
+    def __call__(self, msg):
+        if self.writer:
+            self.writer.write_lines([msg])
+        if self.quiet:
+            return
+        text = "".join(f"[{self.tag}] {line}\n" for line in str(msg).split("\n"))
+        with self._lock:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+
+def parse_steps(value):
+    steps = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            steps.extend(range(int(lo), int(hi) + 1))
+        else:
+            steps.append(int(part))
+    bad = [n for n in steps if n not in STEP_NAMES]
+    if bad:
+        raise argparse.ArgumentTypeError(f"无效步骤: {bad}（可选 1-6）")
+    return steps
+
+
+def serve_broker(pipeline, interval=10):
+    """只做串口共享：每 interval 秒打印一次客户端与积压情况，直到 Ctrl+C"""
+    last = None
+    try:
+        while True:
+            time.sleep(interval)
+            status = pipeline.broker_status()
+            if status and status != last:
+                pipeline.log_serial(f"[ℹ] {status}")
+                last = status
+    except KeyboardInterrupt:
+        print("[ℹ] 串口共享已停止", flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="车机自动化调试工具（命令行模式，不启动界面）",
+                                     epilog=EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=parse_steps,
+                        help="要执行的步骤，如 1,2,4 或 2-6（默认：脚本中出现的步骤）")
+    parser.add_argument("--config", default="debugger_config.json", help="配置文件路径")
+    parser.add_argument("--script", help="脚本文件，按 [step1]~[step6] 分段覆盖各步骤命令")
+    parser.add_argument("--port", help="串口设备（覆盖配置）")
+    parser.add_argument("--baud", help="波特率（覆盖配置）")
+    parser.add_argument("--log-dir", help="日志目录（覆盖配置）")
+    parser.add_argument("--no-log-files", action="store_true", help="只输出到标准输出，不写日志文件")
+    parser.add_argument("--pool", action="store_true", help="多设备并行模式")
+    parser.add_argument("--logcat", action="store_true", help="执行步骤期间持续抓取 logcat（写入 logcat.log）")
+    parser.add_argument("--boot-timing", action="store_true",
+                        help="步骤 3 重启后等待启动完成并记录各阶段耗时（结果追加到 boot_times.jsonl）")
+    parser.add_argument("--capture", action="store_true",
+                        help="把串口原始字节录制到 <log_dir>/captures/*.cdtcap")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="以录制文件代替串口（触发器/启动计时/日志按原始时间戳处理）；未指定步骤时回放完即退出")
+    parser.add_argument("--replay-speed", type=float, default=None,
+                        help="回放速度倍数，0 为全速（默认取配置 replay_speed）")
+    parser.add_argument("--collect", nargs="?", const="", metavar="NAMES",
+                        help="步骤执行完后按 collect_manifest 批量拉取设备目录（可用逗号指定清单中的名称，默认全部）")
+    parser.add_argument("--broker", type=int, metavar="PORT",
+                        help="共享串口：在本机 TCP 端口上转发串口数据（客户端连接 socket://127.0.0.1:PORT）；"
+                             "未指定步骤时一直运行到 Ctrl+C")
+    parser.add_argument("--broker-host", help="共享监听地址（默认 127.0.0.1，0.0.0.0 允许其他机器连接）")
+    parser.add_argument("--broker-readonly", action="store_true", help="共享客户端只能查看，不能写入串口")
+    parser.add_argument("--metrics-json", metavar="FILE", help="定期把性能指标快照写入 JSON 文件（覆盖配置 metrics_json）")
+    parser.add_argument("--metrics-prom", metavar="FILE",
+                        help="定期写入 Prometheus 文本格式（供 node_exporter textfile collector 读取）")
+    parser.add_argument("--metrics-interval", type=float, metavar="SEC", help="指标导出间隔（默认取配置 metrics_interval）")
+    parser.add_argument("--fail-fast", action="store_true", help="某一步失败后不再执行后续步骤")
+    parser.add_argument("--quiet", action="store_true", help="不打印日志，只输出步骤结果")
+    parser.add_argument("--startup-time", action="store_true", help="打印启动耗时（导入、加载配置、初始化各阶段）")
+    return parser
+
+
+def main(argv=None):
+    startup = StartupProfile(_START, expect=())
+    startup.mark("imports")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Windows 控制台 / 重定向到文件时，避免 ✓ ✗ 等字符编码失败
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(errors="replace")
+
+    config = load_config(args.config)
+    startup.mark("config")
+    steps = args.steps
+    if args.script:
+        script = parse_script(args.script)
+        config.update(script)
+        if steps is None:
+            steps = sorted(int(k[4:-4]) for k in script if k[4:-4].isdigit() and int(k[4:-4]) in STEP_NAMES)
+    if not steps and not args.replay and args.broker is None and args.collect is None:
+        parser.error("请用 --steps 指定步骤，或提供包含 [stepN] 段的 --script")
+    if args.port:
+        config["serial_port"] = args.port
+    if args.baud:
+        config["serial_baud"] = args.baud
+    if args.log_dir:
+        config["log_dir"] = args.log_dir
+    if args.pool:
+        config["pool_mode"] = True
+    if args.capture:
+        config["serial_capture"] = True
+    if args.broker is not None:
+        config["broker_enabled"] = True
+        config["broker_port"] = args.broker
+        if args.broker_host:
+            config["broker_host"] = args.broker_host
+        if args.broker_readonly:
+            config["broker_write_mode"] = "readonly"
+    if args.boot_timing:
+        # 命令行按 --steps 顺序执行后续步骤，不再自动连带
+        config["boot_timing"] = True
+        config["boot_chain_steps"] = ""
+
+    writers = []
+    if not args.no_log_files:
+        for name in ("serial.log", "adb.log"):
+            writers.append(LogWriter(
+                config["log_dir"], name,
+                max_bytes=int(config["log_max_bytes"]),
+                backup_count=int(config["log_backup_count"]),
+                compress=bool(config["log_compress"])).start())
+    serial_log = ConsoleLog("UART", writers[0] if writers else None, args.quiet)
+    adb_log = ConsoleLog("ADB ", writers[1] if writers else None, args.quiet)
+    pipeline = DebugPipeline(config, serial_log, adb_log)
+    for name, writer in zip(("serial", "adb"), writers):
+        pipeline.metrics.sample(f'cdt_log_written_lines_total{{log="{name}"}}', lambda w=writer: w.lines_written, "counter")
+        pipeline.metrics.sample(f'cdt_log_dropped_lines_total{{log="{name}"}}', lambda w=writer: w.dropped_lines, "counter")
+        pipeline.metrics.sample(f'cdt_log_writer_backlog{{log="{name}"}}', writer.backlog)
+    exporter = pipeline.start_metrics_export(args.metrics_json, args.metrics_prom, args.metrics_interval)
+    startup.mark("pipeline")
+    if args.startup_time:
+        print(f"[ℹ] {startup.report()}")
+
+    results = []
+    try:
+        if args.logcat:
+            pipeline.start_logcat()
+        # 串口步骤 4/5 需要先连接串口（步骤 1 会自行连接）
+        first_serial = next((n for n in steps or () if n in (1, 4, 5)), None)
+        if args.replay:
+            if not pipeline.connect_replay(args.replay, args.replay_speed):
+                return 1
+            if not steps:
+                while pipeline.serial_running:
+                    time.sleep(0.2)
+                results.append((0, True, 0.0))
+        elif args.broker is not None and not steps:
+            if not pipeline.connect_serial():
+                return 1
+            serve_broker(pipeline)
+        elif (first_serial in (4, 5) or (args.broker is not None and first_serial is None)) and not config["pool_mode"]:
+            pipeline.connect_serial()
+        for n in steps or ():
+            start = time.perf_counter()
+            ok = pipeline.run_step(n)
+            results.append((n, ok, time.perf_counter() - start))
+            print(f"[{'✓' if ok else '✗'}] 步骤 {n}: {STEP_NAMES[n]} ({results[-1][2]:.2f}s)", flush=True)
+            if not ok and args.fail_fast:
+                break
+        if args.collect is not None and (not args.fail_fast or all(ok for _, ok, _ in results)):
+            start = time.perf_counter()
+            ok = pipeline.collect_artifacts(args.collect.replace(",", " ").split())
+            results.append((0, ok, time.perf_counter() - start))
+            print(f"[{'✓' if ok else '✗'}] 批量拉取 ({results[-1][2]:.2f}s)", flush=True)
+    except KeyboardInterrupt:
+        print("[⚠] 已中断", flush=True)
+        results.append((0, False, 0.0))
+    finally:
+        if exporter:
+            print(f"[ℹ] {pipeline.metrics_status()}", flush=True)
+        pipeline.close()
+        for writer in writers:
+            writer.close()
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1040 @@
+import os
+import json
+import time
+import threading
+
+# pyserial、adbutils 以及推送/拉取/多设备/启动计时模块只在首次使用时导入，界面启动不为它们付出导入时间
+from serial_commands import SerialCommandEngine, split_timeout
+from adb_session import AdbShellSession
+from stream_runner import StreamingCommand, split_prefixes
+from logcat_capture import LogcatCapture, LogcatFilter
+from trigger_engine import TriggerEngine, load_triggers
+from serial_capture import CaptureWriter, RecordingSerial, ReplaySerial
+from job_scheduler import JobScheduler, QUEUED, RUNNING
+from link_supervisor import LinkSupervisor
+from serial_broker import SerialBroker, BrokeredSerial, format_stats as format_broker_stats
+from metrics import Metrics, MetricsExporter, rates, format_summary as format_metrics
+
+SERIAL_READ_TIMEOUT = 0.2   # 串口阻塞读取超时（秒），决定空闲唤醒与退出响应
+
+STEP_NAMES = {
+    1: "连接串口并执行初始化命令",
+    2: "执行 ADB 命令",
+    3: "上传文件并重启车机",
+    4: "车机启动后执行串口命令",
+    5: "车机启动后执行串口命令",
+    6: "执行 ADB 命令",
+}
+
+# 各步骤占用的资源：同一资源上的步骤排队依次执行，不同资源并行
+STEP_RESOURCES = {1: ("serial",), 2: ("adb",), 3: ("adb",), 4: ("serial",), 5: ("serial",), 6: ("adb",)}
+
+DEFAULT_CONFIG = {
+    "serial_port": "COM3",
+    "serial_baud": "115200",
+    "file1_path": "",
+    "file1_target": "/data/local/tmp/",
+    "file2_path": "",
+    "file2_target": "/data/local/tmp/",
+    "log_dir": "./logs/",
+    "log_max_bytes": 10 * 1024 * 1024,
+    "log_backup_count": 10,
+    "log_flush_bytes": 64 * 1024,
+    "log_flush_interval": 1.0,
+    "log_compress": False,
+    "history_ring_lines": 5000,
+    "history_max_bytes": 256 * 1024 * 1024,
+    "serial_strip_ansi": False,
+    "serial_timestamp": False,
+    "serial_cmd_mode": "prompt",
+    "serial_prompt_regex": r"[#$>]\s*$",
+    "serial_cmd_timeout": 2,
+    "serial_cmd_max_wait": 60,
+    "serial_capture": False,
+    "replay_speed": 1.0,
+    "broker_enabled": False,
+    "broker_host": "127.0.0.1",
+    "broker_port": 7000,
+    "broker_write_mode": "line",
+    "broker_floor_seconds": 2.0,
+    "broker_max_lag_bytes": 4 * 1024 * 1024,
+    "auto_connect": True,
+    "startup_discovery_timeout": 3,
+    "startup_results_file": "startup_times.jsonl",
+    "reconnect_backoff_base": 0.5,
+    "reconnect_backoff_max": 10.0,
+    "reconnect_wait": 60,
+    "port_scan_interval": 2.0,
+    "metrics_interval": 15,
+    "metrics_json": "",
+    "metrics_prom": "",
+    "adb_session": True,
+    "adb_cmd_timeout": 30,
+    "push_list": "",
+    "push_workers": 3,
+    "push_hash_cmd": "md5sum",
+    "push_cache_file": "push_cache.json",
+    "push_assumed_mb_s": 20,
+    "collect_manifest": [
+        {"name": "tombstones", "path": "/data/tombstones"},
+        {"name": "anr", "path": "/data/anr"},
+        {"name": "log", "path": "/data/log"},
+    ],
+    "collect_dir": "",
+    "collect_mode": "extract",
+    "collect_streams": 3,
+    "collect_split_mb": 16,
+    "collect_compress": True,
+    "pool_mode": False,
+    "pool_serial_ports": "",
+    "pool_workers": 8,
+    "logcat_tags": "",
+    "logcat_priority": "V",
+    "logcat_pids": "",
+    "logcat_buffers": "main,system,crash",
+    "logcat_max_bytes": 20 * 1024 * 1024,
+    "logcat_backup_count": 20,
+    "logcat_to_view": True,
+    "triggers_enabled": True,
+    # 默认签名只匹配真正的故障输出，不匹配普通日志里出现的 watchdog / tombstone 字样
+    "triggers": [
+        {"name": "Kernel panic", "pattern": r"re:Kernel panic - not syncing", "actions": ["snapshot", "adb:dmesg"]},
+        {"name": "watchdog", "pattern": r"re:watchdog: .*(bark|bite|hard LOCKUP)", "actions": ["snapshot"]},
+        {"name": "tombstone", "pattern": r"re:Tombstone written to: \S*tombstone_\d+",
+         "actions": ["snapshot", "pull:/data/tombstones"]},
+    ],
+    "trigger_file": "",
+    "trigger_default_actions": "snapshot",
+    "trigger_cooldown": 60,
+    "trigger_max_per_minute": 6,
+    "trigger_context_lines": 50,
+    "trigger_after_lines": 20,
+    "boot_timing": False,
+    "boot_timeout": 180,
+    "boot_chain_steps": "4",
+    "boot_results_file": "boot_times.jsonl",
+    "boot_milestones": [
+        {"name": "bootloader", "pattern": r"U-Boot|Android Bootloader|\bLK\b"},
+        {"name": "kernel", "pattern": r"Booting Linux|Linux version \d"},
+        {"name": "init", "pattern": r"init first stage started|Run /init as init process"},
+    ],
+    "step1_cmd": "getprop\nls /system\n",
+    "step2_cmd": "getprop ro.build.fingerprint\ngetprop ro.product.model\n",
+    "step3_cmd": "reboot\n",
+    "step4_cmd": "cat /proc/version\ngetprop ro.build.fingerprint\n",
+    "step5_cmd": "dmesg | tail -20\nlogread | tail -20\n",
+    "step6_cmd": "adb pull /sdcard/test1114phone5.txt .\nadb logcat -d > logcat.txt\n"
+}
+
+
+def load_config(path):
+    """加载配置：默认值 + 配置文件中保存的值"""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        except:
+            pass
+    return config
+
+
+def save_config(path, config):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+    except:
+        pass
+
+
+def parse_commands(text):
+    """命令区域文本 → 命令列表（忽略空行与 # 注释）"""
+    cmds = [c.strip() for c in text.strip().splitlines()]
+    return [c for c in cmds if c and not c.startswith("#")]
+
+
+def parse_script(path):
+    """读取脚本文件，返回 {"stepN_cmd": 文本}
+
+    脚本格式：以 [step1] ~ [step6] 分段，每段下每行一条命令，例如
+        [step2]
+        getprop ro.build.fingerprint
+        [step6]
+        adb logcat -d > logcat.txt
+    """
+    sections = {}
+    current = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("[") and stripped.endswith("]"):
+                current = stripped[1:-1].strip().lower()
+                sections[f"{current}_cmd"] = ""
+            elif current:
+                sections[f"{current}_cmd"] += line
+    return sections
+
+
+def push_pairs(config):
+    """由配置（文件1/2 与“更多文件”列表）得到 [(本地路径, 目标路径), ...]"""
+    pairs = [
+        (config["file1_path"].strip(), config["file1_target"].strip()),
+        (config["file2_path"].strip(), config["file2_target"].strip()),
+    ]
+    for line in parse_commands(config["push_list"]):
+        local, _, remote = line.partition("=>")
+        pairs.append((local.strip(), remote.strip()))
+    return [(local, remote) for local, remote in pairs if local and remote]
+
+
+def adb_client():
+    """按需导入 adbutils（导入较慢，纯串口流程不需要）"""
+    from adbutils import adb
+    return adb
+
+
+class DebugPipeline:
+    """六步调试流程：串口连接与命令、ADB 命令、文件推送、多设备分发（不依赖 Tk，GUI 与命令行共用）
+
+    日志通过 log_serial(msg) / log_adb(msg) 输出（GUI 传入队列的 put，命令行直接打印），
+    各步骤返回 True/False 表示是否全部成功。
+    """
+
+    def __init__(self, config, log_serial, log_adb):
+        self.config = config
+        self.log_serial = log_serial
+        self.log_adb = log_adb
+
+        self.serial_conn = None
+        self.serial_port = None               # 实际连接的串口与波特率（重连时使用，不读界面/配置）
+        self.serial_baud = None
+        self.serial_lost = threading.Event()  # 串口已断开、正在等待重连
+        self.serial_engine = None
+        self.serial_thread = None
+        self.serial_running = False
+        self.adb_session = None
+        self.adb_cancel = threading.Event()   # 停止当前 ADB 命令序列
+        self.serial_cancel = threading.Event()  # 停止当前串口命令序列
+        self.adb_local_cmd = None             # 正在执行的本地 adb 命令
+        self.adb_pool = None                  # 正在执行的多设备 ADB 任务
+        self.push_rate = None                 # 本次运行中最近一次实测的推送速率（字节/秒）
+        self.logcat = None
+        self.trigger_engine = None
+        self.boot_timer = None                # 启动计时进行中时接收串口行
+        self.capture_writer = None            # 原始串口录制（跨重连沿用同一文件）
+        self.broker = None                    # 串口共享（跨重连沿用同一监听端口）
+        self.jobs = JobScheduler(on_event=self._job_event)
+        self.supervisor = LinkSupervisor(
+            on_event=self._job_event, scan_interval=float(config["port_scan_interval"]),
+            backoff_base=float(config["reconnect_backoff_base"]),
+            backoff_max=float(config["reconnect_backoff_max"]))
+        self.supervisor.on_port_lost = self._on_port_lost
+        self.supervisor.on_adb_change = self._on_adb_change
+        self.metrics = Metrics()
+        self.metrics_exporter = None
+        self._metrics_prev = {"time": time.time(), "counters": {}}  # 首次状态为启动以来的平均速率
+        self._register_metrics()
+
+    # 性能指标
+    def _register_metrics(self):
+        """组件自身维护的计数在快照时读取，热路径上不加锁"""
+        m = self.metrics
+        engine = lambda: self.serial_engine
+        m.sample("cdt_serial_read_bytes_total", lambda: engine().bytes_read if engine() else 0, "counter")
+        m.sample("cdt_serial_lines_total", lambda: engine().lines if engine() else 0, "counter")
+        m.sample("cdt_serial_connected", lambda: int(self.serial_connected()))
+        m.sample("cdt_adb_online", lambda: int(self.supervisor.adb_online()) if self.supervisor.adb_tracking else None)
+        for state in (QUEUED, RUNNING):
+            m.sample(f'cdt_jobs{{state="{state}"}}',
+                     lambda state=state: sum(1 for job in self.jobs.jobs() if job.state == state))
+        m.sample("cdt_logcat_entries_total", lambda: self.logcat.parser.entries if self.logcat and self.logcat.parser else None,
+                 "counter")
+        m.sample("cdt_logcat_bytes_total", lambda: self.logcat.bytes_read if self.logcat else None, "counter")
+        m.sample("cdt_trigger_hits_total", lambda: sum(t.hits for t in self.trigger_engine.matcher.triggers)
+                 if self.trigger_engine else None, "counter")
+        m.sample("cdt_broker_clients", lambda: len(self.broker.stats()["clients"]) if self.broker else None)
+        m.sample("cdt_broker_published_bytes_total", lambda: self.broker.published_bytes if self.broker else None,
+                 "counter")
+        m.sample("cdt_broker_dropped_bytes_total", lambda: self.broker.dropped_bytes if self.broker else None,
+                 "counter")
+        m.describe("cdt_serial_read_bytes_total", "Raw bytes read from the serial port")
+        m.describe("cdt_serial_lines_total", "Serial lines split by the reader")
+        m.describe("cdt_serial_command_seconds", "Serial command round trip")
+        m.describe("cdt_adb_command_seconds", "ADB shell / local adb command duration")
+        m.describe("cdt_push_seconds", "Per-file adb push duration")
+
+    def start_metrics_export(self, json_path=None, prom_path=None, interval=None):
+        """按配置（或参数）定期导出指标快照；相对路径放在 log_dir 下，两个路径都为空时不导出"""
+        json_path = json_path or self.config["metrics_json"]
+        prom_path = prom_path or self.config["metrics_prom"]
+        interval = float(self.config["metrics_interval"] if interval is None else interval)
+        if interval <= 0 or not (json_path or prom_path) or self.metrics_exporter:
+            return None
+        resolve = lambda path: os.path.join(self.config["log_dir"], path) if path and not os.path.isabs(path) else path
+        self.metrics_exporter = MetricsExporter(self.metrics, interval, resolve(json_path), resolve(prom_path),
+                                                on_error=self.log_serial).start()
+        self.log_serial(f"[ℹ] 性能指标每 {interval:g}s 导出到 "
+                        f"{', '.join(p for p in (resolve(json_path), resolve(prom_path)) if p)}")
+        return self.metrics_exporter
+
+    def metrics_status(self):
+        """状态栏文字：与上次调用之间的速率，加上累计的延迟分位数"""
+        snap = self.metrics.snapshot()
+        text = format_metrics(snap, rates(self._metrics_prev, snap))
+        self._metrics_prev = snap
+        return text
+
+    # 任务调度
+    def _job_event(self, msg, resources):
+        (self.log_serial if "serial" in resources else self.log_adb)(msg)
+
+    def step_resources(self, n):
+        """步骤 n 占用的资源；启动计时模式下步骤 3 还要占用自动连带执行的步骤所需的资源"""
+        resources = list(STEP_RESOURCES[n])
+        if n == 3 and self.config["boot_timing"]:
+            for m in str(self.config["boot_chain_steps"]).split(","):
+                m = m.strip()
+                if m.isdigit() and int(m) in STEP_RESOURCES:
+                    resources.extend(r for r in STEP_RESOURCES[int(m)] if r not in resources)
+        return tuple(resources)
+
+    def submit(self, name, func, resources, unique=False):
+        """把任务交给调度器；取消运行中的任务时打断其占用资源上正在进行的命令"""
+        def run():
+            # 资源已归本任务独占，清掉之前遗留的取消标志
+            if "serial" in resources:
+                self.serial_cancel.clear()
+            if "adb" in resources:
+                self.adb_cancel.clear()
+            return func()
+
+        return self.jobs.submit(name, run, resources, on_cancel=lambda: self._cancel_resources(resources),
+                                unique=unique)
+
+    def submit_step(self, n, func=None):
+        """排队执行第 n 步（func 默认按配置中的命令执行）；同一步骤已在排队或运行时忽略"""
+        return self.submit(f"步骤 {n}: {STEP_NAMES[n]}", func or (lambda: self.run_step(n)),
+                           self.step_resources(n), unique=True)
+
+    def _cancel_resources(self, resources):
+        if "serial" in resources:
+            self.cancel_serial_commands()
+        if "adb" in resources:
+            self.cancel_adb_commands()
+
+    # 串口连接与实时监控
+    def connect_serial(self, port=None, baud=None, auto=False):
+        port = port or self.config["serial_port"]
+        baud = int(baud or self.config["serial_baud"])
+        try:
+            if self.serial_conn:
+                self.stop_serial_monitor()
+                self.serial_conn.close()
+
+            self.serial_conn = self._open_serial(port, baud)
+            self.serial_port, self.serial_baud = port, baud
+            self.serial_lost.clear()
+            self.supervisor.watch_port(port)
+            self.log_serial(f"[✓] {'自动' if auto else ''}连接串口 {port} @ {baud}")
+            self.start_serial_monitor()
+            if auto:
+                self.log_serial("[ℹ] 串口实时监控已启动")
+            return True
+        except Exception as e:
+            if auto:
+                self.log_serial(f"[⚠] 自动连接串口失败: {e}")
+            else:
+                self.log_serial(f"[✗] 串口连接失败: {e}")
+            return False
+
+    def _open_serial(self, port, baud):
+        """打开串口（也支持 loop://、socket:// 等 pyserial URL）
+
+        开启录制时包一层 RecordingSerial，原始字节写入 log_dir/captures/；开启共享时再包一层 BrokeredSerial。
+        """
+        import serial
+
+        conn = serial.serial_for_url(port, baudrate=baud, timeout=SERIAL_READ_TIMEOUT)
+        if self.config["serial_capture"]:
+            conn = self._record_serial(conn, port, baud)
+        if self.config["broker_enabled"]:
+            try:
+                conn = BrokeredSerial(conn, self._ensure_broker())
+            except OSError as e:
+                self.log_serial(f"[✗] 串口共享启动失败（端口 {self.config['broker_port']}）: {e}")
+        return conn
+
+    def _record_serial(self, conn, port, baud):
+        """录制沿用同一个文件，重连时只记录一次 open 事件"""
+        if self.capture_writer is None:
+            path = os.path.join(self.config["log_dir"], "captures",
+                                f"serial_{time.strftime('%Y%m%d-%H%M%S')}.cdtcap")
+            self.capture_writer = CaptureWriter(path, {
+                "port": port, "baud": baud, "bytesize": conn.bytesize,
+                "parity": conn.parity, "stopbits": conn.stopbits})
+            self.log_serial(f"[ℹ] 原始串口录制: {path}")
+        else:
+            self.capture_writer.event("open", port=port, baud=baud)
+        return RecordingSerial(conn, self.capture_writer)
+
+    def _ensure_broker(self):
+        """按配置启动串口共享监听（只启动一次，重连后继续使用）"""
+        if self.broker is None:
+            self.broker = SerialBroker(
+                host=self.config["broker_host"], port=int(self.config["broker_port"]),
+                write_mode=self.config["broker_write_mode"],
+                floor_seconds=float(self.config["broker_floor_seconds"]),
+                max_lag_bytes=int(self.config["broker_max_lag_bytes"]),
+                on_event=self.log_serial,
+                local_busy=lambda: bool(self.serial_engine and self.serial_engine.busy)).start()
+        return self.broker
+
+    def set_broker(self, enabled):
+        """开启/关闭串口共享；已连接物理串口时重新连接以生效"""
+        self.config["broker_enabled"] = bool(enabled)
+        if not enabled and self.broker:
+            self.broker.close()
+            self.broker = None
+            self.log_serial("[ℹ] 串口共享已关闭")
+        if self.serial_conn and not isinstance(self.serial_conn, ReplaySerial) and \
+                isinstance(self.serial_conn, BrokeredSerial) != bool(enabled):
+            return self.connect_serial()
+        if enabled and not self.serial_conn:
+            self.log_serial("[ℹ] 串口共享将在连接串口后开启")
+        return True
+
+    def broker_status(self):
+        """共享状态文字（未开启时为 None）"""
+        return format_broker_stats(self.broker.stats()) if self.broker else None
+
+    def connect_replay(self, path, speed=None):
+        """以录制文件作为串口数据源，经同一读取/触发器/日志流程回放（speed=0 为全速）"""
+        speed = float(self.config["replay_speed"] if speed is None else speed)
+        try:
+            conn = ReplaySerial(path, speed=speed)
+        except Exception as e:
+            self.log_serial(f"[✗] 打开录制文件失败: {e}")
+            return False
+        if self.serial_conn:
+            self.stop_serial_monitor()
+            self.serial_conn.close()
+        self.serial_conn = conn
+        self.serial_port = None
+        self.serial_lost.clear()
+        self.supervisor.watch_port(None)
+        meta = conn.meta
+        self.log_serial(f"[✓] 开始回放 {path}（录制于 {meta.get('port')} @ {meta.get('baud')}，"
+                        f"{'全速' if speed <= 0 else f'{speed:g} 倍速'}）")
+        self.start_serial_monitor()
+        return True
+
+    def serial_connected(self):
+        return bool(self.serial_conn and self.serial_conn.is_open)
+
+    def start_serial_monitor(self):
+        if self.serial_conn and not self.serial_running:
+            old = self.serial_engine
+            # 命令引擎独占串口读取：命令响应与后台日志在同一个读取线程中分流
+            self.serial_engine = SerialCommandEngine(
+                self.serial_conn, self._on_serial_line,
+                mode=self.config["serial_cmd_mode"],
+                prompt_regex=self.config["serial_prompt_regex"],
+                default_timeout=float(self.config["serial_cmd_timeout"]),
+                max_wait=float(self.config["serial_cmd_max_wait"]),
+                strip_ansi=bool(self.config["serial_strip_ansi"]),
+                tap=self._serial_tap)
+            if old is not None:
+                # 重新连接后累计计数接着旧引擎继续，指标不归零
+                self.serial_engine.bytes_read, self.serial_engine.lines = old.bytes_read, old.lines
+            self._ensure_trigger_engine()
+            self.serial_thread = threading.Thread(target=self._monitor_serial, daemon=True)
+            # 监控线程启动时要看到 serial_running 为真，因此在 start() 前置位；启动失败则复位
+            self.serial_running = True
+            try:
+                self.serial_thread.start()
+            except Exception:
+                self.serial_running = False
+                raise
+
+    def stop_serial_monitor(self):
+        self.serial_running = False
+        thread = self.serial_thread
+        if thread and thread is not threading.current_thread() and thread.is_alive():
+            thread.join(SERIAL_READ_TIMEOUT * 5)
+
+    def _monitor_serial(self):
+        """串口监控线程：阻塞读取（带超时），按字节切分行并增量解码；串口断开后在本线程内重连并继续监控"""
+        from serial import SerialException
+
+        engine = self.serial_engine
+        # 手动重新连接会创建新的引擎和监控线程，旧线程即使还没退出也不再继续
+        running = lambda: self.serial_running and self.serial_engine is engine
+        while running():
+            try:
+                engine.run(running)
+            except SerialException as e:
+                self.log_serial(f"[⚠] 串口通信错误: {e}")
+                self.serial_lost.set()
+            except Exception as e:
+                if not self.serial_lost.is_set():
+                    self.log_serial(f"[⚠] 监控错误: {e}")
+                    time.sleep(1)  # 出错后稍等再继续
+                    continue
+            # 停止监控、回放结束或串口被主动关闭时不重连
+            if not (running() and self.serial_lost.is_set() and self.serial_port):
+                break
+            if not self._recover_serial(engine, running):
+                break
+        if self.serial_engine is not engine:
+            return
+        self.serial_running = False
+        if isinstance(self.serial_conn, ReplaySerial) and not self.serial_conn.is_open:
+            self.log_serial(self.serial_conn.summary())
+
+    def _ensure_trigger_engine(self):
+        """按配置创建串口触发器（未启用或没有规则时不创建）"""
+        if self.config["triggers_enabled"] and self.trigger_engine is None:
+            # 规则有误只影响触发器，串口监控照常启动
+            try:
+                triggers = load_triggers(self.config)
+                if not triggers:
+                    return
+                self.trigger_engine = TriggerEngine(
+                    triggers, self.config["log_dir"], device_factory=lambda: adb_client().device(),
+                    on_event=self.log_serial,
+                    context_lines=int(self.config["trigger_context_lines"]),
+                    after_lines=int(self.config["trigger_after_lines"]),
+                    max_per_minute=int(self.config["trigger_max_per_minute"]))
+            except Exception as e:
+                self.log_serial(f"[✗] 触发器规则加载失败: {e}")
+                return
+            self.log_serial(f"[ℹ] 已加载 {len(triggers)} 条触发器规则")
+
+    def _serial_tap(self, line, received_at):
+        """串口读取线程中收到的每一行（含命令响应）：交给触发器与启动计时"""
+        if self.trigger_engine is not None:
+            self.trigger_engine.feed(line, received_at)
+        timer = self.boot_timer
+        if timer is not None:
+            timer.feed_serial(line, received_at)
+
+    def _on_serial_line(self, line, received_at):
+        """串口读取线程回调：按需加上接收时间戳后输出"""
+        if self.config["serial_timestamp"]:
+            ms = int((received_at % 1) * 1000)
+            line = f"[{time.strftime('%H:%M:%S', time.localtime(received_at))}.{ms:03d}] {line}"
+        self.log_serial(line)
+
+    def _on_port_lost(self, port):
+        """枚举线程回调：正在使用的串口从系统中消失（USB 拔出），关闭连接让监控线程进入重连"""
+        if port != self.serial_port or not self.serial_running:
+            return
+        self.log_serial(f"[⚠] 串口 {port} 已从系统中移除")
+        self.serial_lost.set()
+        try:
+            self.serial_conn.close()
+        except Exception:
+            pass
+
+    def _recover_serial(self, engine, running):
+        """等端口重新出现后按带抖动的退避重新打开，沿用同一命令引擎（未完成的行与解码状态不丢失）"""
+        lost_at = time.monotonic()
+        port, baud = self.serial_port, self.serial_baud
+        try:
+            self.serial_conn.close()
+        except Exception:
+            pass
+        self.log_serial(f"[ℹ] 等待串口 {port} 重新连接...")
+        conn, attempts, open_s = self.supervisor.reconnect(
+            port, lambda: self._open_serial(port, baud), running)
+        if conn is None:
+            return False
+        if not running():
+            conn.close()
+            return False
+        self.serial_conn = conn
+        engine.attach(conn)
+        self.serial_lost.clear()
+        self.metrics.inc("cdt_serial_reconnects_total")
+        self.metrics.observe("cdt_serial_downtime_seconds", time.monotonic() - lost_at)
+        self.log_serial(f"[✓] 串口 {port} 已重新连接：断开 {time.monotonic() - lost_at:.1f}s，"
+                        f"端口出现后 {open_s:.2f}s 打开（第 {attempts} 次尝试）")
+        return True
+
+    def _await_serial(self):
+        """串口断开重连期间，等待重新连接（最长 reconnect_wait 秒）后再继续执行命令"""
+        if not self.serial_lost.is_set():
+            return True
+        self.log_serial("[ℹ] 等待串口重新连接后继续...")
+        deadline = time.monotonic() + float(self.config["reconnect_wait"])
+        while self.serial_lost.is_set() and self.serial_running:
+            if self.serial_cancel.is_set() or time.monotonic() >= deadline:
+                self.log_serial("[✗] 串口未重新连接")
+                return False
+            time.sleep(0.1)
+        return self.serial_running
+
+    def _on_adb_change(self, serial_no, status, offline_s):
+        if status == "device":
+            extra = f"，离线 {offline_s:.1f}s" if offline_s is not None else ""
+            self.log_adb(f"[✓] ADB 设备 {serial_no} 已上线{extra}")
+        elif status == "absent":
+            self.log_adb(f"[⚠] ADB 设备 {serial_no} 已断开")
+        else:
+            self.log_adb(f"[⚠] ADB 设备 {serial_no} 状态: {status}")
+
+    def watch_devices(self):
+        """开始跟踪 ADB 设备的插拔（track-devices）"""
+        self.supervisor.watch_adb(adb_client)
+
+    def discover_devices(self, timeout=None):
+        """启动时的 ADB 设备发现（在后台任务中执行）：开始跟踪插拔，最多等待 timeout 秒出现设备
+
+        设备上线由 _on_adb_change 报告；到时仍没有设备时提示一次，之后接入的设备照常自动识别。
+        """
+        timeout = float(self.config["startup_discovery_timeout"] if timeout is None else timeout)
+        self.watch_devices()
+        if self.supervisor.wait_devices(timeout) == {}:
+            self.log_adb(f"[ℹ] {timeout:g}s 内未发现 ADB 设备（接入后自动识别）")
+        return True
+
+    def _await_adb(self):
+        """ADB 设备掉线后，等待其重新上线（最长 reconnect_wait 秒）再执行后续任务"""
+        self.watch_devices()
+        if not self.supervisor.adb_lost():
+            return True
+        self.log_adb("[ℹ] 等待 ADB 设备重新上线...")
+        if self.supervisor.wait_adb(float(self.config["reconnect_wait"]), cancelled=self.adb_cancel.is_set):
+            return True
+        self.log_adb("[✗] ADB 设备未重新上线")
+        return False
+
+    def send_interrupt(self):
+        if self.serial_connected():
+            if self.serial_engine:
+                self.serial_engine.interrupt()
+            else:
+                self.serial_conn.write(b'\x03')
+            self.log_serial("[✓] 已发送中断信号 (Ctrl+C)")
+        else:
+            self.log_serial("[✗] 串口未连接，无法发送中断")
+
+    def run_serial_commands(self, text):
+        """逐条执行串口命令：检测到提示符/结束标记即进入下一条，支持 @timeout=秒 前缀"""
+        engine = self.serial_engine
+        if not (engine and self.serial_running):
+            self.log_serial("[✗] 串口监控未运行，无法执行命令")
+            return False
+        ok = True
+        for cmd in parse_commands(text):
+            if self.serial_cancel.is_set():
+                self.log_serial("[⚠] 已取消，跳过剩余串口命令")
+                return False
+            if not self._await_serial():
+                return False
+            timeout, cmd = split_timeout(cmd)
+            try:
+                result = engine.execute(cmd, timeout)
+                self.metrics.observe("cdt_serial_command_seconds", result.elapsed)
+                self.log_serial(f"$ {cmd}  ({result.elapsed:.2f}s)")
+                if result.output:
+                    self.log_serial(result.output)
+                if not result.completed and self.serial_cancel.is_set():
+                    self.log_serial(f"[⚠] 命令 '{cmd}' 已中断")
+                    ok = False
+                elif not result.completed and engine.mode == "prompt":
+                    # 与旧版固定等待相同：没有识别到提示符不算失败（控制台可能没有提示符）
+                    self.log_serial(f"[ℹ] 命令 '{cmd}' 在超时内未检测到提示符，后续输出转入实时日志")
+                elif not result.completed:
+                    self.log_serial(f"[⚠] 命令 '{cmd}' 未在超时内完成，后续输出转入实时日志")
+                    ok = False
+                elif result.exit_code:
+                    self.log_serial(f"[⚠] 退出码: {result.exit_code}")
+                    ok = False
+            except Exception as e:
+                self.log_serial(f"[✗] 串口命令 '{cmd}' 失败: {e}")
+                ok = False
+        return ok
+
+    # ADB 命令
+    def _get_adb_session(self):
+        if self.adb_session is None:
+            self.adb_session = AdbShellSession(
+                adb_client().device, timeout=float(self.config["adb_cmd_timeout"]), on_event=self.log_adb,
+                wait_device=lambda timeout: self.supervisor.wait_adb(timeout, cancelled=self.adb_cancel.is_set))
+        return self.adb_session
+
+    def run_adb_commands(self, text):
+        """执行 ADB 命令：连续的车机 shell 命令合并为一批，经持久会话流水线执行"""
+        if not self._await_adb():
+            return False
+        try:
+            d = None if self.config["adb_session"] else adb_client().device()
+            ok = True
+            batch = []
+            for cmd in parse_commands(text):
+                options, local_cmd = split_prefixes(cmd)
+                if local_cmd == "@collect" or local_cmd.startswith("@collect "):
+                    ok = self._run_adb_shell_batch(d, batch) and ok
+                    batch = []
+                    ok = self.collect_artifacts(local_cmd[len("@collect"):].replace(",", " ").split()) and ok
+                    if self.adb_cancel.is_set():
+                        return False
+                elif local_cmd.startswith("adb "):
+                    ok = self._run_adb_shell_batch(d, batch) and ok
+                    batch = []
+                    if self.adb_cancel.is_set():
+                        return False
+                    ok = self._run_local_command(local_cmd, options) and ok
+                else:
+                    batch.append(cmd)
+            if self.adb_cancel.is_set():
+                return False
+            return self._run_adb_shell_batch(d, batch) and ok
+        except Exception as e:
+            self.log_adb(f"[✗] 命令失败: {e}")
+            return False
+
+    def _run_local_command(self, cmd, options):
+        """流式执行本地 adb 命令：输出逐行进入日志，可 @tee=文件 同时落盘，不设硬超时"""
+        timeout = float(options["timeout"]) if "timeout" in options else None
+        runner = StreamingCommand(cmd, self.log_adb, tee_path=options.get("tee"), timeout=timeout)
+        self.log_adb(f"[ADB TOOL] {cmd}")
+        self.adb_local_cmd = runner
+        if self.adb_cancel.is_set():
+            runner.cancel()  # 取消请求在 adb_local_cmd 赋值之前到达
+        try:
+            code = runner.run()
+        finally:
+            self.adb_local_cmd = None
+        self.metrics.observe('cdt_adb_command_seconds{kind="local"}', runner.elapsed)
+        summary = f"{runner.lines} 行 / {runner.bytes_read / 1024:.1f} KB / {runner.elapsed:.1f}s"
+        if runner.cancelled:
+            self.log_adb(f"[⚠] 已取消: {cmd} ({summary})")
+        elif runner.timed_out:
+            self.log_adb(f"[⚠] 超时 {timeout}s 已终止: {cmd} ({summary})")
+        else:
+            self.log_adb(f"[ℹ] 退出码 {code} ({summary})")
+        return code == 0 and not runner.cancelled and not runner.timed_out
+
+    def cancel_serial_commands(self):
+        """跳过剩余串口命令，正在等待的命令以 Ctrl+C 结束"""
+        self.serial_cancel.set()
+        engine = self.serial_engine
+        if engine is not None and engine.busy:
+            engine.interrupt()
+        self.log_serial("[ℹ] 已请求停止串口命令")
+
+    def cancel_adb_commands(self):
+        """终止正在运行的本地命令，并跳过剩余命令"""
+        self.adb_cancel.set()
+        runner = self.adb_local_cmd
+        if runner:
+            runner.cancel()
+        pool = self.adb_pool
+        if pool:
+            pool.cancel()
+        self.log_adb("[ℹ] 已请求停止 ADB 命令")
+
+    def _run_adb_shell_batch(self, d, cmds):
+        if not cmds:
+            return True
+        if d is not None:
+            # 关闭会话模式时保持逐条 shell() 的旧行为
+            for cmd in cmds:
+                start = time.perf_counter()
+                out = d.shell(cmd).strip()
+                self.metrics.observe('cdt_adb_command_seconds{kind="shell"}', time.perf_counter() - start)
+                self.log_adb(f"$ {cmd}")
+                self.log_adb(out if out else "(无输出)")
+            return True
+        ok = True
+        for result in self._get_adb_session().run_batch(cmds):
+            self.metrics.observe('cdt_adb_command_seconds{kind="shell"}', result.elapsed)
+            self.log_adb(f"$ {result.cmd}")
+            self.log_adb(result.output if result.output else "(无输出)")
+            if result.error:
+                self.log_adb(f"[⚠] {result.error}")
+                ok = False
+            elif result.exit_code:
+                self.log_adb(f"[⚠] 退出码: {result.exit_code}")
+                ok = False
+        return ok
+
+    # 文件推送与重启
+    def _existing_files(self, pairs):
+        existing = []
+        for local, remote in pairs:
+            if not os.path.isfile(local):
+                self.log_adb(f"[⚠] 文件不存在，跳过: {local}")
+                continue
+            existing.append((local, remote))
+        return existing
+
+    def push_files(self, pairs):
+        """增量并行推送文件，返回是否全部成功"""
+        if not pairs:
+            return True
+        if not self._await_adb():
+            return False
+        from push_engine import PushEngine, summarize as summarize_push
+
+        engine = PushEngine(adb_client().device, cache_path=self.config["push_cache_file"],
+                            max_workers=self.config["push_workers"],
+                            hash_cmd=self.config["push_hash_cmd"], on_event=self.log_adb)
+        results = engine.push_all(pairs)
+        for r in results:
+            outcome = "failed" if r.error is not None else "skipped" if r.skipped else "pushed"
+            self.metrics.inc(f'cdt_push_files_total{{result="{outcome}"}}')
+            if outcome == "pushed":
+                self.metrics.inc("cdt_push_bytes_total", r.size)
+                self.metrics.observe("cdt_push_seconds", r.seconds)
+        # 全部跳过时没有本次实测速率，按上次实测或配置的速率估算节省时间
+        assumed = self.push_rate or float(self.config["push_assumed_mb_s"] or 0) * 1024 * 1024
+        summary = summarize_push(results, assumed_rate=assumed or None)
+        if summary["rate_mb_s"]:
+            self.push_rate = summary["rate_mb_s"] * 1024 * 1024
+        msg = (f"[ℹ] 推送完成: 推送 {summary['pushed']} 个，跳过 {summary['skipped']} 个，"
+               f"失败 {summary['failed']} 个")
+        if summary["rate_mb_s"]:
+            msg += f"，平均 {summary['rate_mb_s']:.1f} MB/s"
+        if summary["skipped_bytes"]:
+            msg += f"，跳过 {summary['skipped_bytes'] / (1024 * 1024):.1f} MB"
+        if summary["saved_seconds"]:
+            msg += f"，约节省 {summary['saved_seconds']:.1f}s"
+            if summary["saved_estimated"]:
+                msg += f"（按 {assumed / (1024 * 1024):.1f} MB/s 估算）"
+        self.log_adb(msg)
+        return not summary["failed"]
+
+    def collect_artifacts(self, names=None):
+        """按 collect_manifest 批量拉取设备目录（names 为空时拉取全部），结果保存在 collect_dir 或 log_dir/collect/<时间>/"""
+        if not self._await_adb():
+            return False
+        manifest = self.config["collect_manifest"]
+        if names:
+            unknown = [n for n in names if n not in {e["name"] for e in manifest}]
+            if unknown:
+                self.log_adb(f"[✗] 拉取清单中没有: {', '.join(unknown)}")
+                return False
+            manifest = [e for e in manifest if e["name"] in names]
+        from artifact_collector import ArtifactCollector, format_size, summarize as summarize_collect
+
+        dest = os.path.join(self.config["collect_dir"] or os.path.join(self.config["log_dir"], "collect"),
+                            time.strftime("%Y%m%d-%H%M%S"))
+        collector = ArtifactCollector(
+            adb_client().device, dest, streams=int(self.config["collect_streams"]),
+            split_bytes=float(self.config["collect_split_mb"]) * 1024 * 1024,
+            compress=bool(self.config["collect_compress"]), mode=self.config["collect_mode"],
+            timeout=float(self.config["adb_cmd_timeout"]), on_event=self.log_adb, cancelled=self.adb_cancel.is_set)
+        self.log_adb(f"[ℹ] 批量拉取 {', '.join(e['name'] for e in manifest)} → {dest}")
+        try:
+            results = collector.collect(manifest)
+        except Exception as e:
+            self.log_adb(f"[✗] 批量拉取失败: {e}")
+            return False
+        summary = summarize_collect(results, collector.seconds)
+        self.metrics.inc("cdt_collect_bytes_total", summary["wire_bytes"])
+        self.metrics.observe("cdt_collect_seconds", collector.seconds)
+        self.log_adb(f"[ℹ] 拉取完成: {summary['ok']}/{summary['items']} 项，{summary['files']} 个文件 "
+                     f"{format_size(summary['bytes'])}，用时 {collector.seconds:.1f}s，{summary['rate_mb_s']:.1f} MB/s")
+        return summary["ok"] == summary["items"]
+
+    def send_reboot_commands(self, text):
+        if not self._await_adb():
+            return False
+        d = adb_client().device()
+        ok = True
+        for cmd in parse_commands(text):
+            try:
+                d.shell(cmd)
+                self.log_adb(f"$ {cmd} → 已发送")
+                # 重启命令后短暂休眠，避免连续发送
+                time.sleep(1)
+            except Exception as e:
+                self.log_adb(f"[✗] 重启命令 '{cmd}' 失败: {e}")
+                ok = False
+        return ok
+
+    def timed_reboot(self, text):
+        """启动计时模式：发送重启命令并等待启动完成，记录各阶段耗时，就绪后自动执行后续步骤"""
+        from boot_timing import BootTimer
+
+        client = adb_client()
+        try:
+            device_serial = client.device().serial
+        except Exception as e:
+            self.log_adb(f"[✗] 启动计时：获取设备失败: {e}")
+            return False
+        timer = BootTimer(self.config["boot_milestones"], on_event=self.log_adb,
+                          timeout=float(self.config["boot_timeout"]))
+        # 上下线由 track-devices 推送唤醒（跟踪尚未就绪时 wait_boot 退回轮询）
+        self.watch_devices()
+        timer.begin()
+        self.boot_timer = timer
+        try:
+            if not self.send_reboot_commands(text):
+                return False
+            # 车机重启后旧的 shell 会话已失效
+            if self.adb_session:
+                self.adb_session.close()
+            ok = timer.wait_boot(client, device_serial, cancelled=self.adb_cancel.is_set, tracker=self.supervisor)
+        finally:
+            self.boot_timer = None
+        path = os.path.join(self.config["log_dir"], self.config["boot_results_file"])
+        summary = timer.save(path)
+        self.log_adb(f"[{'✓' if ok else '✗'}] {summary}（结果已追加到 {path}）")
+        if not ok:
+            return False
+        for n in str(self.config["boot_chain_steps"]).split(","):
+            n = n.strip()
+            if not n.isdigit() or int(n) not in STEP_NAMES or int(n) == 3:
+                continue
+            if self.adb_cancel.is_set() or self.serial_cancel.is_set():
+                self.log_adb("[⚠] 已取消，不再自动执行后续步骤")
+                return False
+            self.log_adb(f"[ℹ] 设备已就绪，自动执行步骤 {n}: {STEP_NAMES[int(n)]}")
+            ok = self.run_step(int(n)) and ok
+        return ok
+
+    # 多设备
+    def run_on_pool(self, kind, make_job, log):
+        """多设备模式：在设备池上并行执行 make_job(pool) 生成的任务并汇总结果"""
+        from device_pool import DevicePool, format_summary as format_pool_summary
+
+        pool = DevicePool(
+            serial_ports=str(self.config["pool_serial_ports"]).split(","),
+            baud=self.config["serial_baud"],
+            max_workers=int(self.config["pool_workers"] or 8),
+            log_dir=self.config["log_dir"],
+            on_line=log,
+            serial_options={
+                "mode": self.config["serial_cmd_mode"],
+                "prompt_regex": self.config["serial_prompt_regex"],
+                "default_timeout": float(self.config["serial_cmd_timeout"]),
+                "max_wait": float(self.config["serial_cmd_max_wait"]),
+                "strip_ansi": bool(self.config["serial_strip_ansi"]),
+            },
+            cancelled=(self.adb_cancel if kind == "adb" else self.serial_cancel).is_set)
+        try:
+            targets = pool.adb_targets() if kind == "adb" else pool.serial_targets()
+        except Exception as e:
+            log(f"[✗] 获取设备列表失败: {e}")
+            return False
+        if not targets:
+            log("[✗] 没有可用的 ADB 设备" if kind == "adb" else "[✗] 串口列表为空")
+            return False
+        log(f"[ℹ] 多设备执行: {len(targets)} 个目标，并发 {pool.max_workers}")
+        if kind == "adb":
+            self.adb_pool = pool
+        try:
+            results = pool.run(targets, make_job(pool))
+        finally:
+            if kind == "adb":
+                self.adb_pool = None
+        for line in format_pool_summary(results):
+            log(line)
+        return all(r.ok for r in results)
+
+    # 六个步骤
+    def step1(self, text, port=None, baud=None):
+        if self.config["pool_mode"]:
+            cmds = parse_commands(text)
+            return self.run_on_pool("serial", lambda pool: pool.serial_command_job(cmds), self.log_serial)
+        if not self.connect_serial(port, baud):
+            return False
+        return self.run_serial_commands(text)
+
+    def step2(self, text):
+        if self.config["pool_mode"]:
+            cmds = parse_commands(text)
+            timeout = float(self.config["adb_cmd_timeout"])
+            return self.run_on_pool("adb", lambda pool: pool.adb_command_job(cmds, timeout), self.log_adb)
+        return self.run_adb_commands(text)
+
+    def step3(self, pairs, text):
+        pairs = self._existing_files(pairs)
+        if self.config["pool_mode"]:
+            reboot_cmds = parse_commands(text)
+            return self.run_on_pool("adb", lambda pool: pool.push_job(
+                pairs, reboot_cmds, workers=self.config["push_workers"],
+                hash_cmd=self.config["push_hash_cmd"], cache_path=self.config["push_cache_file"]), self.log_adb)
+        try:
+            if not self.push_files(pairs):
+                return False
+            if self.config["boot_timing"]:
+                return self.timed_reboot(text)
+            return self.send_reboot_commands(text)
+        except Exception as e:
+            self.log_adb(f"[✗] ADB 上传失败: {e}")
+            return False
+
+    def step4(self, text):
+        if self.config["pool_mode"]:
+            cmds = parse_commands(text)
+            return self.run_on_pool("serial", lambda pool: pool.serial_command_job(cmds), self.log_serial)
+        if not self.serial_connected():
+            self.log_serial("[✗] 串口未连接")
+            return False
+        return self.run_serial_commands(text)
+
+    def step5(self, text):
+        return self.step4(text)
+
+    def step6(self, text):
+        return self.step2(text)
+
+    def run_step(self, n):
+        """按配置中的命令执行第 n 步（命令行入口使用）"""
+        text = self.config[f"step{n}_cmd"]
+        if n == 1:
+            return self.step1(text)
+        if n == 3:
+            return self.step3(push_pairs(self.config), text)
+        return getattr(self, f"step{n}")(text)
+
+    # logcat 持续抓取
+    def start_logcat(self):
+        if self.logcat and self.logcat.running:
+            return
+        log_filter = LogcatFilter(self.config["logcat_tags"], self.config["logcat_priority"],
+                                  self.config["logcat_pids"])
+        on_lines = (lambda lines: self.log_adb("\n".join(lines))) if self.config["logcat_to_view"] else None
+        self.logcat = LogcatCapture(
+            adb_client().device, self.config["log_dir"], log_filter,
+            buffers=self.config["logcat_buffers"], on_lines=on_lines, on_event=self.log_adb,
+            max_bytes=int(self.config["logcat_max_bytes"]),
+            backup_count=int(self.config["logcat_backup_count"])).start()
+
+    def stop_logcat(self):
+        if self.logcat:
+            self.logcat.stop()
+            stats = self.logcat.stats()
+            self.log_adb(f"[ℹ] logcat 抓取已停止: 保留 {stats['kept']} / 共 {stats['entries']} 条, "
+                         f"{stats['bytes'] / (1024 * 1024):.1f} MB")
+            self.logcat = None
+
+    def logcat_stats(self):
+        return self.logcat.stats() if self.logcat else None
+
+    def close(self):
+        if self.metrics_exporter:
+            self.metrics_exporter.close()
+        # 先停止监视：等待设备/重连中的任务随即返回，不拖慢退出
+        self.supervisor.close()
+        self.jobs.close()
+        self.stop_logcat()
+        self.stop_serial_monitor()
+        if self.trigger_engine:
+            self.trigger_engine.close()
+        if self.serial_conn:
+            try:
+                self.serial_conn.close()
+            except:
+                pass
+        if self.capture_writer:
+            self.capture_writer.close()
+        if self.broker:
+            self.broker.close()
+        if self.adb_session:
+            self.adb_session.close()
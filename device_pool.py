@@ -0,0 +1,251 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from log_writer import LogWriter
+from serial_commands import SerialCommandEngine, split_timeout
+from adb_session import AdbShellSession
+from push_engine import PushEngine, HashCache
+from stream_runner import StreamingCommand, split_prefixes
+
+
+class DeviceTarget:
+    """设备池中的一个目标：ADB 设备（序列号）或串口（端口名 / pyserial URL）"""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    @property
+    def label(self):
+        return f"{self.kind}:{self.name}"
+
+    @property
+    def file_stem(self):
+        return re.sub(r"[^A-Za-z0-9_.-]+", "_", self.label)
+
+    @property
+    def file_name(self):
+        return self.file_stem + ".log"
+
+
+class TargetResult:
+    def __init__(self, target):
+        self.target = target
+        self.ok = False
+        self.error = None
+        self.seconds = 0.0
+
+
+class DevicePool:
+    """多设备并行执行：在有界线程池上把同一步骤分发到所有 ADB 设备 / 串口
+
+    每个目标的日志写入 log_dir/devices/<目标>.log，同时以 [目标] 前缀回调 on_line。
+    adb_client 需提供 device_list() 与 device(serial=...)（默认 adbutils.adb，可替换为替身）；
+    serial_opener(url, baud) 返回串口对象（默认 serial.serial_for_url，支持 loop://）。
+    cancelled() 返回真时跳过剩余命令；cancel() 同时终止各设备正在运行的本地命令。
+    """
+
+    def __init__(self, adb_client=None, serial_ports=(), baud=115200, max_workers=8,
+                 log_dir="./logs/", on_line=None, serial_opener=None, serial_options=None, cancelled=None):
+        if adb_client is None:
+            from adbutils import adb as adb_client
+        self.adb_client = adb_client
+        # 去重并保持顺序，同一端口只能打开一次
+        self.serial_ports = list(dict.fromkeys(p.strip() for p in serial_ports if p.strip()))
+        self.baud = int(baud)
+        self.max_workers = max(1, int(max_workers))
+        self.log_dir = os.path.join(log_dir, "devices")
+        self.on_line = on_line
+        self.serial_opener = serial_opener or self._open_serial
+        self.serial_options = serial_options or {}
+        self._cancel = threading.Event()
+        self.cancelled = cancelled or self._cancel.is_set
+        self._local_cmds = set()            # 正在运行的本地命令（各设备一个）
+        self._local_lock = threading.Lock()
+
+    def cancel(self):
+        """跳过剩余命令，并终止所有设备正在运行的本地命令"""
+        self._cancel.set()
+        with self._local_lock:
+            runners = list(self._local_cmds)
+        for runner in runners:
+            runner.cancel()
+
+    @staticmethod
+    def _open_serial(url, baud):
+        import serial
+        return serial.serial_for_url(url, baudrate=baud, timeout=0.2)
+
+    def adb_targets(self):
+        return [DeviceTarget("adb", d.serial) for d in self.adb_client.device_list()]
+
+    def serial_targets(self):
+        return [DeviceTarget("serial", port) for port in self.serial_ports]
+
+    def run(self, targets, job):
+        """对每个目标并行执行 job(target, log)，返回 TargetResult 列表（顺序与 targets 一致）"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda t: self._run_one(t, job), targets))
+
+    def _run_one(self, target, job):
+        result = TargetResult(target)
+        writer = LogWriter(self.log_dir, target.file_name).start()
+
+        def log(msg):
+            writer.write_lines([msg])
+            if self.on_line:
+                self.on_line(f"[{target.name}] {msg}")
+
+        start = time.perf_counter()
+        try:
+            result.ok = job(target, log) is not False
+        except Exception as e:
+            result.error = e
+            log(f"[✗] 执行失败: {e}")
+        finally:
+            result.seconds = time.perf_counter() - start
+            writer.close()
+        return result
+
+    def _is_cancelled(self):
+        return self._cancel.is_set() or self.cancelled()
+
+    def work_dir(self, target):
+        """目标的工作目录 log_dir/devices/<目标>/：本地命令在其中执行，相对路径的输出文件互不覆盖"""
+        path = os.path.join(self.log_dir, target.file_stem)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _run_local_command(self, target, cmd, options, log):
+        """在目标的工作目录中流式执行本地命令，支持 @timeout / @tee 前缀与取消（同单设备模式）"""
+        timeout = float(options["timeout"]) if "timeout" in options else None
+        cwd = self.work_dir(target)
+        tee = options.get("tee")
+        if tee:
+            tee = os.path.join(cwd, tee.replace("{serial}", target.name))
+        runner = StreamingCommand(cmd, log, tee_path=tee, timeout=timeout, cwd=cwd)
+        log(f"[ADB TOOL] {cmd}")
+        with self._local_lock:
+            self._local_cmds.add(runner)
+        if self._is_cancelled():
+            runner.cancel()  # 取消请求在登记之前到达
+        try:
+            code = runner.run()
+        finally:
+            with self._local_lock:
+                self._local_cmds.discard(runner)
+        summary = f"{runner.lines} 行 / {runner.bytes_read / 1024:.1f} KB / {runner.elapsed:.1f}s"
+        if runner.cancelled:
+            log(f"[⚠] 已取消: {cmd} ({summary})")
+        elif runner.timed_out:
+            log(f"[⚠] 超时 {timeout}s 已终止: {cmd} ({summary})")
+        else:
+            log(f"[ℹ] 退出码 {code} ({summary})")
+        return code == 0 and not runner.cancelled and not runner.timed_out
+
+    # 内置步骤
+    def adb_command_job(self, cmds, timeout=30.0):
+        """在每台 ADB 设备上执行命令：shell 命令经持久会话批量执行
+
+        本地 adb 命令自动加 -s 序列号，在该设备的工作目录（work_dir）中执行，命令中的 {serial} 替换为序列号。
+        """
+        def job(target, log):
+            session = AdbShellSession(lambda: self.adb_client.device(serial=target.name),
+                                      timeout=timeout, on_event=log)
+            ok = True
+
+            def flush(batch):
+                # 批次已全部执行，逐条输出结果后再汇总成败
+                results = session.run_batch(batch) if batch else []
+                for r in results:
+                    log(f"$ {r.cmd}")
+                    log(r.output if r.output else "(无输出)")
+                    if r.error:
+                        log(f"[⚠] {r.error}")
+                    elif r.exit_code:
+                        log(f"[⚠] 退出码: {r.exit_code}")
+                return all(not r.error and not r.exit_code for r in results)
+
+            try:
+                batch = []
+                for cmd in cmds:
+                    options, local_cmd = split_prefixes(cmd)
+                    if local_cmd.startswith("adb "):
+                        ok = flush(batch) and ok
+                        batch = []
+                        if self._is_cancelled():
+                            return False
+                        local_cmd = f"adb -s {target.name} " + local_cmd[4:].replace("{serial}", target.name)
+                        ok = self._run_local_command(target, local_cmd, options, log) and ok
+                    else:
+                        batch.append(cmd)
+                if self._is_cancelled():
+                    return False
+                ok = flush(batch) and ok
+            finally:
+                session.close()
+            return ok
+        return job
+
+    def push_job(self, pairs, reboot_cmds=(), workers=3, hash_cmd="md5sum", cache_path=None):
+        """在每台 ADB 设备上增量推送文件，随后执行重启等命令
+
+        本地哈希只与文件有关，所有设备共用同一个 HashCache（内部加锁），每个文件只计算一次，缓存文件不会被并发写坏。
+        """
+        cache = HashCache(cache_path)
+
+        def job(target, log):
+            factory = lambda: self.adb_client.device(serial=target.name)
+            engine = PushEngine(factory, max_workers=workers, hash_cmd=hash_cmd, on_event=log, cache=cache)
+            results = engine.push_all(pairs)
+            if any(r.error is not None for r in results):
+                return False
+            d = factory()
+            for cmd in reboot_cmds:
+                d.shell(cmd)
+                log(f"$ {cmd} → 已发送")
+            return True
+        return job
+
+    def serial_command_job(self, cmds):
+        """在每个串口上打开连接并逐条执行命令（检测提示符/结束标记）"""
+        def job(target, log):
+            conn = self.serial_opener(target.name, self.baud)
+            running = [True]
+            engine = SerialCommandEngine(conn, lambda line, ts: log(line), **self.serial_options)
+            reader = threading.Thread(target=engine.run, args=(lambda: running[0],), daemon=True)
+            reader.start()
+            ok = True
+            try:
+                for cmd in cmds:
+                    if self._is_cancelled():
+                        return False
+                    timeout, cmd = split_timeout(cmd)
+                    r = engine.execute(cmd, timeout)
+                    log(f"$ {cmd}  ({r.elapsed:.2f}s)")
+                    if r.output:
+                        log(r.output)
+                    if not r.completed and engine.mode == "prompt":
+                        log(f"[ℹ] 命令 '{cmd}' 在超时内未检测到提示符")
+                    elif not r.completed:
+                        log(f"[⚠] 命令 '{cmd}' 未在超时内完成")
+                        ok = False
+            finally:
+                running[0] = False
+                reader.join(1)
+                conn.close()
+            return ok
+        return job
+
+
+def format_summary(results):
+    """生成多设备执行汇总（每个目标的耗时与结果）"""
+    lines = [f"[ℹ] 多设备执行完成: 成功 {sum(r.ok for r in results)} / 共 {len(results)}"]
+    for r in results:
+        status = "✓" if r.ok else "✗"
+        detail = f" - {r.error}" if r.error else ""
+        lines.append(f"  [{status}] {r.target.label:<28} {r.seconds:6.2f}s{detail}")
+    return lines
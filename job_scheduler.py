@@ -0,0 +1,189 @@
+import time
+import threading
+import itertools
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+STATE_LABELS = {QUEUED: "排队中", RUNNING: "运行中", DONE: "完成", FAILED: "失败", CANCELLED: "已取消"}
+
+
+class Job:
+    """一个排队执行的任务
+
+    func() 返回 False 或抛出异常视为失败；resources 为占用的资源名（如 "serial"、"adb"）。
+    on_cancel() 在取消运行中的任务时调用，用来打断阻塞中的操作（任务本身需要配合检查取消标志）。
+    """
+
+    def __init__(self, job_id, name, func, resources=(), on_cancel=None):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.resources = tuple(resources)
+        self.on_cancel = on_cancel
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    @property
+    def wait_s(self):
+        """排队耗时（秒）"""
+        return (self.started or self.finished or time.time()) - self.submitted
+
+    @property
+    def run_s(self):
+        """运行耗时（秒），尚未开始时为 None"""
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+class JobScheduler:
+    """按资源串行、跨资源并行的任务调度器
+
+    提交的任务按顺序排队；所需资源全部空闲、且没有更早的排队任务在等同一资源时，立即在新线程中启动
+    （同一资源先来先服务，后提交的任务不会插队），结束后释放资源并继续调度。
+    on_event(msg, resources) 输出排队/取消/结束信息（调用方按 resources 决定写入哪个日志窗口）；
+    version 在任务状态变化时递增，界面据此刷新。
+    """
+
+    def __init__(self, on_event=None, keep_finished=50):
+        self.on_event = on_event
+        self.keep_finished = keep_finished
+        self.version = 0
+        self._jobs = []            # 排队/运行中的任务与最近结束的任务，按提交顺序
+        self._busy = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def _event(self, resources, msg):
+        if self.on_event:
+            self.on_event(msg, resources)
+
+    def submit(self, name, func, resources=(), on_cancel=None, unique=False):
+        """提交任务并返回 Job；unique 为真时同名任务已在排队或运行则不再重复提交，返回 None"""
+        with self._lock:
+            if unique and any(j.name == name and j.active for j in self._jobs):
+                duplicate = True
+            else:
+                duplicate = False
+                job = Job(next(self._ids), name, func, resources, on_cancel)
+                self._jobs.append(job)
+                self._changed()
+                self._dispatch()
+        if duplicate:
+            self._event(tuple(resources), f"[ℹ] {name} 已在排队或运行中，忽略重复提交")
+            return None
+        if job.state == QUEUED:
+            self._event(job.resources, f"[ℹ] #{job.id} {name} 已排队（等待 {', '.join(job.resources)}）")
+        return job
+
+    def _changed(self):
+        self.version += 1
+
+    def _dispatch(self):
+        """（持有锁）按提交顺序启动资源已空闲的排队任务"""
+        blocked = set(self._busy)
+        for job in self._jobs:
+            if job.state != QUEUED:
+                continue
+            if blocked.isdisjoint(job.resources):
+                job.state = RUNNING
+                job.started = time.time()
+                self._busy.update(job.resources)
+                self._changed()
+                threading.Thread(target=self._run, args=(job,), name=f"Job-{job.id}", daemon=True).start()
+            # 更早的排队任务占着的资源，后面的任务不能插队
+            blocked.update(job.resources)
+
+    def _run(self, job):
+        if job.wait_s >= 0.1:
+            self._event(job.resources, f"[ℹ] #{job.id} {job.name} 开始（排队 {job.wait_s:.1f}s）")
+        try:
+            job.result = job.func()
+            state = FAILED if job.result is False else DONE
+        except Exception as e:
+            job.error = str(e)
+            state = FAILED
+        if job.cancel_requested.is_set():
+            state = CANCELLED
+        with self._lock:
+            job.state = state
+            job.finished = time.time()
+            self._busy.difference_update(job.resources)
+            self._trim()
+            self._changed()
+            self._dispatch()
+            self._idle.notify_all()
+        mark = {DONE: "✓", FAILED: "✗", CANCELLED: "⚠"}[state]
+        error = f": {job.error}" if job.error else ""
+        self._event(job.resources, f"[{mark}] #{job.id} {job.name} {STATE_LABELS[state]}{error}（运行 {job.run_s:.1f}s）")
+
+    def _trim(self):
+        finished = [j for j in self._jobs if not j.active]
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            self._jobs.remove(job)
+
+    def cancel(self, job_id):
+        """取消排队中的任务（直接移出队列）或运行中的任务（置取消标志并调用 on_cancel）"""
+        with self._lock:
+            job = next((j for j in self._jobs if j.id == job_id and j.active), None)
+            if job is None:
+                return False
+            job.cancel_requested.set()
+            running = job.state == RUNNING
+            if not running:
+                job.state = CANCELLED
+                job.finished = time.time()
+                self._changed()
+                self._dispatch()
+                self._idle.notify_all()
+        if running:
+            self._event(job.resources, f"[ℹ] 正在取消 #{job.id} {job.name}...")
+            if job.on_cancel:
+                try:
+                    job.on_cancel()
+                except Exception as e:
+                    self._event(job.resources, f"[⚠] 取消 #{job.id} 时出错: {e}")
+        else:
+            self._event(job.resources, f"[⚠] #{job.id} {job.name} 已从队列中取消")
+        return True
+
+    def cancel_all(self, resource=None):
+        """取消全部（或占用 resource 的）排队与运行中的任务；先取消排队的，避免它们在运行任务结束后启动"""
+        jobs = [j for j in self.jobs() if j.active and (resource is None or resource in j.resources)]
+        jobs.sort(key=lambda j: j.state == RUNNING)
+        for job in jobs:
+            self.cancel(job.id)
+        return len(jobs)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs)
+
+    def wait_idle(self, timeout=None):
+        """等待所有任务结束，返回是否已空闲"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while any(j.active for j in self._jobs):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return True
+
+    def close(self, timeout=5.0):
+        self.cancel_all()
+        return self.wait_idle(timeout)
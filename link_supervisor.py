@@ -0,0 +1,262 @@
+import os
+import time
+import random
+import threading
+
+
+class Backoff:
+    """带抖动的指数退避：第 n 次等待在 base*2^n 的一半到全值之间随机（不超过 cap），
+    多个进程/通道同时重连时不会在同一时刻集中重试"""
+
+    def __init__(self, base=0.5, cap=10.0):
+        self.base = base
+        self.cap = cap
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.cap, self.base * (2 ** self.attempts))
+        self.attempts += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempts = 0
+
+
+def port_present(port, ports):
+    """串口是否存在：/dev/ 路径直接检查文件（含 by-id 等符号链接），COM 口查枚举结果；
+    socket:// 等 URL 无法枚举，返回 None"""
+    if "://" in port:
+        return None
+    if os.name == "posix" and port.startswith("/dev/"):
+        return os.path.exists(port)
+    return port.upper() in ports
+
+
+class LinkSupervisor:
+    """串口与 ADB 的掉线/上线监视与重连
+
+    串口：后台线程按 scan_interval 读取系统串口枚举（serial.tools.list_ports，不打开端口），
+    正在使用的端口从枚举中消失时回调 on_port_lost(port)（部分 USB 转串口驱动拔出后读取既不报错也不返回数据，
+    只能靠枚举发现）；枚举较慢，平时间隔较长，读取出错（reconnect）或 rescan_ports() 时立即重新枚举，
+    等待端口重新出现期间按 rescan_interval 枚举；reconnect() 等端口重新出现后按带抖动的指数退避尝试打开。
+    ADB：后台线程读取 adb server 的 track-devices 推送（adbutils track_devices），设备状态变化时回调
+    on_adb_change(serial, status, offline_s)，wait_adb() 在设备上线时立即返回；adb server 不可用时按退避重连。
+    on_event(msg, resources) 输出提示信息，resources 为 ("serial",) 或 ("adb",)。
+    """
+
+    def __init__(self, on_event=None, scan_interval=2.0, backoff_base=0.5, backoff_max=10.0, rescan_interval=0.5):
+        self.on_event = on_event
+        self.scan_interval = scan_interval
+        self.rescan_interval = rescan_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_port_lost = None
+        self.on_adb_change = None
+        self.ports = set()              # 最近一次枚举到的串口（大写）
+        self.adb_devices = {}           # 序列号 -> 状态（device / offline / unauthorized ...）
+        self.adb_tracking = False       # track-devices 推送是否正常
+        self.adb_version = 0            # 设备状态每变化一次加一（wait_adb_change 用）
+        self._adb_seen = False          # 是否出现过可用设备（从未连接过设备时不等待）
+        self._offline_since = {}
+        self._watched_port = None
+        self._cond = threading.Condition()
+        self._scanned = threading.Event()
+        self._rescan = threading.Event()
+        self._port_waiters = 0          # 正在 wait_port 的调用数，期间缩短枚举间隔
+        self._stop = threading.Event()
+        self._port_thread = None
+        self._adb_thread = None
+
+    def _event(self, resource, msg):
+        if self.on_event:
+            self.on_event(msg, (resource,))
+
+    def backoff(self):
+        return Backoff(self.backoff_base, self.backoff_max)
+
+    # 串口
+    def watch_port(self, port):
+        """监视 port 的插拔（None 表示不再监视）；首次调用时启动枚举线程"""
+        self._watched_port = port
+        if port and self._port_thread is None:
+            self._port_thread = threading.Thread(target=self._scan_ports, name="PortWatch", daemon=True)
+            self._port_thread.start()
+
+    def _scan_ports(self):
+        from serial.tools import list_ports
+
+        watched = None
+        present = None
+        while not self._stop.is_set():
+            try:
+                ports = {p.device.upper() for p in list_ports.comports()}
+            except Exception:
+                ports = self.ports
+            with self._cond:
+                self.ports = ports
+                self._cond.notify_all()
+            self._scanned.set()
+            port = self._watched_port
+            if port != watched:
+                watched, present = port, None
+            if port:
+                now = port_present(port, ports)
+                if present and now is False and self.on_port_lost:
+                    self.on_port_lost(port)
+                present = now
+            self._rescan.wait(self.rescan_interval if self._port_waiters else self.scan_interval)
+            self._rescan.clear()
+
+    def rescan_ports(self):
+        """立即重新枚举串口（如读取出错后），不必等到下一个 scan_interval"""
+        self._rescan.set()
+
+    def wait_port(self, port, timeout):
+        """等待端口出现在枚举中，返回是否存在（URL 端口视为存在）"""
+        if "://" not in port and not port.startswith("/dev/"):
+            self._scanned.wait(timeout)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._port_waiters += 1
+            try:
+                while port_present(port, self.ports) is False:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._stop.is_set():
+                        return False
+                    self._cond.wait(min(remaining, self.rescan_interval))
+            finally:
+                self._port_waiters -= 1
+        return True
+
+    def reconnect(self, port, open_func, is_running):
+        """等端口重新出现后调用 open_func() 打开，失败按退避重试，直到成功或 is_running() 为假
+
+        返回 (连接, 尝试次数, 端口出现到打开成功的秒数)；放弃时连接为 None。
+        """
+        self.watch_port(port)
+        # 读取出错后才进入重连：立即重新枚举，之后等待期间按 rescan_interval 枚举
+        self.rescan_ports()
+        backoff = self.backoff()
+        attempts = 0
+        appeared = None
+        last_error = None
+        while is_running() and not self._stop.is_set():
+            if not self.wait_port(port, 0.2):
+                appeared = None
+                continue
+            if appeared is None:
+                appeared = time.monotonic()
+            attempts += 1
+            try:
+                return open_func(), attempts, time.monotonic() - appeared
+            except Exception as e:
+                if str(e) != last_error:
+                    last_error = str(e)
+                    self._event("serial", f"[⚠] 重新打开串口 {port} 失败: {e}（稍后重试）")
+            deadline = time.monotonic() + backoff.next()
+            while time.monotonic() < deadline and is_running():
+                time.sleep(0.05)
+        return None, attempts, None
+
+    # ADB
+    def watch_adb(self, client_factory):
+        """开始跟踪 adb 设备（只启动一次）；client_factory() 返回 adbutils 的 AdbClient"""
+        if self._adb_thread is None:
+            self._adb_thread = threading.Thread(target=self._track_adb, args=(client_factory,),
+                                                name="AdbTrack", daemon=True)
+            self._adb_thread.start()
+
+    def _track_adb(self, client_factory):
+        backoff = self.backoff()
+        reported = False
+        while not self._stop.is_set():
+            error = None
+            try:
+                for event in client_factory().track_devices():
+                    if not self.adb_tracking:
+                        self.adb_tracking = True
+                        backoff.reset()
+                        reported = False
+                    self._adb_update(event.serial, event.status if event.present else "absent")
+                    if self._stop.is_set():
+                        return
+            except Exception as e:
+                error = e
+            if self.adb_tracking or not reported:
+                self._event("adb", f"[⚠] 无法跟踪 ADB 设备（adb server 未运行或已重启？）: {error}，稍后重试")
+                reported = True
+            self.adb_tracking = False
+            # adb server 断开后设备全部视为离线，重连后 track-devices 会重新推送完整列表
+            for serial in list(self.adb_devices):
+                self._adb_update(serial, "absent")
+            self._stop.wait(backoff.next())
+
+    def _adb_update(self, serial, status):
+        now = time.monotonic()
+        offline_s = None
+        with self._cond:
+            old = self.adb_devices.get(serial)
+            if status == "absent":
+                self.adb_devices.pop(serial, None)
+            else:
+                self.adb_devices[serial] = status
+            if status == "device":
+                self._adb_seen = True
+                if serial in self._offline_since:
+                    offline_s = now - self._offline_since.pop(serial)
+            elif old == "device":
+                self._offline_since[serial] = now
+            self.adb_version += 1
+            self._cond.notify_all()
+        if old != status and self.on_adb_change:
+            self.on_adb_change(serial, status, offline_s)
+
+    def adb_online(self):
+        return any(s == "device" for s in self.adb_devices.values())
+
+    def adb_lost(self):
+        """可用的 ADB 设备曾经出现、现在全部离线（从未连接过设备时为假）"""
+        return self.adb_tracking and self._adb_seen and not self.adb_online()
+
+    def wait_adb(self, timeout, cancelled=None):
+        """等待任一 ADB 设备上线（由 track-devices 推送唤醒，不轮询设备），返回是否已上线；未在跟踪时立即返回 None"""
+        if not self.adb_tracking:
+            return None
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.adb_online():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set() or (cancelled and cancelled()):
+                    return False
+                self._cond.wait(min(remaining, 0.5))
+        return True
+
+    def wait_adb_change(self, version, timeout):
+        """等待设备状态在 adb_version == version 之后发生变化（track-devices 推送唤醒），返回是否已变化"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.adb_version == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def wait_devices(self, timeout):
+        """等待 track-devices 推送出任一设备（启动时的设备发现用），返回设备状态的副本；超时返回空字典，已关闭时返回 None"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.adb_devices and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, 0.5))
+            if self._stop.is_set():
+                return None
+            return dict(self.adb_devices)
+
+    def close(self):
+        self._stop.set()
+        self._rescan.set()
+        with self._cond:
+            self._cond.notify_all()
@@ -0,0 +1,302 @@
+import os
+import glob
+import mmap
+import time
+import bisect
+import threading
+import itertools
+from array import array
+from collections import deque
+
+
+def session_path(directory, name):
+    """返回本次会话的段文件路径，如 serial_20240101-120000.history；同一秒内重复创建时追加序号，不会覆盖已有文件"""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{name}_{stamp}.history")
+    for n in itertools.count(1):
+        if not os.path.exists(path):
+            return path
+        path = os.path.join(directory, f"{name}_{stamp}_{n}.history")
+
+
+def remove_stale(directory, name, max_age=3600):
+    """删除之前会话遗留的段文件（异常退出时未能删除），max_age 秒内仍在写入的文件视为其它实例正在使用"""
+    now = time.time()
+    removed = 0
+    for path in glob.glob(os.path.join(directory, f"{name}_*.history*")):
+        try:
+            if now - os.path.getmtime(path) >= max_age:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class _Segment:
+    def __init__(self, path, start, first_line):
+        self.path = path
+        self.start = start            # 本段第一个字节的全局偏移
+        self.first_line = first_line  # 本段第一行的行号
+        self.mmap = None
+        self.reader = None
+
+
+class LogHistory:
+    """有界内存的日志历史：内存中只保留最近 ring_size 行，全部历史写入磁盘段文件
+
+    段文件按行追加（UTF-8，每行以 \\n 结尾），每 index_stride 行记录一次字节偏移，
+    回看旧日志时通过 mmap 定位，只解码当前页需要的行。
+    到达时间按秒级检查点记录（行号 + 时间），用于按时间范围换算行号。
+    append() 只更新内存（界面线程调用），文件写入在后台写入线程中进行。
+    max_bytes 限制磁盘占用：段文件写满 max_bytes/2 后换新文件并删除更早的文件，最早的行随之不可回看（first_line）。
+    段文件只是本次会话的回看缓存（完整日志由 LogWriter 保存），close() 时默认删除。
+    """
+
+    def __init__(self, path, ring_size=5000, index_stride=64, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ring_size = ring_size
+        self.index_stride = index_stride
+        self.segment_bytes = max(1, int(max_bytes) // 2) if max_bytes else None
+        self._ring = deque(maxlen=ring_size)
+        self._index = array('Q')  # 第 i*index_stride 行的起始偏移（全局）
+        self._time_lines = array('Q')   # 时间检查点：自该行起的日志到达时间
+        self._time_values = array('d')
+        self._count = 0
+        self._offset = 0
+        self._first_line = 0
+        self._lock = threading.Lock()       # 内存状态（界面线程只持有很短时间）
+        self._io_lock = threading.Lock()    # 段文件与 mmap（读取线程之间、读取与换段之间）
+        self._written_cond = threading.Condition(threading.Lock())
+        self._pending = []                  # 待写入的字节块，或换段标记 _Segment
+        self._written = 0                   # 已写入并刷新到文件的全局偏移
+        self._closed = False
+        self._segments = [_Segment(path, 0, 0)]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = None
+        self._thread = threading.Thread(target=self._writer, name="LogHistory", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def first_line(self):
+        """仍可回看的最早行号（超出 max_bytes 的旧段已删除）"""
+        return self._first_line
+
+    def append(self, msgs):
+        """追加一批消息；多行消息按行拆分，与日志窗口的行号保持一致"""
+        now = time.time()
+        chunk = bytearray()
+        with self._lock:
+            if not self._time_values or now - self._time_values[-1] >= 1.0:
+                self._time_lines.append(self._count)
+                self._time_values.append(now)
+            for msg in msgs:
+                for line in msg.split("\n"):
+                    data = line.encode("utf-8", errors="replace") + b"\n"
+                    if self._count % self.index_stride == 0:
+                        self._index.append(self._offset)
+                        # 只在索引块边界换段，每个索引块都完整位于一个段文件中
+                        if self.segment_bytes and self._offset - self._segments[-1].start >= self.segment_bytes:
+                            self._roll(chunk)
+                            chunk = bytearray()
+                    chunk += data
+                    self._offset += len(data)
+                    self._count += 1
+                    self._ring.append(line)
+            if chunk:
+                self._queue(chunk)
+
+    def _roll(self, chunk):
+        """（持有 _lock）开始新的段文件，只保留最近两段"""
+        if chunk:
+            self._queue(chunk)
+        segment = _Segment(f"{self.path}.{self._count}", self._offset, self._count)
+        self._segments.append(segment)
+        self._queue(segment)
+        if len(self._segments) > 2:
+            self._first_line = self._segments[-2].first_line
+
+    def _queue(self, item):
+        with self._written_cond:
+            self._pending.append(item)
+            self._written_cond.notify_all()
+
+    def _writer(self):
+        """写入线程：把 append() 积累的字节写入当前段文件并刷新，换段时删除过旧的段"""
+        segment = self._segments[0]
+        while True:
+            with self._written_cond:
+                while not self._pending and not self._closed:
+                    self._written_cond.wait()
+                items, self._pending = self._pending, []
+                closed = self._closed
+            written = 0
+            try:
+                for item in items:
+                    if isinstance(item, _Segment):
+                        if self._file is not None:
+                            self._file.close()
+                            self._file = None
+                        segment = item
+                        self._drop_old_segments(item)
+                        continue
+                    # 写入失败（如磁盘已满）也照常推进，读取方不会一直等待
+                    written += len(item)
+                    if self._file is None:
+                        self._file = open(segment.path, "wb", buffering=1024 * 1024)
+                    self._file.write(item)
+                if self._file is not None:
+                    self._file.flush()
+            except OSError:
+                written = sum(len(item) for item in items if not isinstance(item, _Segment))
+            with self._written_cond:
+                self._written += written
+                self._written_cond.notify_all()
+            if closed and not items:
+                break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _drop_old_segments(self, current):
+        """（写入线程）开始写 current 时，删除它前一段之前的段（写入落后时，更新的段文件尚未创建，不能按总数删除）"""
+        with self._io_lock:
+            for _ in range(self._segments.index(current) - 1):
+                old = self._segments.pop(0)
+                self._close_segment(old)
+                try:
+                    os.remove(old.path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _close_segment(segment):
+        for f in (segment.mmap, segment.reader):
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+        segment.mmap = segment.reader = None
+
+    def _wait_written(self, offset):
+        with self._written_cond:
+            while self._written < offset and not self._closed:
+                self._written_cond.wait(1.0)
+
+    def tail(self, n):
+        """返回最近 n 行（直接取自内存环）"""
+        with self._lock:
+            n = min(n, len(self._ring))
+            return list(itertools.islice(self._ring, len(self._ring) - n, None))
+
+    def get_lines(self, start, count):
+        """返回第 start 行起的 count 行；超出内存环的部分经 mmap 从段文件读取（已删除的旧段不返回）"""
+        with self._lock:
+            start = max(self._first_line, start)
+            end = min(self._count, start + count)
+            if start >= end:
+                return []
+            ring_start = self._count - len(self._ring)
+            if start >= ring_start:
+                return list(itertools.islice(self._ring, start - ring_start, end - ring_start))
+        data = self.read_bytes(start, end)
+        return data.decode("utf-8", errors="replace").split("\n")[:-1]
+
+    def line_range(self, since=None, until=None):
+        """按到达时间（秒级精度，宁多勿少）换算行号范围 [start, end)"""
+        with self._lock:
+            start, end = self._first_line, self._count
+            if since is not None:
+                i = bisect.bisect_right(self._time_values, since) - 1
+                start = max(start, self._time_lines[i] if i >= 0 else 0)
+            if until is not None:
+                i = bisect.bisect_right(self._time_values, until)
+                end = self._time_lines[i] if i < len(self._time_lines) else self._count
+            return start, end
+
+    def read_bytes(self, start, end):
+        """返回第 start 行到第 end 行（不含）的原始字节，每行以 \\n 结尾，供索引与搜索使用
+
+        在调用线程中读取文件，不持有 append() 使用的锁；需要的数据尚未写入时等待写入线程。
+        """
+        with self._lock:
+            start = max(self._first_line, start)
+            end = min(self._count, end)
+            if start >= end:
+                return b""
+            stride = self.index_stride
+            lo = (self._index[start // stride], start % stride)
+            if end >= self._count:
+                hi, need = (self._offset, 0), self._offset
+            else:
+                hi = (self._index[end // stride], end % stride)
+                block_end = end // stride + 1
+                need = self._index[block_end] if block_end < len(self._index) else self._offset
+        self._wait_written(need)
+        with self._io_lock:
+            a, b = self._resolve(*lo), self._resolve(*hi)
+            if a is None or b is None or a < self._segments[0].start:
+                return b""   # 读取期间该段已被删除
+            return self._slice(a, b)
+
+    def _find_segment(self, offset):
+        """（持有 _io_lock）返回包含全局偏移 offset 的段"""
+        starts = [s.start for s in self._segments]
+        i = bisect.bisect_right(starts, offset) - 1
+        return self._segments[i] if i >= 0 else None
+
+    def _resolve(self, base, skip):
+        """（持有 _io_lock）索引偏移 base 之后再跳过 skip 行，得到全局偏移"""
+        if skip == 0:
+            return base
+        segment = self._find_segment(base)
+        if segment is None:
+            return None
+        mm = self._map(segment)
+        pos = base - segment.start
+        for _ in range(skip):
+            pos = mm.find(b"\n", pos) + 1
+        return segment.start + pos
+
+    def _slice(self, a, b):
+        """（持有 _io_lock）读取全局偏移 [a, b) 的字节，可跨段"""
+        parts = []
+        for i, segment in enumerate(self._segments):
+            end = self._segments[i + 1].start if i + 1 < len(self._segments) else b
+            lo, hi = max(a, segment.start), min(b, end)
+            if lo < hi:
+                parts.append(self._map(segment)[lo - segment.start:hi - segment.start])
+        return b"".join(parts)
+
+    def _map(self, segment):
+        """（持有 _io_lock）按需重新映射段文件（文件增长后才重新 mmap）"""
+        size = os.path.getsize(segment.path)
+        if segment.mmap is None or len(segment.mmap) < size:
+            if segment.mmap is not None:
+                segment.mmap.close()
+            if segment.reader is None:
+                segment.reader = open(segment.path, "rb")
+            segment.mmap = mmap.mmap(segment.reader.fileno(), 0, access=mmap.ACCESS_READ)
+        return segment.mmap
+
+    def close(self, remove=True):
+        """停止写入线程；remove 为真时删除本次会话的段文件"""
+        with self._written_cond:
+            self._closed = True
+            self._written_cond.notify_all()
+        self._thread.join(10)
+        with self._io_lock:
+            for segment in self._segments:
+                self._close_segment(segment)
+                if remove:
+                    try:
+                        os.remove(segment.path)
+                    except OSError:
+                        pass
@@ -0,0 +1,330 @@
+import re
+import time
+import datetime
+import threading
+
+# 索引只收录 ASCII 单词字符组成的三元组（小写），中文等内容不建索引，查询时直接扫描
+_TOKEN_RE = re.compile(rb"\w{3,}")
+_TRIGRAM_RE = re.compile(rb"(?=(\w\w\w))")
+_QUERY_TOKEN_RE = re.compile(r"[A-Za-z0-9_]{3,}")
+# 带定长参数的转义：参数是编码值，不是字面内容
+_ESCAPE_ARG_LEN = {"x": 2, "u": 4, "U": 8}
+
+
+def block_trigrams(data):
+    """返回一段日志中所有单词内部三元组的集合（小写字节串）"""
+    # 先对单词去重，再在 C 层用前瞻匹配取出所有重叠三元组
+    tokens = set(_TOKEN_RE.findall(data.lower()))
+    return set(_TRIGRAM_RE.findall(b" ".join(tokens)))
+
+
+def regex_literals(pattern):
+    """从正则中提取一定会出现的字面单词片段（用于三元组预筛选）
+
+    只做保守分析：含 | 或 (? 结构、分组后跟可选量词时放弃预筛选；转义、字符类、可选量词处断开片段，
+    {m,n} 量词整体跳过（其中的数字不是字面内容），\\xhh、\\uhhhh、\\Uhhhhhhhh、\\N{...}、\\数字 转义连同参数一起跳过。
+    """
+    if "|" in pattern or "(?" in pattern or re.search(r"\)[?*{]", pattern):
+        return []
+    runs = []
+    current = ""
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        c = pattern[i]
+        if in_class:
+            if c == "\\":
+                i += 1
+            elif c == "]":
+                in_class = False
+        elif c == "\\":
+            runs.append(current)
+            current = ""
+            i += 1
+            escape = pattern[i:i + 1]
+            if escape in _ESCAPE_ARG_LEN:
+                i += _ESCAPE_ARG_LEN[escape]
+            elif escape == "N" and pattern[i + 1:i + 2] == "{":
+                close = pattern.find("}", i)
+                if close > 0:
+                    i = close
+            elif escape.isdigit():
+                # 八进制转义或反向引用，最多三位数字
+                for _ in range(2):
+                    if pattern[i + 1:i + 2].isdigit():
+                        i += 1
+        elif c == "[":
+            runs.append(current)
+            current = ""
+            in_class = True
+        elif c in "?*{":
+            # 前一个字符可以不出现
+            runs.append(current[:-1])
+            current = ""
+            if c == "{":
+                close = pattern.find("}", i)
+                if close > 0:
+                    i = close
+        elif c.isascii() and (c.isalnum() or c == "_"):
+            current += c
+        else:
+            runs.append(current)
+            current = ""
+        i += 1
+    runs.append(current)
+    return [r for r in runs if len(r) >= 3]
+
+
+def parse_time(text, now=None):
+    """解析时间过滤条件：HH:MM[:SS]（今天）、YYYY-MM-DD HH:MM[:SS]，或 -10m / -2h / -30s（相对现在）"""
+    text = text.strip()
+    if not text:
+        return None
+    now = now or time.time()
+    m = re.fullmatch(r"-(\d+(?:\.\d+)?)([smh])", text)
+    if m:
+        return now - float(m.group(1)) * {"s": 1, "m": 60, "h": 3600}[m.group(2)]
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%H:%M:%S", "%H:%M"):
+        try:
+            t = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if fmt.startswith("%H"):
+            today = datetime.datetime.fromtimestamp(now)
+            t = t.replace(year=today.year, month=today.month, day=today.day)
+        return t.timestamp()
+    raise ValueError(f"无法识别的时间: {text}（示例 14:30、2024-05-01 14:30:00、-10m）")
+
+
+class LogQuery:
+    """一次查询：子串或正则，可选区分大小写与到达时间范围（秒级时间戳）"""
+
+    def __init__(self, text="", regex=False, case=False, since=None, until=None):
+        self.text = text
+        self.regex = regex
+        self.case = case
+        self.since = since
+        self.until = until
+        flags = 0 if case else re.IGNORECASE
+        # 不区分大小写的子串查询：在 str.lower() 后的文本上做区分大小写匹配，远快于 re.IGNORECASE
+        # 历史检索与实时过滤都在解码后的 str 上匹配同一个模式，非 ASCII 内容的结果一致；字节只用于三元组预筛选
+        self.fold = bool(text) and not regex and not case
+        if text:
+            if self.fold:
+                self.pattern = re.compile(re.escape(text.lower()))
+            else:
+                self.pattern = re.compile(text if regex else re.escape(text), flags | re.MULTILINE)
+            words = regex_literals(text) if regex else _QUERY_TOKEN_RE.findall(text)
+        else:
+            self.pattern = None
+            words = []
+        self.trigrams = {w.lower().encode()[i:i + 3] for w in words for i in range(len(w) - 2)}
+
+    def match_line(self, line, received_at=None):
+        """实时过滤单行（新到达的日志）"""
+        if received_at is not None:
+            if self.since is not None and received_at < self.since:
+                return False
+            if self.until is not None and received_at >= self.until:
+                return False
+        if self.pattern is None:
+            return True
+        return self.pattern.search(line.lower() if self.fold else line) is not None
+
+
+class SearchResult:
+    def __init__(self):
+        self.lines = []            # [(行号, 文本), ...]，按行号升序
+        self.scanned_blocks = 0
+        self.total_blocks = 0
+        self.truncated = False
+        self.seconds = 0.0
+        self.end = 0               # 检索范围的结束行号（不含），之后到达的行不在结果中
+
+
+class LogIndex:
+    """LogHistory 的增量搜索索引：每 block_lines 行为一块，记录块内出现过的三元组
+
+    后台线程在新块写满后读取段文件建立索引（不占用界面线程）；每个三元组对应一个按块编号的位图，
+    查询时把查询串中所有三元组的位图按位与，只扫描可能命中的块，尚未建索引的尾部直接扫描。
+    """
+
+    def __init__(self, history, block_lines=4096, interval=0.5):
+        self.history = history
+        self.block_lines = block_lines
+        self.interval = interval
+        self._bits = {}       # 三元组 -> bytearray 位图（第 i 位表示第 i 块含有该三元组）
+        self._blocks = 0      # 已建索引的块数
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="LogIndex", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    @property
+    def indexed_lines(self):
+        return self._blocks * self.block_lines
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.index_pending()
+
+    def index_pending(self):
+        """为已写满但尚未建索引的块建立索引"""
+        while not self._stop.is_set() and len(self.history) >= (self._blocks + 1) * self.block_lines:
+            block = self._blocks
+            data = self.history.read_bytes(block * self.block_lines, (block + 1) * self.block_lines)
+            grams = block_trigrams(data)
+            byte, bit = block >> 3, 1 << (block & 7)
+            with self._lock:
+                for gram in grams:
+                    bits = self._bits.get(gram)
+                    if bits is None:
+                        bits = self._bits[gram] = bytearray()
+                    if len(bits) <= byte:
+                        bits.extend(bytes(byte + 1 - len(bits)))
+                    bits[byte] |= bit
+                self._blocks = block + 1
+
+    def _candidate_blocks(self, trigrams, first, last):
+        """返回 [first, last) 中可能命中的块号"""
+        with self._lock:
+            if not trigrams:
+                return list(range(first, last))
+            mask = -1
+            for gram in trigrams:
+                bits = self._bits.get(gram)
+                if bits is None:
+                    return []
+                mask &= int.from_bytes(bits, "little")
+        mask &= ~((1 << first) - 1) & ((1 << last) - 1)
+        flags = bin(mask)[:1:-1]
+        blocks = []
+        pos = flags.find("1")
+        while pos >= 0:
+            blocks.append(pos)
+            pos = flags.find("1", pos + 1)
+        return blocks
+
+    def search(self, query, limit=1000, newest_first=False):
+        """执行查询，最多返回 limit 行；newest_first 为真时返回最新的 limit 条匹配"""
+        result = SearchResult()
+        start = time.perf_counter()
+        lo, hi = self.history.line_range(query.since, query.until)
+        result.end = hi
+        size = self.block_lines
+        indexed = min(self._blocks, hi // size)
+        first_block = lo // size
+        ranges = [(max(b * size, lo), min((b + 1) * size, hi))
+                  for b in self._candidate_blocks(query.trigrams, first_block, indexed)]
+        result.total_blocks = max(0, indexed - first_block)
+        tail = max(indexed * size, lo)
+        if tail < hi:
+            ranges.append((tail, hi))
+        if newest_first:
+            ranges.reverse()
+        for a, b in ranges:
+            if len(result.lines) >= limit:
+                result.truncated = True
+                break
+            found = self._scan(a, b, query)
+            result.scanned_blocks += 1
+            room = limit - len(result.lines)
+            if newest_first:
+                result.lines[:0] = found[-room:]
+            else:
+                result.lines.extend(found[:room])
+            if len(found) > room:
+                result.truncated = True
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _scan(self, start, end, query):
+        text = self.history.read_bytes(start, end).decode("utf-8", errors="replace")
+        if query.pattern is None:
+            return list(enumerate(text.split("\n")[:-1], start))
+        # str.lower() 可能改变长度，但不增删换行：在小写文本中按换行计数得到行号，再取原始行
+        haystack = text.lower() if query.fold else text
+        search = query.pattern.search
+        lines = None
+        found = []
+        line_no = start
+        counted = 0
+        pos = 0
+        while True:
+            m = search(haystack, pos)
+            if m is None:
+                break
+            line_start = haystack.rfind("\n", 0, m.start()) + 1
+            line_end = haystack.find("\n", m.start())
+            if line_end < 0:
+                line_end = len(haystack)
+            line_no += haystack.count("\n", counted, line_start)
+            counted = line_start
+            if lines is None:
+                lines = text.split("\n")
+            found.append((line_no, lines[line_no - start]))
+            pos = line_end + 1
+        return found
+
+    def stats(self):
+        with self._lock:
+            return {"blocks": self._blocks, "trigrams": len(self._bits),
+                    "index_bytes": sum(len(b) for b in self._bits.values())}
+
+
+def benchmark(lines=2000000, path="bench.history", queries=("avc: denied", "FATAL EXCEPTION", r"pid=\d+ crashed")):
+    """生成大量日志后测量建索引耗时与查询耗时"""
+    import random
+    from log_history import LogHistory
+
+    words = ["ActivityManager", "CarService", "VehicleHal", "audio", "route", "binder", "transaction",
+             "display", "surface", "thermal", "power", "wakelock", "bluetooth", "wifi", "scan", "gps"]
+    rng = random.Random(1)
+    history = LogHistory(path, ring_size=1000)
+    start = time.perf_counter()
+    batch = []
+    for i in range(lines):
+        text = " ".join(rng.choice(words) for _ in range(8))
+        if i % 250000 == 77:
+            text = "avc: denied { read } for pid=1234 comm=\"vendor.car\""
+        elif i % 400000 == 99:
+            text = "FATAL EXCEPTION: main pid=4321 crashed"
+        batch.append(f"{i:08d} I/{text} 0x{rng.getrandbits(32):08x}")
+        if len(batch) == 10000:
+            history.append(batch)
+            batch = []
+    history.append(batch)
+    write_seconds = time.perf_counter() - start
+    index = LogIndex(history)
+    start = time.perf_counter()
+    index.index_pending()
+    index_seconds = time.perf_counter() - start
+    result = {"lines": lines, "mb": history._offset / 1024 / 1024, "write_s": write_seconds,
+              "index_s": index_seconds, "index": index.stats(), "queries": {}}
+    # 最后一条为常见词查询（几乎每块都命中，结果被截断）
+    for text in list(queries) + ["binder transaction route"]:
+        regex = "\\" in text
+        r = index.search(LogQuery(text, regex=regex))
+        result["queries"][text] = {"hits": len(r.lines), "truncated": r.truncated, "scanned_blocks": r.scanned_blocks,
+                                   "total_blocks": r.total_blocks, "ms": r.seconds * 1000}
+    history.close(remove=True)
+    return result
+
+
+if __name__ == "__main__":
+    r = benchmark()
+    print(f"写入 {r['lines']} 行 ({r['mb']:.0f} MB) {r['write_s']:.1f}s，建索引 {r['index_s']:.1f}s，索引 {r['index']}")
+    for text, q in r["queries"].items():
+        more = "（截断）" if q["truncated"] else ""
+        print(f"  {text!r}: 命中 {q['hits']} 行{more}，扫描 {q['scanned_blocks']}/{q['total_blocks']} 块，{q['ms']:.1f} ms")
@@ -0,0 +1,138 @@
+import os
+import gzip
+import shutil
+import threading
+import time
+import queue
+
+
+class LogWriter:
+    """后台日志写入线程：批量追加、按大小/时间刷新、按大小轮转，可选 gzip 压缩
+
+    GUI 主线程只调用 write_lines() 把一批日志放入队列，所有磁盘 I/O 都在本线程完成。
+    当前文件为 log_dir/<name>，轮转后依次为 <name>.1、<name>.2 ...（压缩时带 .gz 后缀）。
+    """
+
+    def __init__(self, log_dir, name, max_bytes=10 * 1024 * 1024, backup_count=10,
+                 flush_bytes=64 * 1024, flush_interval=1.0, compress=False, on_error=None):
+        self.log_dir = log_dir
+        self.name = name
+        self.path = os.path.join(log_dir, name)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self.on_error = on_error
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+        self._size = 0
+        self._failed = False
+        self.lines_written = 0
+        self.dropped_lines = 0      # 写入失败而丢失的行数
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"LogWriter-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def write_lines(self, lines):
+        """线程安全：追加一批日志行（不阻塞调用方）"""
+        if lines:
+            self._queue.put(lines)
+
+    def backlog(self):
+        """队列中等待写入的批数"""
+        return self._queue.qsize()
+
+    def close(self, timeout=5):
+        """写完队列中剩余内容后关闭文件"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        pending = []
+        pending_bytes = 0
+        last_flush = time.monotonic()
+        while True:
+            wait = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                lines = self._queue.get(timeout=wait)
+            except queue.Empty:
+                lines = ()
+            if lines is None:
+                break
+            for line in lines:
+                data = (line + "\n").encode("utf-8", errors="replace")
+                pending.append(data)
+                pending_bytes += len(data)
+            # 攒够一定字节数或超过刷新间隔才落盘
+            if pending and (pending_bytes >= self.flush_bytes
+                            or time.monotonic() - last_flush >= self.flush_interval):
+                self._flush(pending)
+                pending = []
+                pending_bytes = 0
+                last_flush = time.monotonic()
+            elif not pending:
+                last_flush = time.monotonic()
+        if pending:
+            self._flush(pending)
+        self._close_file()
+
+    def _flush(self, chunks):
+        try:
+            if self._file is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self._file = open(self.path, "ab")
+                self._size = self._file.tell()
+            data = b"".join(chunks)
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            if self.max_bytes and self._size >= self.max_bytes:
+                self._rotate()
+            self.lines_written += len(chunks)
+            self._failed = False
+        except Exception as e:
+            self.dropped_lines += len(chunks)
+            # 同一段故障只报告一次，避免刷屏
+            if not self._failed and self.on_error:
+                self.on_error(f"[⚠] 日志写入失败 {self.path}: {e}")
+            self._failed = True
+            self._close_file()
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+
+    def _backup_path(self, index):
+        suffix = ".gz" if self.compress else ""
+        return f"{self.path}.{index}{suffix}"
+
+    def _rotate(self):
+        self._close_file()
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        oldest = self._backup_path(self.backup_count)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self._backup_path(i)
+            if os.path.exists(src):
+                os.replace(src, self._backup_path(i + 1))
+        if self.compress:
+            with open(self.path, "rb") as src, gzip.open(self._backup_path(1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self._backup_path(1))
@@ -0,0 +1,349 @@
+import time
+import struct
+import socket
+import threading
+
+from log_writer import LogWriter
+
+# logcat 优先级：数值与字母的对应关系
+PRIORITY_LETTERS = {0: "?", 1: "?", 2: "V", 3: "D", 4: "I", 5: "W", 6: "E", 7: "F", 8: "S"}
+PRIORITY_VALUES = {"V": 2, "D": 3, "I": 4, "W": 5, "E": 6, "F": 7, "S": 8}
+
+# logger_entry 头部：v1 固定 20 字节，v2/v3 为 24，v4 为 28（hdr_size 字段给出实际长度）
+_ENTRY_PREFIX = struct.Struct("<HH")
+_ENTRY_IDS = struct.Struct("<iIiI")   # pid, tid, sec, nsec
+_V1_HEADER_SIZE = 20
+_MAX_HEADER_SIZE = 64
+_MAX_PAYLOAD = 64 * 1024
+
+
+class LogcatFormatError(Exception):
+    pass
+
+
+class LogcatFilter:
+    """logcat 过滤条件：标签（前缀 - 表示排除）、最低优先级、进程号
+
+    device_args() 生成设备端 filterspec，在设备上先过滤一遍以减少 USB 传输；
+    accept() 在本地按原始字节再过滤一遍（进程号只能在本地过滤），不解码字符串。
+    """
+
+    def __init__(self, tags="", min_priority="V", pids=""):
+        include, exclude = [], []
+        for tag in tags.split(","):
+            tag = tag.strip()
+            if tag.startswith("-"):
+                exclude.append(tag[1:].strip())
+            elif tag:
+                include.append(tag)
+        self.include = include
+        self.exclude = exclude
+        self.include_bytes = {t.encode("utf-8") for t in include}
+        self.exclude_bytes = {t.encode("utf-8") for t in exclude}
+        self.priority_letter = (min_priority or "V").strip().upper()[:1] or "V"
+        self.min_priority = PRIORITY_VALUES.get(self.priority_letter, 2)
+        self.pids = {int(p) for p in str(pids).replace(" ", "").split(",") if p.isdigit()}
+
+    def device_args(self):
+        args = [f"{tag}:S" for tag in self.exclude]
+        if self.include:
+            args += [f"{tag}:{self.priority_letter}" for tag in self.include] + ["*:S"]
+        else:
+            args.append(f"*:{self.priority_letter}")
+        return args
+
+    def accept(self, priority, pid, tag):
+        if priority < self.min_priority:
+            return False
+        if self.pids and pid not in self.pids:
+            return False
+        if self.include_bytes and tag not in self.include_bytes:
+            return False
+        return tag not in self.exclude_bytes
+
+
+class LogcatParser:
+    """解析 logcat -B 二进制流：按条目头部切分，先过滤再解码，输出 threadtime 格式文本行
+
+    每条新连接的流都从条目边界开始，换用新流前应调用 reset()，丢弃旧流中不完整的残余字节。
+    """
+
+    def __init__(self, log_filter=None):
+        self.filter = log_filter or LogcatFilter()
+        self._buf = bytearray()
+        self._stamp_sec = None
+        self._stamp = ""
+        self._skip_until = None
+        self.entries = 0     # 收到的条目数
+        self.kept = 0        # 通过过滤的条目数
+        self.last_time = None  # 最后一条条目的 (秒, 纳秒)
+
+    def reset(self, skip_until=None):
+        """换用新的流：丢弃残余字节，计数保留；skip_until=(秒, 纳秒) 时跳过不晚于该时刻的条目（logcat -T 重复输出的部分）"""
+        self._buf.clear()
+        self._skip_until = skip_until
+
+    def feed(self, data):
+        """送入一段原始字节，返回其中完整条目格式化后的文本行（不完整的条目留待下次）"""
+        buf = self._buf
+        buf += data
+        size = len(buf)
+        pos = 0
+        lines = []
+        last = -1
+        accept = self.filter.accept
+        while size - pos >= _V1_HEADER_SIZE:
+            length, hdr_size = _ENTRY_PREFIX.unpack_from(buf, pos)
+            if hdr_size == 0:
+                hdr_size = _V1_HEADER_SIZE
+            if hdr_size < _V1_HEADER_SIZE or hdr_size > _MAX_HEADER_SIZE or length > _MAX_PAYLOAD:
+                raise LogcatFormatError(f"无效的 logcat 条目头部 (len={length}, hdr={hdr_size})")
+            start = pos + hdr_size
+            end = start + length
+            if end > size:
+                break
+            pid, tid, sec, nsec = _ENTRY_IDS.unpack_from(buf, pos + 4)
+            if self._skip_until is not None:
+                if (sec, nsec) <= self._skip_until:
+                    pos = end
+                    continue
+                self._skip_until = None
+            self.entries += 1
+            last = pos
+            pos = end
+            if length < 2:
+                continue
+            priority = buf[start]
+            tag_end = buf.find(b"\0", start + 1, end)
+            if tag_end < 0:
+                tag_end = end
+            tag = bytes(buf[start + 1:tag_end])
+            if not accept(priority, pid, tag):
+                continue
+            self.kept += 1
+            if sec != self._stamp_sec:
+                self._stamp_sec = sec
+                self._stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(sec))
+            head = (f"{self._stamp}.{nsec // 1000000:03d} {pid:5d} {tid:5d} "
+                    f"{PRIORITY_LETTERS.get(priority, '?')} {tag.decode('utf-8', errors='replace')}: ")
+            msg = bytes(buf[tag_end + 1:end]).rstrip(b"\0\n").decode("utf-8", errors="replace")
+            # 多行消息与 logcat 一样逐行带上头部
+            for part in msg.split("\n"):
+                lines.append(head + part)
+        if last >= 0:
+            self.last_time = tuple(_ENTRY_IDS.unpack_from(buf, last + 4)[2:])
+        del buf[:pos]
+        return lines
+
+
+class LogcatCapture:
+    """持续抓取 logcat：后台线程读取二进制流、过滤、写入按大小轮转并 gzip 压缩的日志段
+
+    device_factory() 返回 adbutils 设备对象；日志写入 log_dir/logcat.log（轮转为 logcat.log.N.gz）。
+    on_lines(lines) 收到每批通过过滤的文本行（可为 None）；设备断开（如重启）后自动等待重连继续抓取。
+    重连时若设备未重启（boot_id 不变），以 -T 从最后一条条目的时刻继续，不会重新导出整个环形缓冲区；
+    设备已重启时导出本次启动以来的全部日志。
+    """
+
+    def __init__(self, device_factory, log_dir, log_filter=None, buffers="main,system,crash",
+                 on_lines=None, on_event=None, max_bytes=20 * 1024 * 1024, backup_count=20,
+                 read_size=256 * 1024):
+        self.device_factory = device_factory
+        self.log_dir = log_dir
+        self.filter = log_filter or LogcatFilter()
+        self.buffers = buffers
+        self.on_lines = on_lines
+        self.on_event = on_event
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.read_size = read_size
+
+        self.parser = None
+        self.writer = None
+        self._boot_id = None
+        self.bytes_read = 0
+        self.reconnects = 0
+        self.started_at = None
+        self._rate = (0.0, 0.0)        # 最近一个统计窗口的 (行/秒, 字节/秒)
+        self._window = None
+        self._stream = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def command(self, since=None):
+        """logcat 命令行；since=(秒, 纳秒) 时加 -T，只输出该时刻及之后的条目"""
+        buffers = "".join(f" -b {b.strip()}" for b in self.buffers.split(",") if b.strip())
+        if since is not None:
+            buffers += f" -T {since[0]}.{since[1] // 1000000:03d}"
+        return f"logcat -B{buffers} " + " ".join(self.filter.device_args())
+
+    def start(self):
+        if self.running:
+            return self
+        self._stop.clear()
+        self.parser = LogcatParser(self.filter)
+        self.writer = LogWriter(self.log_dir, "logcat.log", max_bytes=self.max_bytes,
+                                backup_count=self.backup_count, compress=True, on_error=self.on_event).start()
+        self.bytes_read = 0
+        self.reconnects = 0
+        self.started_at = time.monotonic()
+        self._window = (self.started_at, 0, 0)
+        self._boot_id = None
+        self._thread = threading.Thread(target=self._run, name="LogcatCapture", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._close_stream()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _open_stream(self):
+        """打开 logcat 流并重置解析器；同一次启动内的重连从最后一条条目继续"""
+        device = self.device_factory()
+        try:
+            boot_id = device.shell("cat /proc/sys/kernel/random/boot_id").strip() or None
+        except Exception:
+            boot_id = None
+        resume = None
+        if boot_id is not None and boot_id == self._boot_id:
+            resume = self.parser.last_time
+        self._boot_id = boot_id
+        # exec: 服务不分配 pty，二进制输出不会被改写换行
+        conn = device.open_transport()
+        conn.send_command("exec:" + self.command(resume))
+        conn.check_okay()
+        conn.conn.settimeout(1.0)
+        self.parser.reset(resume)
+        return conn
+
+    def _close_stream(self):
+        stream = self._stream
+        self._stream = None
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        waiting = False
+        while not self._stop.is_set():
+            try:
+                self._stream = self._open_stream()
+            except Exception as e:
+                if not waiting:
+                    self._event(f"[⚠] logcat 连接失败，等待设备: {e}")
+                    waiting = True
+                self._stop.wait(1.0)
+                continue
+            if waiting:
+                self.reconnects += 1
+                self._event("[ℹ] logcat 已重新连接")
+            else:
+                self._event(f"[✓] logcat 抓取已开始: {self.command()}")
+            waiting = False
+            try:
+                self._pump(self._stream.conn)
+            except LogcatFormatError as e:
+                self._event(f"[✗] logcat 数据格式错误，停止抓取: {e}")
+                break
+            except (OSError, ConnectionError):
+                pass
+            finally:
+                self._close_stream()
+            if not self._stop.is_set():
+                self._event("[ℹ] logcat 连接断开，等待设备重新上线...")
+                waiting = True
+                self._stop.wait(1.0)
+
+    def _pump(self, sock):
+        parser = self.parser
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(self.read_size)
+            except socket.timeout:
+                self._update_rate()
+                continue
+            if not data:
+                return
+            self.bytes_read += len(data)
+            lines = parser.feed(data)
+            if lines:
+                self.writer.write_lines(lines)
+                if self.on_lines:
+                    self.on_lines(lines)
+            self._update_rate()
+
+    def _update_rate(self):
+        now = time.monotonic()
+        since, kept, nbytes = self._window
+        if now - since >= 1.0:
+            self._rate = ((self.parser.kept - kept) / (now - since), (self.bytes_read - nbytes) / (now - since))
+            self._window = (now, self.parser.kept, self.bytes_read)
+
+    def stats(self):
+        """抓取统计：条目总数/保留数、读取字节数、最近一秒的行速率与字节速率"""
+        parser = self.parser
+        return {
+            "running": self.running,
+            "entries": parser.entries if parser else 0,
+            "kept": parser.kept if parser else 0,
+            "bytes": self.bytes_read,
+            "lines_per_s": self._rate[0],
+            "bytes_per_s": self._rate[1],
+            "reconnects": self.reconnects,
+            "seconds": time.monotonic() - self.started_at if self.started_at else 0.0,
+        }
+
+
+def format_stats(stats):
+    return (f"logcat: {stats['lines_per_s']:.0f} 行/s, {stats['bytes_per_s'] / 1024:.0f} KB/s, "
+            f"保留 {stats['kept']} / 共 {stats['entries']} 条")
+
+
+def build_entry(pid, tid, sec, nsec, priority, tag, msg, version=4):
+    """构造一条 logcat -B 二进制条目（用于解析性能测试与回放）"""
+    payload = bytes([priority]) + tag.encode() + b"\0" + msg.encode() + b"\0"
+    hdr_size = {1: 20, 2: 24, 3: 24, 4: 28}[version]
+    header = _ENTRY_PREFIX.pack(len(payload), 0 if version == 1 else hdr_size)
+    header += _ENTRY_IDS.pack(pid, tid, sec, nsec) + b"\0" * (hdr_size - _V1_HEADER_SIZE)
+    return header + payload
+
+
+def benchmark_parser(entries=200000, chunk=256 * 1024, log_filter=None):
+    """测量本地解析与过滤速率（条目/秒），应远高于设备峰值（约 1 万行/秒）"""
+    tags = ["ActivityManager", "CarService", "AudioFlinger", "chatty", "VehicleHal"]
+    now = int(time.time())
+    data = b"".join(build_entry(1000 + i % 7, 2000 + i % 13, now + i // 10000, (i % 1000) * 1000000,
+                                3 + i % 4, tags[i % len(tags)], f"message number {i} with some payload text")
+                    for i in range(entries))
+    parser = LogcatParser(log_filter)
+    start = time.perf_counter()
+    for pos in range(0, len(data), chunk):
+        parser.feed(data[pos:pos + chunk])
+    seconds = time.perf_counter() - start
+    return {"entries": parser.entries, "kept": parser.kept, "seconds": seconds,
+            "entries_per_s": parser.entries / seconds, "mb_per_s": len(data) / seconds / (1024 * 1024)}
+
+
+if __name__ == "__main__":
+    for name, f in (("无过滤", None),
+                    ("标签过滤", LogcatFilter(tags="CarService,VehicleHal")),
+                    ("优先级 W 以上", LogcatFilter(min_priority="W"))):
+        r = benchmark_parser(log_filter=f)
+        print(f"{name}: {r['entries_per_s']:.0f} 条/s, {r['mb_per_s']:.1f} MB/s, "
+              f"保留 {r['kept']} / {r['entries']}")
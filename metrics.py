@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+# 延迟直方图默认桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """固定桶直方图：observe() 只做一次二分查找和两次加法"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)     # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按桶估计分位数（返回所在桶的上限；落在 +Inf 桶时返回最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+class Metrics:
+    """低开销指标表：计数器、仪表、直方图
+
+    热路径上的组件只维护自己的整数计数（如 SerialCommandEngine.bytes_read），由 sample() 注册的函数在
+    生成快照时读取，不在每行数据上加锁；inc()/observe() 用于频率较低的事件（命令、推送、渲染批次）。
+    名称采用 Prometheus 风格，可带标签，如 cdt_log_queue_depth{log="serial"}。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._sampled = {}      # 名称 -> (函数, 类型 "counter"/"gauge")
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name.split("{")[0]] = text
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram(buckets)
+            hist.observe(value)
+
+    def sample(self, name, func, kind="gauge"):
+        """注册在快照时读取的值：kind="counter" 表示单调递增的累计值（导出速率），"gauge" 为当前值"""
+        self._sampled[name] = (func, kind)
+
+    def snapshot(self):
+        """当前全部指标：{"time", "counters", "gauges", "histograms"}"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: {"buckets": list(h.buckets), "counts": list(h.counts), "count": h.count,
+                                 "sum": h.sum, "max": h.max, "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                          for name, h in self._histograms.items()}
+        gauges = {}
+        for name, (func, kind) in list(self._sampled.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            (counters if kind == "counter" else gauges)[name] = value
+        return {"time": time.time(), "counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def rates(prev, cur):
+    """两次快照之间各计数器的每秒增量"""
+    if prev is None:
+        return {}
+    dt = cur["time"] - prev["time"]
+    if dt <= 0:
+        return {}
+    return {name: max(0.0, (value - prev["counters"].get(name, 0)) / dt)
+            for name, value in cur["counters"].items()}
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+
+
+def format_summary(snapshot, rate):
+    """界面/命令行状态栏文字：吞吐、队列深度、丢弃、命令延迟（p50/p99 为所在桶上限）、主循环卡顿"""
+    counters, gauges, hists = snapshot["counters"], snapshot["gauges"], snapshot["histograms"]
+    parts = [f"串口 {rate.get('cdt_serial_read_bytes_total', 0) / 1024:.0f} KB/s "
+             f"{rate.get('cdt_serial_lines_total', 0):.0f} 行/s"]
+    depth = [(log, gauges.get(f'cdt_log_queue_depth{{log="{log}"}}')) for log in ("serial", "adb")]
+    if any(n is not None for _, n in depth):
+        parts.append("队列 " + " / ".join(f"{log} {n or 0}" for log, n in depth))
+    dropped = sum(v for name, v in counters.items() if "dropped_lines" in name)
+    if dropped:
+        parts.append(f"丢弃 {dropped} 行")
+    if counters.get("cdt_broker_dropped_bytes_total"):
+        parts.append(f"共享丢弃 {counters['cdt_broker_dropped_bytes_total'] / 1024:.0f} KB")
+    for name, label in (("cdt_serial_command_seconds", "串口命令"), ('cdt_adb_command_seconds{kind="shell"}', "ADB"),
+                        ("cdt_push_seconds", "推送")):
+        h = hists.get(name)
+        if h and h["count"]:
+            parts.append(f"{label} p50 {_ms(h['p50'])} p99 {_ms(h['p99'])}")
+    h = hists.get("cdt_ui_stall_seconds")
+    if h and h["count"]:
+        parts.append(f"主循环卡顿 p99 {_ms(h['p99'])} 最大 {_ms(h['max'])}")
+    return " | ".join(parts)
+
+
+def _series(name, extra=None):
+    """cdt_x{a="1"} + le="0.5" → cdt_x_bucket{a="1",le="0.5"} 之类的序列名"""
+    base, _, labels = name.partition("{")
+    labels = labels.rstrip("}")
+    if extra:
+        labels = f"{labels},{extra}" if labels else extra
+    return base, (f"{{{labels}}}" if labels else "")
+
+
+def to_prometheus(snapshot, help_text=None):
+    """快照 → Prometheus 文本格式（node_exporter textfile collector 可直接读取）"""
+    help_text = help_text or {}
+    lines = []
+    declared = set()
+
+    def declare(base, kind):
+        if base not in declared:
+            declared.add(base)
+            if base in help_text:
+                lines.append(f"# HELP {base} {help_text[base]}")
+            lines.append(f"# TYPE {base} {kind}")
+
+    for name, value in sorted(snapshot["counters"].items()):
+        base, labels = _series(name)
+        declare(base, "counter")
+        lines.append(f"{base}{labels} {value}")
+    for name, value in sorted(snapshot["gauges"].items()):
+        base, labels = _series(name)
+        declare(base, "gauge")
+        lines.append(f"{base}{labels} {value}")
+    for name, h in sorted(snapshot["histograms"].items()):
+        base, labels = _series(name)
+        declare(base, "histogram")
+        cumulative = 0
+        for bound, n in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+            cumulative += n
+            _, le = _series(name, f'le="{bound}"')
+            lines.append(f"{base}_bucket{le} {cumulative}")
+        lines.append(f"{base}_sum{labels} {h['sum']}")
+        lines.append(f"{base}_count{labels} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    """先写临时文件再改名，导出方不会读到写了一半的文件"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class MetricsExporter:
+    """后台线程每 interval 秒把快照写入 JSON 文件和/或 Prometheus 文本文件（任一路径为空则不写）"""
+
+    def __init__(self, metrics, interval=15.0, json_path=None, prom_path=None, on_error=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.on_error = on_error
+        self._prev = None
+        self._failed = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and (self.json_path or self.prom_path):
+            self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        snap = self.metrics.snapshot()
+        snap["rates"] = rates(self._prev, snap)
+        self._prev = snap
+        try:
+            if self.json_path:
+                _write_atomic(self.json_path, json.dumps(snap, ensure_ascii=False, indent=1))
+            if self.prom_path:
+                _write_atomic(self.prom_path, to_prometheus(snap, self.metrics._help))
+            self._failed = False
+        except Exception as e:
+            # 同一段故障只报告一次
+            if not self._failed and self.on_error:
+                self.on_error(f"[⚠] 指标导出失败: {e}")
+            self._failed = True
+
+    def close(self):
+        """停止并写出最后一次快照"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(5)
+            self._thread = None
+            self.export()
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import stat
+import shlex
+import hashlib
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 设备端校验命令与本地 hashlib 算法的对应关系
+HASH_COMMANDS = {"md5sum": "md5", "sha1sum": "sha1", "sha256sum": "sha256"}
+
+
+class HashCache:
+    """本地文件哈希缓存：以 路径/mtime/大小 为键，文件未改动时不重复计算"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except Exception:
+                self._data = {}
+
+    def digest(self, local, algorithm):
+        st = os.stat(local)
+        key = f"{os.path.abspath(local)}|{st.st_mtime_ns}|{st.st_size}|{algorithm}"
+        with self._lock:
+            cached = self._data.get(key)
+        if cached:
+            return cached
+        h = hashlib.new(algorithm)
+        with open(local, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        value = h.hexdigest()
+        with self._lock:
+            # 同一路径的旧记录作废
+            prefix = f"{os.path.abspath(local)}|"
+            for k in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[k]
+            self._data[key] = value
+        return value
+
+    def save(self):
+        """写入缓存文件；多个推送引擎共用同一缓存时可并发调用（写临时文件后替换，持锁串行）"""
+        if not self.path:
+            return
+        with self._lock:
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f, indent=2)
+                os.replace(tmp, self.path)
+            except Exception:
+                pass
+
+
+class PushResult:
+    def __init__(self, local, target):
+        self.local = local
+        self.target = target
+        self.remote = target
+        self.size = 0
+        self.skipped = False
+        self.seconds = 0.0
+        self.error = None
+
+    @property
+    def throughput(self):
+        """推送速率（MB/s）"""
+        if self.skipped or self.seconds <= 0:
+            return 0.0
+        return self.size / self.seconds / (1024 * 1024)
+
+
+class PushEngine:
+    """增量并行推送：设备端文件校验和与本地一致则跳过，其余文件并发推送
+
+    device_factory() 返回 adbutils 设备对象（每个工作线程各自取一个，推送使用独立 sync 连接）。
+    cache 可传入多个引擎共用的 HashCache，此时忽略 cache_path。
+    """
+
+    def __init__(self, device_factory, cache_path=None, max_workers=3, hash_cmd="md5sum", on_event=None, cache=None):
+        self.device_factory = device_factory
+        self.cache = cache if cache is not None else HashCache(cache_path)
+        self.max_workers = max(1, int(max_workers))
+        self.hash_cmd = hash_cmd if hash_cmd in HASH_COMMANDS else "md5sum"
+        self.on_event = on_event
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def push_all(self, pairs):
+        """推送 [(本地路径, 目标路径), ...]，返回与输入顺序一致的 PushResult 列表"""
+        results = [PushResult(local, target) for local, target in pairs]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self._push_one, results))
+        self.cache.save()
+        return results
+
+    def _resolve_remote(self, d, local, target):
+        """目标是目录时拼上文件名，得到设备端完整路径"""
+        name = os.path.basename(local)
+        if target.endswith("/"):
+            return posixpath.join(target, name)
+        try:
+            if stat.S_ISDIR(d.sync.stat(target).mode):
+                return posixpath.join(target, name)
+        except Exception:
+            pass
+        return target
+
+    def _remote_digest(self, d, remote):
+        out = d.shell(f"{self.hash_cmd} {shlex.quote(remote)} 2>/dev/null").strip()
+        parts = out.split()
+        return parts[0].lower() if parts and len(parts[0]) >= 32 else None
+
+    def _push_one(self, result):
+        try:
+            d = self.device_factory()
+            result.size = os.path.getsize(result.local)
+            result.remote = self._resolve_remote(d, result.local, result.target)
+            local_digest = self.cache.digest(result.local, HASH_COMMANDS[self.hash_cmd])
+            if self._remote_digest(d, result.remote) == local_digest:
+                result.skipped = True
+                self._event(f"[ℹ] 未变化，跳过: {result.local} → {result.remote}")
+                return result
+            start = time.perf_counter()
+            d.push(result.local, result.remote)
+            result.seconds = time.perf_counter() - start
+            self._event(f"[✓] 推送: {result.local} → {result.remote} "
+                        f"({result.size / (1024 * 1024):.1f} MB, {result.throughput:.1f} MB/s)")
+        except Exception as e:
+            result.error = e
+            self._event(f"[✗] 推送失败 {result.local}: {e}")
+        return result
+
+
+def summarize(results, assumed_rate=None):
+    """汇总推送结果：推送/跳过的字节数、平均速率与估算节省时间
+
+    本次没有实际推送（全部跳过）时，节省时间按 assumed_rate（字节/秒，如上次实测或配置的速率）估算。
+    """
+    pushed = [r for r in results if not r.skipped and r.error is None]
+    skipped = [r for r in results if r.skipped]
+    pushed_bytes = sum(r.size for r in pushed)
+    pushed_seconds = sum(r.seconds for r in pushed)
+    skipped_bytes = sum(r.size for r in skipped)
+    rate = pushed_bytes / pushed_seconds if pushed_seconds > 0 else None
+    estimate_rate = rate or assumed_rate
+    return {
+        "pushed": len(pushed),
+        "skipped": len(skipped),
+        "failed": len([r for r in results if r.error is not None]),
+        "pushed_bytes": pushed_bytes,
+        "skipped_bytes": skipped_bytes,
+        "rate_mb_s": rate / (1024 * 1024) if rate else None,
+        # 优先按本次实测速率估算跳过文件节省的时间
+        "saved_seconds": skipped_bytes / estimate_rate if estimate_rate and skipped_bytes else None,
+        "saved_estimated": rate is None,
+    }
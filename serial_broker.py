@@ -0,0 +1,325 @@
+import time
+import socket
+import threading
+from collections import deque
+
+from serial_reader import socket_of, read_available
+
+LOCAL = "local"     # 本工具自身（串口命令引擎）的写入方名称
+
+
+class _Client:
+    """一个 TCP 客户端：独立的发送队列与发送线程（慢客户端只会让自己的队列积压）"""
+
+    def __init__(self, broker, sock, addr):
+        self.broker = broker
+        self.sock = sock
+        self.name = f"{addr[0]}:{addr[1]}"
+        self.connected_at = time.time()
+        self.sent_bytes = 0
+        self.queued_bytes = 0
+        self.dropped_bytes = 0
+        self.lines_written = 0
+        self.overflowing = False
+        self.closed = False
+        self._chunks = deque()          # (发布时间, 数据)
+        self._inflight_since = None     # 正在发送的一批中最早数据的发布时间
+        self._cond = threading.Condition()
+        self._input = bytearray()
+
+    def start(self):
+        threading.Thread(target=self._send_loop, name=f"Broker-send-{self.name}", daemon=True).start()
+        threading.Thread(target=self._recv_loop, name=f"Broker-recv-{self.name}", daemon=True).start()
+
+    def push(self, data, now):
+        """串口读取线程调用：只做入队；积压超过上限时丢弃最旧的数据直到降到一半"""
+        limit = self.broker.max_lag_bytes
+        dropped = 0
+        with self._cond:
+            self._chunks.append((now, data))
+            self.queued_bytes += len(data)
+            if self.queued_bytes > limit:
+                while self._chunks and self.queued_bytes > limit // 2:
+                    _, old = self._chunks.popleft()
+                    self.queued_bytes -= len(old)
+                    dropped += len(old)
+                self.dropped_bytes += dropped
+                self.broker.dropped_bytes += dropped
+            self._cond.notify()
+        if dropped and not self.overflowing:
+            self.overflowing = True
+            self.broker._event(f"[⚠] 共享串口客户端 {self.name} 跟不上，丢弃 {dropped / 1024:.0f} KB 积压数据")
+
+    @property
+    def lag_s(self):
+        """最早一条尚未发出的数据已等待的秒数"""
+        with self._cond:
+            oldest = self._inflight_since
+            if oldest is None and self._chunks:
+                oldest = self._chunks[0][0]
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._chunks and not self.closed:
+                        self._cond.wait()
+                    if self.closed:
+                        return
+                    self._inflight_since = self._chunks[0][0]
+                    data = b"".join(chunk for _, chunk in self._chunks)
+                    self._chunks.clear()
+                self.sock.sendall(data)
+                with self._cond:
+                    self.queued_bytes -= len(data)
+                    self.sent_bytes += len(data)
+                    self._inflight_since = None
+                    if self.queued_bytes == 0:
+                        self.overflowing = False
+        except OSError:
+            pass
+        self.close()
+
+    def _recv_loop(self):
+        """客户端输入按行（\\r 或 \\n 结尾）提交写入；Ctrl+C 立即提交"""
+        try:
+            while True:
+                data = self.sock.recv(4096)
+                if not data:
+                    break
+                if self.broker.write_mode == "readonly":
+                    continue
+                self._input.extend(data)
+                end = max(self._input.rfind(b"\n"), self._input.rfind(b"\r"), self._input.rfind(b"\x03"))
+                if end >= 0:
+                    line = bytes(self._input[:end + 1])
+                    del self._input[:end + 1]
+                    self.lines_written += 1
+                    self.broker.submit(self.name, line)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify_all()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self.broker._remove(self)
+
+
+class SerialBroker:
+    """串口共享代理：本工具独占物理串口，把收到的原始字节分发给任意数量的 TCP 客户端，并仲裁客户端写入
+
+    客户端用 pyserial 的 socket://<主机>:<端口> 连接（如 python -m serial.tools.miniterm socket://127.0.0.1:7000，
+    或在本工具的串口设备中填写该 URL）。读取仍由串口读取线程完成，BrokeredSerial 在 read() 时调用 publish()，
+    每个客户端有独立的发送队列与线程，积压超过 max_lag_bytes 时丢弃最旧数据，不会阻塞串口读取。
+    写入按“发言权”仲裁：某个写入方写出一行后在 floor_seconds 内独占写入，其他写入方的行排队等待，
+    本工具执行串口命令期间（local_busy() 为真）同样独占；write_mode="readonly" 时忽略客户端输入。
+    """
+
+    def __init__(self, host="127.0.0.1", port=7000, write_mode="line", floor_seconds=2.0,
+                 max_lag_bytes=4 * 1024 * 1024, on_event=None, local_busy=None):
+        self.host = host
+        self.port = int(port)
+        self.write_mode = write_mode
+        self.floor_seconds = float(floor_seconds)
+        self.max_lag_bytes = int(max_lag_bytes)
+        self.on_event = on_event
+        self.local_busy = local_busy or (lambda: False)
+        self.published_bytes = 0
+        self.dropped_writes = 0
+        self.dropped_bytes = 0      # 所有客户端（含已断开的）累计丢弃的字节数
+        self._conn = None
+        self._clients = []
+        self._lock = threading.Lock()
+        self._writes = deque()
+        self._floor_owner = None
+        self._floor_until = 0.0
+        self._floor = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._server = None
+        self._closed = False
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def start(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self._server.bind((self.host, self.port))
+            self._server.listen(8)
+        except OSError:
+            self._server.close()
+            raise
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name="Broker-accept", daemon=True).start()
+        threading.Thread(target=self._write_loop, name="Broker-write", daemon=True).start()
+        self._event(f"[✓] 串口共享已开启: socket://{self.host}:{self.port}"
+                    f"（{'只读' if self.write_mode == 'readonly' else '客户端可按行写入'}）")
+        return self
+
+    @property
+    def url(self):
+        return f"socket://{self.host}:{self.port}"
+
+    def attach(self, conn):
+        """（重新）连接物理串口后调用；客户端写入经它发出"""
+        self._conn = conn
+
+    def detach(self, conn):
+        if self._conn is conn:
+            self._conn = None
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                sock, addr = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(self, sock, addr)
+            with self._lock:
+                self._clients.append(client)
+            client.start()
+            self._event(f"[ℹ] 共享串口客户端已连接: {client.name}（共 {len(self._clients)} 个）")
+
+    def _remove(self, client):
+        with self._lock:
+            if client not in self._clients:
+                return
+            self._clients.remove(client)
+            remaining = len(self._clients)
+        if not self._closed:
+            self._event(f"[ℹ] 共享串口客户端已断开: {client.name}（剩余 {remaining} 个）")
+
+    def publish(self, data):
+        """串口读取线程调用：把原始字节分发给所有客户端（只入队，不做网络 I/O）"""
+        self.published_bytes += len(data)
+        clients = self._clients
+        if clients:
+            now = time.time()
+            for client in list(clients):
+                client.push(data, now)
+
+    # 写入仲裁
+    def submit(self, who, data):
+        """客户端写入：交给写入线程，按发言权依次写入串口"""
+        with self._floor:
+            self._writes.append((who, data))
+            self._floor.notify_all()
+
+    def _held_by_other(self, who):
+        owner = self._floor_owner
+        if owner is None or owner == who:
+            return False
+        if owner == LOCAL and self.local_busy():
+            return True
+        return time.monotonic() < self._floor_until
+
+    def _write_loop(self):
+        while True:
+            with self._floor:
+                while not self._closed and (not self._writes or self._held_by_other(self._writes[0][0])):
+                    self._floor.wait(0.05)
+                if self._closed:
+                    return
+                who, data = self._writes.popleft()
+                self._floor_owner = who
+                self._floor_until = time.monotonic() + self.floor_seconds
+            self._write_port(data)
+
+    def write(self, who, data):
+        """本工具的写入（在调用线程中等待发言权）；Ctrl+C 不等待，直接写入"""
+        if data != b"\x03":
+            deadline = time.monotonic() + self.floor_seconds + 1
+            with self._floor:
+                while self._held_by_other(who) and time.monotonic() < deadline and not self._closed:
+                    self._floor.wait(0.05)
+                self._floor_owner = who
+                self._floor_until = time.monotonic() + self.floor_seconds
+        return self._write_port(data)
+
+    def _write_port(self, data):
+        conn = self._conn
+        if conn is None:
+            self.dropped_writes += 1
+            return 0
+        with self._write_lock:
+            return conn.write(data)
+
+    def stats(self):
+        with self._lock:
+            clients = list(self._clients)
+        return {"url": self.url, "published_bytes": self.published_bytes, "dropped_writes": self.dropped_writes,
+                "floor": self._floor_owner if self._held_by_other(None) else None,
+                "clients": [{"name": c.name, "connected_s": time.time() - c.connected_at, "sent_bytes": c.sent_bytes,
+                             "lag_bytes": c.queued_bytes, "lag_s": c.lag_s, "dropped_bytes": c.dropped_bytes,
+                             "lines_written": c.lines_written} for c in clients]}
+
+    def close(self):
+        self._closed = True
+        with self._floor:
+            self._floor.notify_all()
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.close()
+
+
+class BrokeredSerial:
+    """串口对象的共享代理：read() 到的数据同时分发给 TCP 客户端，write() 经仲裁后写入，其余属性原样转发
+
+    底层是 socket:// 时 read() 一次取走已到达的全部数据（见 serial_reader.read_available）。
+    """
+
+    def __init__(self, conn, broker):
+        self._conn = conn
+        self._sock = socket_of(conn)
+        self.broker = broker
+        broker.attach(conn)
+
+    def read(self, size=1):
+        data = read_available(self._conn, self._sock) if self._sock is not None else self._conn.read(size)
+        if data:
+            self.broker.publish(data)
+        return data
+
+    def write(self, data):
+        return self.broker.write(LOCAL, data)
+
+    def close(self):
+        self.broker.detach(self._conn)
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def format_stats(stats):
+    """界面/命令行状态栏文字"""
+    clients = stats["clients"]
+    if not clients:
+        return f"共享 {stats['url']}：无客户端"
+    worst = max(clients, key=lambda c: c["lag_bytes"])
+    dropped = sum(c["dropped_bytes"] for c in clients)
+    text = (f"共享 {stats['url']}：{len(clients)} 个客户端，最大积压 {worst['lag_bytes'] / 1024:.0f} KB"
+            f" / {worst['lag_s']:.1f}s（{worst['name']}）")
+    if dropped:
+        text += f"，已丢弃 {dropped / 1024:.0f} KB"
+    if stats["floor"]:
+        text += f"，写入权: {stats['floor']}"
+    return text
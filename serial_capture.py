@@ -0,0 +1,337 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import socket
+import threading
+
+from serial_reader import socket_of, read_available
+
+# 文件格式：MAGIC + uint32 元数据长度 + 元数据 JSON，之后为连续的记录
+# 记录：1 字节类型 + varint 距上一条记录的微秒数 + varint 长度 + 数据
+MAGIC = b"CDTCAP\x01\n"
+RX = 1          # 从串口读到的原始字节
+TX = 2          # 写入串口的原始字节
+EVENT = 3       # 事件（JSON），如重连、波特率变化
+
+_U32 = struct.Struct("<I")
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+class CaptureWriter:
+    """原始串口录制：按读写块记录字节与微秒级时间戳（线程安全，缓冲写入，每秒至少落盘一次）"""
+
+    def __init__(self, path, meta=None, flush_interval=1.0):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.meta = dict(meta or {})
+        self.meta.setdefault("format", 1)
+        self.meta.setdefault("started_at", time.time())
+        self.meta.setdefault("host", socket.gethostname())
+        self.flush_interval = flush_interval
+        self.bytes = 0
+        self.records = 0
+        self._base = time.perf_counter_ns()
+        self._last_us = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, "wb", buffering=1024 * 1024)
+        header = json.dumps(self.meta, ensure_ascii=False).encode("utf-8")
+        self._file.write(MAGIC + _U32.pack(len(header)) + header)
+
+    def _record(self, kind, payload, t_ns=None):
+        t_us = ((t_ns or time.perf_counter_ns()) - self._base) // 1000
+        with self._lock:
+            if self._file is None:
+                return
+            # 多线程写入时时间戳可能略微乱序，按 0 间隔记录
+            delta = max(0, t_us - self._last_us)
+            self._last_us = max(self._last_us, t_us)
+            self._file.write(bytes([kind]) + _varint(delta) + _varint(len(payload)) + payload)
+            self.bytes += len(payload)
+            self.records += 1
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = now
+
+    def rx(self, data, t_ns=None):
+        if data:
+            self._record(RX, bytes(data), t_ns)
+
+    def tx(self, data):
+        if data:
+            self._record(TX, bytes(data))
+
+    def event(self, name, **fields):
+        fields["event"] = name
+        self._record(EVENT, json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingSerial:
+    """串口对象的录制代理：read()/write() 的数据同时写入 CaptureWriter，其余属性原样转发
+
+    底层是 socket:// 时 read() 一次取走已到达的全部数据（见 serial_reader.read_available）。
+    """
+
+    def __init__(self, conn, writer):
+        self._conn = conn
+        self._sock = socket_of(conn)
+        self.writer = writer
+
+    def read(self, size=1):
+        data = read_available(self._conn, self._sock) if self._sock is not None else self._conn.read(size)
+        if data:
+            self.writer.rx(data, time.perf_counter_ns())
+        return data
+
+    def write(self, data):
+        self.writer.tx(data)
+        return self._conn.write(data)
+
+    def close(self):
+        try:
+            self._conn.close()
+        finally:
+            self.writer.event("close")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class CaptureReader:
+    """读取录制文件（mmap，不整体载入内存）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"不是串口录制文件: {path}")
+        size = _U32.unpack_from(self._mmap, len(MAGIC))[0]
+        start = len(MAGIC) + _U32.size
+        self.meta = json.loads(self._mmap[start:start + size].decode("utf-8"))
+        self._data_start = start + size
+
+    def records(self):
+        """依次产生 (类型, 距开始的秒数, 数据)；文件末尾不完整的记录（录制中断）被忽略"""
+        buf = self._mmap
+        pos = self._data_start
+        size = len(buf)
+        t_us = 0
+        while pos < size:
+            try:
+                kind = buf[pos]
+                delta, p = _read_varint(buf, pos + 1)
+                length, p = _read_varint(buf, p)
+            except IndexError:
+                return
+            if p + length > size:
+                return
+            t_us += delta
+            yield kind, t_us / 1e6, buf[p:p + length]
+            pos = p + length
+
+    def summary(self):
+        counts = {RX: 0, TX: 0, EVENT: 0}
+        rx_bytes = 0
+        duration = 0.0
+        for kind, t, data in self.records():
+            counts[kind] = counts.get(kind, 0) + 1
+            if kind == RX:
+                rx_bytes += len(data)
+            duration = t
+        return {"meta": self.meta, "rx_chunks": counts[RX], "tx_chunks": counts[TX], "events": counts[EVENT],
+                "rx_bytes": rx_bytes, "duration": duration}
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class ReplaySerial:
+    """回放源：接口与 pyserial 串口相同（read/in_waiting/is_open/write/close），可直接交给串口读取流程
+
+    speed=1 按原始节奏实时回放，speed=N 加速 N 倍，speed=0 全速回放。
+    clock() 返回最近一次读取数据的原始到达时间（录制时的 time.time()），使时间戳、触发器冷却与原始会话一致。
+    回放写入的数据（如命令）被丢弃。读完全部数据后 is_open 变为假，读取流程随之结束。
+    """
+
+    def __init__(self, path, speed=1.0, timeout=0.2):
+        self.path = path
+        self.speed = float(speed)
+        self.timeout = timeout
+        self.reader = CaptureReader(path)
+        self.meta = self.reader.meta
+        self.port = f"replay:{os.path.basename(path)}"
+        self.baudrate = self.meta.get("baud")
+        self.is_open = True
+        self.bytes_read = 0
+        self.started = None
+        self.finished_at = None
+        self._records = (r for r in self.reader.records() if r[0] == RX)
+        self._next = next(self._records, None)
+        self._pending = b""
+        self._clock = self.meta.get("started_at", time.time())
+
+    def _due(self, t):
+        """录制时间 t 对应的回放时刻（perf_counter）"""
+        return self.started + t / self.speed
+
+    def clock(self):
+        return self._clock
+
+    @property
+    def in_waiting(self):
+        if self._pending:
+            return len(self._pending)
+        if self._next is None:
+            return 0
+        if self.speed <= 0 or (self.started is not None and time.perf_counter() >= self._due(self._next[1])):
+            return len(self._next[2])
+        return 0
+
+    def read(self, size=1):
+        if self.started is None:
+            self.started = time.perf_counter()
+        if not self._pending:
+            if self._next is None:
+                self._finish()
+                return b""
+            kind, t, data = self._next
+            if self.speed > 0:
+                wait = self._due(t) - time.perf_counter()
+                if wait > self.timeout:
+                    time.sleep(self.timeout)
+                    return b""
+                if wait > 0:
+                    time.sleep(wait)
+            # 全速回放也按原始数据块逐块返回，每块保留自己的到达时间
+            self._pending = bytes(data)
+            self._clock = self.meta.get("started_at", 0.0) + t
+            self._next = next(self._records, None)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        self.bytes_read += len(data)
+        return data
+
+    def _finish(self):
+        if self.is_open:
+            self.is_open = False
+            self.finished_at = time.perf_counter()
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        self._finish()
+        self.reader.close()
+
+    def summary(self):
+        seconds = ((self.finished_at or time.perf_counter()) - self.started) if self.started else 0.0
+        rate = self.bytes_read / seconds / (1024 * 1024) if seconds > 0 else 0.0
+        return f"[ℹ] 回放结束: {self.bytes_read / 1024:.0f} KB, 用时 {seconds:.2f}s ({rate:.1f} MB/s)"
+
+
+def synthesize(path, lines=200000, line_bytes=80, rate=2000, chunk_lines=8):
+    """生成合成录制文件（按 rate 行/秒的时间戳），用于无硬件的确定性基准"""
+    writer = CaptureWriter(path, {"port": "synthetic", "baud": 921600})
+    base = writer._base
+    filler = "x" * max(0, line_bytes - 24)
+    t_ns = base
+    for i in range(0, lines, chunk_lines):
+        block = "".join(f"[{(i + k) / rate:10.4f}] {filler}\n" for k in range(min(chunk_lines, lines - i)))
+        t_ns += int(chunk_lines / rate * 1e9)
+        writer.rx(block.encode(), t_ns)
+    writer.close()
+    return path
+
+
+def benchmark_replay(path, speed=0.0, triggers=None):
+    """全速回放录制文件，经 SerialCommandEngine（与实时串口相同的切行/解码/触发器路径）测量吞吐"""
+    from serial_commands import SerialCommandEngine
+    from trigger_engine import TriggerMatcher
+
+    conn = ReplaySerial(path, speed=speed)
+    count = [0]
+    matcher = TriggerMatcher(triggers or [])
+
+    def tap(line, received_at):
+        matcher.match(line)
+
+    engine = SerialCommandEngine(conn, lambda line, ts: count.__setitem__(0, count[0] + 1), tap=tap)
+    start = time.perf_counter()
+    engine.run(lambda: True)
+    seconds = time.perf_counter() - start
+    return {"lines": count[0], "bytes": conn.bytes_read, "seconds": seconds,
+            "lines_per_s": count[0] / seconds if seconds else 0.0,
+            "mb_per_s": conn.bytes_read / seconds / (1024 * 1024) if seconds else 0.0}
+
+
+def main(argv):
+    usage = ("用法: python serial_capture.py info <文件>\n"
+             "      python serial_capture.py dump <文件>            输出回放得到的文本行\n"
+             "      python serial_capture.py bench [文件] [行数]    全速回放基准（不指定文件时生成合成数据）")
+    if len(argv) < 2:
+        print(usage)
+        return 2
+    cmd = argv[1]
+    if cmd == "info" and len(argv) > 2:
+        reader = CaptureReader(argv[2])
+        print(json.dumps(reader.summary(), ensure_ascii=False, indent=2))
+        reader.close()
+    elif cmd == "dump" and len(argv) > 2:
+        from serial_reader import SerialLineReader
+        reader = SerialLineReader(None, lambda line, ts: print(line))
+        cap = CaptureReader(argv[2])
+        for kind, t, data in cap.records():
+            if kind == RX:
+                reader.feed(bytes(data))
+        reader.flush(final=True)
+        cap.close()
+    elif cmd == "bench":
+        path = argv[2] if len(argv) > 2 else synthesize("bench.cdtcap", int(argv[3]) if len(argv) > 3 else 200000)
+        from trigger_engine import Trigger
+        r = benchmark_replay(path, triggers=[Trigger("panic", "Kernel panic"), Trigger("wd", "watchdog")])
+        print(f"{r['lines']} 行 / {r['bytes'] / 1024 / 1024:.1f} MB，用时 {r['seconds']:.2f}s："
+              f"{r['lines_per_s']:.0f} 行/s，{r['mb_per_s']:.1f} MB/s")
+    else:
+        print(usage)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
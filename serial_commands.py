@@ -0,0 +1,211 @@
+import re
+import time
+import threading
+import itertools
+
+from serial_reader import SerialLineReader, read_available, socket_of
+
+DEFAULT_PROMPT_REGEX = r"[#$>]\s*$"
+PARTIAL_QUIET = 1.0   # 未换行的残余内容静止多久（秒）后作为一行输出
+# 结束标记 __CDT_<序号>__<退出码>；标记命令自身的回显为 __CDT_''<序号>__$?
+SENTINEL_RE = re.compile(r"__CDT_('')?(\d+)__(\d*)")
+STALE_SENTINELS = 16  # 记住多少条超时/中断命令的序号，用于丢弃它们迟到的标记
+# 命令行前缀 "@timeout=60 dmesg" 可覆盖单条命令的超时
+TIMEOUT_PREFIX_RE = re.compile(r"^@timeout=(\d+(?:\.\d+)?)\s+(.*)$")
+
+
+def split_timeout(cmd):
+    """解析单条命令的超时前缀，返回 (timeout 或 None, 命令)"""
+    m = TIMEOUT_PREFIX_RE.match(cmd)
+    if m:
+        return float(m.group(1)), m.group(2).strip()
+    return None, cmd
+
+
+class CommandResult:
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.lines = []
+        self.exit_code = None
+        self.completed = False
+        self.elapsed = 0.0
+
+    @property
+    def output(self):
+        return "\n".join(self.lines).strip()
+
+
+class SerialCommandEngine:
+    """串口命令执行引擎：独占串口读取，把命令响应与后台日志流分离
+
+    mode="prompt"（默认）：输出静止一个读取超时后，未换行的残余内容匹配 prompt_regex（shell 提示符）即判定完成；
+    控制台没有可识别的提示符时等到超时为止，与旧版固定等待相同，适用于任何控制台。
+    prompt 模式的超时从最后一次收到输出算起（dmesg 等持续输出的慢命令不会被截断），总等待不超过 max_wait 秒。
+    mode="sentinel"：命令后追加一条 echo 标记，看到标记（含退出码）即判定完成，只适用于 sh 兼容的 shell。
+    没有命令在执行时，所有行交给 on_line 作为后台日志；只丢弃本引擎发出的标记行，其它含 __CDT_ 的行照常输出。
+    tap(line, received_at) 可选，收到包括命令响应在内的每一行（用于触发器匹配）。
+    """
+
+    def __init__(self, conn, on_line, mode="prompt", prompt_regex=DEFAULT_PROMPT_REGEX,
+                 default_timeout=2.0, strip_ansi=False, tap=None, max_wait=60.0):
+        self.conn = conn
+        self.on_line = on_line
+        self.tap = tap
+        self.mode = mode
+        self.prompt_re = re.compile(prompt_regex)
+        self.default_timeout = default_timeout
+        self.max_wait = max_wait
+        # 残余内容（提示符、无换行的输出）静止 PARTIAL_QUIET 秒后才输出，慢速到达的行不会被拆开
+        self.reader = SerialLineReader(conn, self._on_line, strip_ansi=strip_ansi, flush_partial=True,
+                                       partial_quiet=PARTIAL_QUIET)
+
+        self._io_lock = threading.Lock()    # 保护 reader 缓冲区与当前命令
+        self._cmd_lock = threading.Lock()   # 同一时间只执行一条命令
+        self._seq = itertools.count(1)
+        self._active = None
+        self._sentinel = None               # 当前命令的标记序号（sentinel 模式）
+        self._stale = []                    # 超时/中断命令的标记序号，迟到的标记行丢弃
+        self._last_output = 0.0             # 当前命令最后一次收到数据的时间（monotonic）
+        self._echo_pending = False
+        self._done = threading.Event()
+        # 累计计数（供指标采样读取，只在读取线程中递增）
+        self.bytes_read = 0
+        self.lines = 0
+
+    def attach(self, conn):
+        """串口重连后换用新连接，保留尚未换行的缓冲与解码状态（读取线程随后重新调用 run）"""
+        with self._io_lock:
+            self.conn = conn
+            self.reader.conn = conn
+
+    def run(self, is_running):
+        """读取循环（在监控线程中调用），串口异常向上抛出"""
+        conn = self.conn
+        # 回放源提供 clock()，给出数据的原始到达时间
+        clock = getattr(conn, "clock", time.time)
+        sock = socket_of(conn)
+        while is_running() and conn.is_open:
+            data = read_available(conn, sock)
+            with self._io_lock:
+                if data:
+                    self.bytes_read += len(data)
+                    if self._active is not None:
+                        self._last_output = time.monotonic()
+                    self.reader.feed(data, clock())
+                else:
+                    # 只在输出静止（整个读取超时内无新数据）后检查提示符，避免把输出中途的 "#"、">" 误判为提示符
+                    if self._active is not None and self.mode == "prompt":
+                        self._check_prompt()
+                    # 空闲时把静止的残余内容（如提示符）作为一行输出
+                    self.reader.idle(clock())
+
+    def _own_sentinel(self, line):
+        """line 是本引擎发出的标记（当前命令或超时/中断命令的标记及其回显）时返回匹配，否则返回 None"""
+        if "__CDT_" not in line:
+            return None
+        m = SENTINEL_RE.search(line)
+        if m is None:
+            return None
+        n = int(m.group(2))
+        if n == self._sentinel:
+            return m
+        if n in self._stale:
+            if not m.group(1):
+                self._stale.remove(n)  # 迟到的标记已到达，之后不会再出现
+            return m
+        return None
+
+    def _on_line(self, line, received_at):
+        self.lines += 1
+        m = self._own_sentinel(line)
+        if self.tap is not None and m is None:
+            self.tap(line, received_at)
+        result = self._active
+        if m is not None:
+            if result is not None and int(m.group(2)) == self._sentinel and not m.group(1):
+                result.exit_code = int(m.group(3)) if m.group(3) else None
+                self._finish()
+            return  # 标记命令自身的回显，或之前被中断/超时的命令迟到的标记
+        if result is None:
+            self.on_line(line, received_at)
+            return
+        if self._echo_pending:
+            self._echo_pending = False
+            if line.endswith(result.cmd):
+                return  # 命令回显
+        result.lines.append(line)
+
+    def _check_prompt(self):
+        pending = self.reader.pending()
+        if pending and self.prompt_re.search(pending):
+            # 提示符不计入命令输出
+            self.reader.discard_pending()
+            self._finish()
+
+    def _finish(self):
+        self._active.completed = True
+        self._active = None
+        self._sentinel = None
+        self._done.set()
+
+    def _abandon(self):
+        """（持有 _io_lock）放弃当前命令：后续输出重新归入后台流，迟到的标记仍被识别并丢弃"""
+        if self._sentinel is not None:
+            self._stale.append(self._sentinel)
+            del self._stale[:-STALE_SENTINELS]
+        self._active = None
+        self._sentinel = None
+
+    @property
+    def busy(self):
+        """是否有命令正在等待完成"""
+        return self._active is not None
+
+    def write(self, data):
+        self.conn.write(data)
+
+    def interrupt(self):
+        """发送 Ctrl+C，并结束当前等待中的命令"""
+        self.conn.write(b'\x03')
+        with self._io_lock:
+            if self._active is not None:
+                self._abandon()
+                self._done.set()
+
+    def execute(self, cmd, timeout=None):
+        """发送一条命令并等待完成（或超时），返回 CommandResult"""
+        if timeout is None:
+            timeout = self.default_timeout
+        with self._cmd_lock:
+            result = CommandResult(cmd)
+            with self._io_lock:
+                # 之前残留的提示符属于后台流
+                self.reader.flush()
+                self._done.clear()
+                self._active = result
+                self._echo_pending = True
+                if self.mode == "sentinel":
+                    n = next(self._seq)
+                    self._sentinel = n
+                    payload = f"{cmd}\necho __CDT_''{n}__$?\n"
+                else:
+                    payload = cmd + "\n"
+                self._last_output = time.monotonic()
+            start = time.perf_counter()
+            self.conn.write(payload.encode())
+            self._wait(timeout)
+            result.elapsed = time.perf_counter() - start
+            with self._io_lock:
+                if self._active is result:
+                    # 超时：后续输出重新归入后台流
+                    self._abandon()
+            return result
+
+    def _wait(self, timeout):
+        """等待命令完成；prompt 模式下每收到输出就顺延超时，但总等待不超过 max(max_wait, timeout)"""
+        hard = time.monotonic() + (max(self.max_wait, timeout) if self.mode == "prompt" else timeout)
+        while True:
+            deadline = min(self._last_output + timeout, hard) if self.mode == "prompt" else hard
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._done.wait(remaining):
+                return
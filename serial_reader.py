@@ -0,0 +1,191 @@
+import re
+import time
+import codecs
+import threading
+
+# CSI 序列（如颜色 \x1b[0;32m）以及其它两字节 ESC 序列
+ANSI_ESCAPE_RE = re.compile(rb'\x1b\[[0-?]*[ -/]*[@-~]|\x1b[@-Z\\-_]')
+READ_CHUNK = 64 * 1024
+
+
+def socket_of(conn):
+    """pyserial socket:// 连接的底层套接字；其它串口返回 None
+
+    socket:// 的 in_waiting 只报告 0/1（套接字是否可读），按它读取会退化为每次 1 字节，
+    因此对这类连接在读到首字节后直接从（非阻塞的）套接字取走已到达的数据。
+    """
+    if type(conn).__module__.endswith("protocol_socket"):
+        return getattr(conn, "_socket", None)
+    return None
+
+
+def read_available(conn, sock=None):
+    """阻塞等待至少 1 字节（最长为串口 timeout），随后一次取走已到达的全部数据"""
+    data = conn.read(conn.in_waiting or 1)
+    if data and sock is not None:
+        try:
+            data += sock.recv(READ_CHUNK)
+        except (BlockingIOError, InterruptedError):
+            pass
+    return data
+
+
+class SerialLineReader:
+    """字节级串口行读取器
+
+    阻塞在 read() 上（由串口 timeout 控制唤醒），数据到达即处理；在 bytearray 上按 \\n 切分，
+    通过增量解码器解码，跨两次读取被截断的多字节 UTF-8 字符不会损坏。
+    每一行回调 on_line(line, received_at)，received_at 为该行数据到达时的 time.time()。
+    flush_partial=True 时，未换行的残余内容（如 shell 提示符）在 partial_quiet 秒内没有新数据到达后
+    才作为一行输出；默认不输出，慢速到达的一行不会被拆成两行。
+    """
+
+    def __init__(self, conn, on_line, strip_ansi=False, encoding="utf-8", flush_partial=False, partial_quiet=1.0):
+        self.conn = conn
+        self.on_line = on_line
+        self.strip_ansi = strip_ansi
+        self.flush_partial = flush_partial
+        self.partial_quiet = partial_quiet
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._buffer = bytearray()
+        self._fed_at = 0.0
+
+    def feed(self, data, received_at=None):
+        """处理一段原始字节，回调其中所有完整的行"""
+        if received_at is None:
+            received_at = time.time()
+        self._fed_at = time.monotonic()
+        buf = self._buffer
+        buf.extend(data)
+        start = 0
+        while True:
+            end = buf.find(b"\n", start)
+            if end < 0:
+                break
+            self._emit(buf[start:end], received_at)
+            start = end + 1
+        if start:
+            del buf[:start]
+
+    def flush(self, received_at=None, final=False):
+        """把尚未以换行结尾的残余数据（如 shell 提示符）作为一行输出
+
+        final=True 表示数据流已结束（如子进程输出 EOF）：解码器中不完整的多字节字符按替换字符输出，不会丢失。
+        """
+        if self._buffer:
+            self._emit(self._buffer, received_at or time.time(), final)
+            self._buffer = bytearray()
+        elif final:
+            tail = self._decoder.decode(b"", final=True)
+            if tail:
+                self.on_line(tail, received_at or time.time())
+
+    def idle(self, received_at=None):
+        """读取超时（没有新数据）时调用：开启 flush_partial 且残余内容已静止 partial_quiet 秒时输出它"""
+        if self.flush_partial and self._buffer and time.monotonic() - self._fed_at >= self.partial_quiet:
+            self.flush(received_at)
+
+    def pending(self):
+        """返回尚未换行的残余内容（不消费），用于提示符检测"""
+        return bytes(self._buffer).decode("utf-8", errors="replace")
+
+    def discard_pending(self):
+        """丢弃尚未换行的残余内容（如已被识别的提示符）"""
+        self._buffer.clear()
+
+    def _emit(self, raw, received_at, final=False):
+        if raw.endswith(b"\r"):
+            raw = raw[:-1]
+        if self.strip_ansi and b"\x1b" in raw:
+            raw = ANSI_ESCAPE_RE.sub(b"", raw)
+        self.on_line(self._decoder.decode(bytes(raw), final), received_at)
+
+    def run(self, is_running):
+        """读取循环，直到 is_running() 为假或串口关闭；串口异常向上抛出"""
+        conn = self.conn
+        sock = socket_of(conn)
+        while is_running() and conn.is_open:
+            data = read_available(conn, sock)
+            if data:
+                self.feed(data)
+            else:
+                self.idle()
+
+
+def _legacy_poll(conn, on_line, is_running):
+    """旧版 _monitor_serial 的轮询方式（仅用于基准对比）"""
+    buffer = ""
+    while is_running():
+        if conn.in_waiting > 0:
+            buffer += conn.read(conn.in_waiting).decode('utf-8', errors='ignore')
+            lines = buffer.split('\n')
+            buffer = lines[-1]
+            for line in lines[:-1]:
+                on_line(line, time.time())
+        time.sleep(0.05)
+
+
+def benchmark_loopback(total_lines=20000, line_bytes=80, probes=100, legacy=False):
+    """用 pyserial 的 loop:// 测量读取吞吐（行/秒）与字节到达至回调的延迟
+
+    吞吐阶段一次性写入 total_lines 行；延迟阶段每 10ms 写入一行带时间戳的探测行。
+    legacy=True 时测量旧版 50ms 轮询实现，便于对比。
+    """
+    import serial
+
+    conn = serial.serial_for_url("loop://", timeout=0.2)
+    filler = b"x" * max(0, line_bytes - 20)
+    received = [0]
+    latencies = []
+    target = [total_lines]
+    done = threading.Event()
+    running = threading.Event()
+    running.set()
+
+    def on_line(line, received_at):
+        if line.startswith("T"):
+            latencies.append(time.perf_counter() - float(line[1:].split()[0]))
+        received[0] += 1
+        if received[0] >= target[0]:
+            done.set()
+
+    if legacy:
+        t = threading.Thread(target=_legacy_poll, args=(conn, on_line, running.is_set), daemon=True)
+    else:
+        reader = SerialLineReader(conn, on_line)
+        t = threading.Thread(target=reader.run, args=(running.is_set,), daemon=True)
+    t.start()
+
+    # 吞吐阶段
+    start = time.perf_counter()
+    conn.write((b"D" + filler + b"\n") * total_lines)
+    done.wait(120)
+    elapsed = time.perf_counter() - start
+
+    # 延迟阶段
+    done.clear()
+    target[0] = received[0] + probes
+    for _ in range(probes):
+        conn.write(f"T{time.perf_counter():.6f} ".encode() + filler + b"\n")
+        time.sleep(0.01)
+    done.wait(10)
+    running.clear()
+    t.join(1)
+    conn.close()
+
+    latencies.sort()
+    return {
+        "mode": "legacy_poll" if legacy else "blocking_read",
+        "lines": total_lines,
+        "seconds": elapsed,
+        "lines_per_sec": total_lines / elapsed if elapsed else 0.0,
+        "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "latency_p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    for legacy in (True, False):
+        r = benchmark_loopback(legacy=legacy)
+        print(f"{r['mode']:>14}: {r['lines_per_sec']:.0f} 行/秒  "
+              f"延迟 p50/p99: {r['latency_p50_ms']:.2f}/{r['latency_p99_ms']:.2f} ms")
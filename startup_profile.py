@@ -0,0 +1,95 @@
+import time
+import threading
+
+# 阶段名 -> 显示名称
+PHASE_LABELS = {
+    "imports": "导入",
+    "window": "创建窗口",
+    "config": "加载配置",
+    "pipeline": "初始化流程",
+    "ui": "构建界面",
+    "history": "日志历史",
+    "mainloop": "首次绘制",
+}
+BACKGROUND_LABELS = {"serial": "串口连接", "adb": "ADB 发现"}
+
+
+class StartupProfile:
+    """启动耗时剖析：按阶段打点，记录到可交互（主循环首次空闲）为止的耗时，以及后台连接完成的时刻
+
+    start 为进程尽早取得的 time.perf_counter()（在导入其它模块之前），各阶段耗时为与上一次打点之差；
+    background 中的时刻均相对 start。expect 中的后台任务都完成且已可交互时，finished() 返回真（只返回一次）。
+    """
+
+    def __init__(self, start=None, expect=("serial", "adb")):
+        self.start = time.perf_counter() if start is None else start
+        self.started_at = time.time() - (time.perf_counter() - self.start)
+        self.expect = tuple(expect)
+        self.phases = []            # [(阶段, 秒)]
+        self.background = {}        # 后台任务 -> 距启动秒数
+        self.interactive = None     # 距启动秒数
+        self._last = self.start
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def mark_interactive(self):
+        """主线程首次空闲时调用"""
+        self.mark("mainloop")
+        self.interactive = time.perf_counter() - self.start
+        return self.finished()
+
+    def mark_background(self, name):
+        """后台任务完成时调用（任意线程，只记录第一次）"""
+        with self._lock:
+            self.background.setdefault(name, time.perf_counter() - self.start)
+        return self.finished()
+
+    def finished(self):
+        with self._lock:
+            if self._reported or self.interactive is None or any(n not in self.background for n in self.expect):
+                return False
+            self._reported = True
+            return True
+
+    def record(self):
+        return {"time": self.started_at, "interactive": _round(self.interactive),
+                "phases": {name: _round(seconds) for name, seconds in self.phases},
+                "background": {name: _round(seconds) for name, seconds in self.background.items()}}
+
+    def report(self):
+        """一行文字：可交互耗时、各阶段耗时（从长到短）与后台连接完成时刻"""
+        phases = ", ".join(f"{PHASE_LABELS.get(name, name)} {seconds * 1000:.0f}ms"
+                           for name, seconds in sorted(self.phases, key=lambda p: -p[1]))
+        text = (f"启动 {self.interactive * 1000:.0f}ms 可交互" if self.interactive is not None
+                else f"启动 {(self._last - self.start) * 1000:.0f}ms") + f"（{phases}）"
+        if self.background:
+            text += "；后台: " + ", ".join(f"{BACKGROUND_LABELS.get(name, name)} {seconds * 1000:.0f}ms"
+                                           for name, seconds in sorted(self.background.items(), key=lambda b: b[1]))
+        return text
+
+    def save(self, path):
+        """把本次结果追加到结果文件（每行一条 JSON），返回与历史结果的对比说明"""
+        # 启动剖析在导入阶段计时，结果文件读写与对比沿用 boot_timing（连同 statistics）按需导入
+        from boot_timing import append_result
+
+        record = self.record()
+        return compare(record, append_result(path, record))
+
+
+def _round(seconds):
+    return None if seconds is None else round(seconds, 4)
+
+
+def compare(record, previous, window=10):
+    """本次可交互耗时与上一次、最近 window 次中位数的对比"""
+    from boot_timing import trend
+
+    if record["interactive"] is None:
+        return ""
+    history = [r["interactive"] for r in previous if r.get("interactive") is not None]
+    return trend(record["interactive"], history, window, scale=1000, unit="ms", digits=0)
@@ -0,0 +1,110 @@
+import os
+import re
+import time
+import signal
+import locale
+import threading
+import subprocess
+
+from serial_reader import SerialLineReader
+
+# 本地命令前缀：@tee=logcat.txt 把输出同时写入文件，@timeout=秒 设置超时（默认不限时）
+PREFIX_RE = re.compile(r"^@(tee|timeout)=(\S+)\s+")
+
+
+def split_prefixes(cmd):
+    """解析命令前缀，返回 (选项 dict, 命令)"""
+    options = {}
+    while True:
+        m = PREFIX_RE.match(cmd)
+        if not m:
+            return options, cmd
+        options[m.group(1)] = m.group(2)
+        cmd = cmd[m.end():]
+
+
+class StreamingCommand:
+    """流式执行本地命令：增量读取子进程输出，逐行回调，可同时写入文件，可取消
+
+    输出不在内存中累积；stderr 合并进 stdout。timeout 为 None 时不限时。
+    cancel() 可在任意时刻（包括 run() 启动子进程之前）调用，已取消时 run() 不再启动子进程并返回 None。
+    """
+
+    def __init__(self, cmd, on_line, tee_path=None, timeout=None, cwd=None):
+        self.cmd = cmd
+        self.on_line = on_line
+        self.tee_path = tee_path
+        self.timeout = timeout
+        self.cwd = cwd
+        self.proc = None
+        self.cancelled = False
+        self.timed_out = False
+        self.bytes_read = 0
+        self.lines = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()   # 保护 cancelled 与 proc，取消请求不会落在启动子进程的间隙里
+
+    def run(self):
+        """阻塞执行直到子进程结束，返回退出码；启动前已取消时返回 None"""
+        # 独立进程组，取消时可连同 shell 派生的 adb 子进程一起结束
+        kwargs = {} if os.name == "nt" else {"start_new_session": True}
+        start = time.perf_counter()
+        with self._lock:
+            if self.cancelled:
+                return None
+            self.proc = subprocess.Popen(self.cmd, shell=True, cwd=self.cwd, stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs)
+        timer = None
+        if self.timeout:
+            timer = threading.Timer(self.timeout, self._on_timeout)
+            timer.daemon = True
+            timer.start()
+        tee = open(self.tee_path, "ab") if self.tee_path else None
+        # 与原 text=True 一致，按本地编码解码（Windows 中文系统为 GBK）
+        reader = SerialLineReader(None, self._emit, encoding=locale.getpreferredencoding(False))
+        try:
+            stream = self.proc.stdout
+            while True:
+                chunk = stream.read1(65536)
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                if tee:
+                    tee.write(chunk)
+                reader.feed(chunk)
+            reader.flush(final=True)
+            return self.proc.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            if tee:
+                tee.close()
+            self.proc.stdout.close()
+            self.elapsed = time.perf_counter() - start
+
+    def _emit(self, line, received_at):
+        self.lines += 1
+        self.on_line(line)
+
+    def _on_timeout(self):
+        self.timed_out = True
+        self._kill()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            self._kill()
+
+    def _kill(self):
+        """结束整个进程组（shell=True 时只杀 shell 会留下 adb 子进程）"""
+        proc = self.proc
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            if os.name == "nt":
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                os.killpg(proc.pid, signal.SIGTERM)
+        except Exception:
+            proc.kill()
@@ -0,0 +1,69 @@
+import tarfile
+
+import pytest
+
+from artifact_collector import ArtifactCollector, split_groups, _safe_member
+
+
+def test_split_groups_balances_sizes():
+    files = [(100, "big"), (60, "a"), (50, "b"), (40, "c"), (10, "d")]
+    groups = split_groups(files, 2)
+    sizes = dict((rel, size) for size, rel in files)
+    totals = sorted(sum(sizes[rel] for rel in group) for group in groups)
+    assert totals == [120, 140]
+    assert sorted(rel for group in groups for rel in group) == sorted(sizes)
+
+
+def test_split_groups_drops_empty_groups():
+    assert split_groups([(5, "only")], 3) == [["only"]]
+    assert split_groups([], 3) == []
+
+
+def member(name, kind=tarfile.REGTYPE):
+    info = tarfile.TarInfo(name)
+    info.type = kind
+    return info
+
+
+@pytest.mark.parametrize("info, expected", [
+    (member("tombstone_00"), True),
+    (member("anr/trace.txt"), True),
+    (member("anr", tarfile.DIRTYPE), True),
+    (member("/etc/passwd"), False),
+    (member("../outside"), False),
+    (member("a/../../outside"), False),
+    (member("link", tarfile.SYMTYPE), False),
+    (member("dev", tarfile.CHRTYPE), False),
+])
+def test_safe_member(info, expected):
+    assert _safe_member(info) is expected
+
+
+class FailingDevice:
+    """设备替身：列出两个大文件，推送清单成功，传输连接失败"""
+
+    def __init__(self):
+        self.pushed = []
+        self.removed = []
+        self.sync = self
+
+    def shell(self, cmd, timeout=None):
+        if cmd.startswith("rm -f "):
+            self.removed.extend(cmd.split()[2:])
+            return ""
+        return "100 /data/logs/a.log\n100 /data/logs/b.log\n__CDT_RC__0\n"
+
+    def push(self, data, path, mode=None):
+        self.pushed.append(path)
+
+    def open_transport(self):
+        raise OSError("transport closed")
+
+
+def test_listings_removed_when_transfer_fails(tmp_path):
+    device = FailingDevice()
+    collector = ArtifactCollector(lambda: device, str(tmp_path), streams=2, split_bytes=50)
+    results = collector.collect([{"name": "logs", "path": "/data/logs"}])
+    assert results[0].error == "transport closed"
+    assert len(device.pushed) == 2
+    assert sorted(device.removed) == sorted(device.pushed)
@@ -0,0 +1,40 @@
+import threading
+
+from boot_timing import BootTimer, ADB_OFFLINE, ADB_READY, BOOT_COMPLETED
+from link_supervisor import LinkSupervisor
+
+
+class Client:
+    """adb 替身：上下线只能来自 track-devices 推送，轮询 device_list() 即失败"""
+
+    def device_list(self):
+        raise AssertionError("device_list() polled while track-devices is available")
+
+    def device(self, serial=None):
+        return self
+
+    def shell(self, cmd, timeout=None):
+        return "1\n"
+
+
+def test_wait_boot_uses_tracked_device_state():
+    tracker = LinkSupervisor()
+    tracker.adb_tracking = True
+    tracker._adb_update("car1", "device")
+    timer = BootTimer(timeout=5)
+    timer.begin()
+    threading.Timer(0.2, tracker._adb_update, ("car1", "absent")).start()
+    threading.Timer(0.4, tracker._adb_update, ("car1", "device")).start()
+    assert timer.wait_boot(Client(), "car1", tracker=tracker)
+    assert 0.15 < timer.marks[ADB_OFFLINE] < timer.marks[ADB_READY] <= timer.marks[BOOT_COMPLETED]
+    assert timer.marks[ADB_READY] < 1.0
+    tracker.close()
+
+
+def test_wait_adb_change_wakes_on_update():
+    tracker = LinkSupervisor()
+    version = tracker.adb_version
+    assert not tracker.wait_adb_change(version, 0.05)
+    threading.Timer(0.05, tracker._adb_update, ("car1", "device")).start()
+    assert tracker.wait_adb_change(version, 2)
+    tracker.close()
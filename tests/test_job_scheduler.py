@@ -0,0 +1,86 @@
+import threading
+
+from job_scheduler import JobScheduler, DONE, FAILED, CANCELLED, QUEUED, RUNNING
+
+
+def test_same_resource_runs_in_submit_order():
+    jobs = JobScheduler()
+    order = []
+    gate = threading.Event()
+
+    def step(n):
+        def run():
+            if n == 0:
+                gate.wait(2)
+            order.append(n)
+        return run
+
+    submitted = [jobs.submit(f"step{n}", step(n), ("serial",)) for n in range(4)]
+    assert [j.state for j in submitted] == [RUNNING, QUEUED, QUEUED, QUEUED]
+    gate.set()
+    assert jobs.wait_idle(5)
+    assert order == [0, 1, 2, 3]
+    assert all(j.state == DONE for j in submitted)
+
+
+def test_different_resources_run_in_parallel():
+    jobs = JobScheduler()
+    both = threading.Barrier(2, timeout=2)
+    serial = jobs.submit("serial", both.wait, ("serial",))
+    adb = jobs.submit("adb", both.wait, ("adb",))
+    assert jobs.wait_idle(5)
+    assert serial.state == DONE and adb.state == DONE
+
+
+def test_later_job_does_not_jump_the_queue():
+    jobs = JobScheduler()
+    gate = threading.Event()
+    order = []
+    jobs.submit("serial", lambda: gate.wait(2), ("serial",))
+    both = jobs.submit("both", lambda: order.append("both"), ("serial", "adb"))
+    adb = jobs.submit("adb", lambda: order.append("adb"), ("adb",))
+    # adb 空闲，但更早的 both 在等 adb，后提交的任务不能插队
+    assert both.state == QUEUED and adb.state == QUEUED
+    gate.set()
+    assert jobs.wait_idle(5)
+    assert order == ["both", "adb"]
+
+
+def test_failure_states():
+    jobs = JobScheduler()
+
+    def boom():
+        raise RuntimeError("no device")
+
+    failed = jobs.submit("false", lambda: False)
+    raised = jobs.submit("raise", boom)
+    assert jobs.wait_idle(5)
+    assert failed.state == FAILED
+    assert raised.state == FAILED and raised.error == "no device"
+
+
+def test_cancel_queued_and_running():
+    events = []
+    jobs = JobScheduler(on_event=lambda msg, resources: events.append(msg))
+    release = threading.Event()
+    running = jobs.submit("long", lambda: release.wait(2), ("adb",), on_cancel=release.set)
+    queued = jobs.submit("next", lambda: events.append("ran"), ("adb",))
+    assert jobs.cancel(queued.id)
+    assert queued.state == CANCELLED
+    assert jobs.cancel(running.id)
+    assert jobs.wait_idle(5)
+    assert running.state == CANCELLED
+    assert "ran" not in events
+    assert not jobs.cancel(running.id)
+
+
+def test_unique_ignores_duplicate():
+    jobs = JobScheduler()
+    gate = threading.Event()
+    first = jobs.submit("auto-connect", lambda: gate.wait(2), ("serial",), unique=True)
+    assert jobs.submit("auto-connect", lambda: None, ("serial",), unique=True) is None
+    gate.set()
+    assert jobs.wait_idle(5)
+    assert first.state == DONE
+    assert jobs.submit("auto-connect", lambda: None, ("serial",), unique=True) is not None
+    assert jobs.wait_idle(5)
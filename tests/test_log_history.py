@@ -0,0 +1,63 @@
+import os
+import time
+
+from log_history import LogHistory, remove_stale
+
+
+def fill(history, lines, batch=10):
+    for b in range(0, lines, batch):
+        history.append([f"line {i} 温度" for i in range(b, min(lines, b + batch))])
+
+
+def test_reads_beyond_ring_come_from_disk(tmp_path):
+    history = LogHistory(str(tmp_path / "s.history"), ring_size=10, index_stride=4)
+    fill(history, 100)
+    assert history.tail(2) == ["line 98 温度", "line 99 温度"]
+    assert history.get_lines(5, 3) == ["line 5 温度", "line 6 温度", "line 7 温度"]
+    assert history.read_bytes(0, 2) == "line 0 温度\nline 1 温度\n".encode("utf-8")
+    history.close()
+
+
+def test_multiline_message_counts_each_line(tmp_path):
+    history = LogHistory(str(tmp_path / "s.history"), ring_size=1)
+    history.append(["a\nb", "c"])
+    assert len(history) == 3
+    assert history.get_lines(0, 3) == ["a", "b", "c"]
+    history.close()
+
+
+def test_max_bytes_keeps_two_segments_and_drops_oldest_lines(tmp_path):
+    history = LogHistory(str(tmp_path / "s.history"), ring_size=10, index_stride=4, max_bytes=2000)
+    fill(history, 500)
+    first = history.first_line
+    assert 0 < first < 500
+    assert history.get_lines(0, 2) == [f"line {first} 温度", f"line {first + 1} 温度"]
+    data = history.read_bytes(first, len(history)).decode("utf-8").split("\n")[:-1]
+    assert data == [f"line {i} 温度" for i in range(first, 500)]
+    assert history.line_range()[0] == first
+    # 写入线程删除旧段是异步的，稍等后段文件最多两个
+    deadline = time.time() + 5
+    while len(os.listdir(tmp_path)) > 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert len(os.listdir(tmp_path)) <= 2
+    history.close()
+
+
+def test_close_removes_segments(tmp_path):
+    history = LogHistory(str(tmp_path / "s.history"), ring_size=10, index_stride=4, max_bytes=2000)
+    fill(history, 500)
+    history.get_lines(history.first_line, 5)
+    history.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_remove_stale_keeps_recent_files(tmp_path):
+    old = tmp_path / "serial_20240101-000000.history"
+    old.write_bytes(b"x\n")
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    recent = tmp_path / "serial_20240101-000001.history.64"
+    recent.write_bytes(b"y\n")
+    other = tmp_path / "serial.log"
+    other.write_bytes(b"z\n")
+    assert remove_stale(str(tmp_path), "serial") == 1
+    assert sorted(os.listdir(tmp_path)) == ["serial.log", "serial_20240101-000001.history.64"]
@@ -0,0 +1,76 @@
+import pytest
+
+from log_history import LogHistory
+from log_search import LogIndex, LogQuery, regex_literals
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    (r"FATAL EXCEPTION", ["FATAL", "EXCEPTION"]),
+    (r"pid=\d+ crashed", ["pid", "crashed"]),
+    (r"err x{100}", ["err"]),
+    (r"abc{2,5}def", ["def"]),
+    (r"colou?r", ["colo"]),
+    (r"[abc]wxyz*", ["wxy"]),
+    (r"(abc)?defg", []),
+    (r"foo|barbaz", []),
+    (r"(?i)kernel", []),
+    (r"\x41BCD", ["BCD"]),
+    (r"\u00e9cole", ["cole"]),
+    (r"\N{DEGREE SIGN}Celsius", ["Celsius"]),
+    (r"\0123abc", ["3abc"]),
+    (r"\\x41BCD", ["x41BCD"]),
+])
+def test_regex_literals(pattern, expected):
+    assert regex_literals(pattern) == expected
+
+
+@pytest.fixture
+def index(tmp_path):
+    history = LogHistory(str(tmp_path / "serial.history"), ring_size=100)
+    lines = [f"line {i} routine binder" for i in range(2000)]
+    lines[150] = "avc: denied { read } for pid=42"
+    lines[1500] = "err xxxxxxxxxx"
+    history.append(lines)
+    index = LogIndex(history, block_lines=256)
+    index.index_pending()
+    yield index
+    history.close(remove=True)
+
+
+def test_indexed_search_finds_literal_and_skips_blocks(index):
+    result = index.search(LogQuery("AVC: denied"))
+    assert [n for n, _ in result.lines] == [150]
+    assert result.scanned_blocks < result.total_blocks
+
+
+def test_regex_quantifier_digits_do_not_hide_matches(index):
+    result = index.search(LogQuery(r"err x{10}", regex=True))
+    assert [n for n, _ in result.lines] == [1500]
+
+
+def test_newest_first_limit(index):
+    result = index.search(LogQuery("routine"), limit=5, newest_first=True)
+    assert [n for n, _ in result.lines] == [1995, 1996, 1997, 1998, 1999]
+    assert result.truncated
+    assert result.end == 2000
+
+
+@pytest.mark.parametrize("text, regex", [
+    ("ärger", False),
+    (r"温.正常", True),
+    (r"[温湿]度 ÄRGER", True),
+    (r"ärger", True),
+])
+def test_history_search_matches_live_filter_on_non_ascii(tmp_path, text, regex):
+    history = LogHistory(str(tmp_path / "serial.history"), ring_size=10)
+    lines = [f"line {i}" for i in range(600)]
+    lines[10] = "温度 ÄRGER 温x正常"
+    lines[500] = "湿度 Ärger 温度正常"
+    history.append(lines)
+    index = LogIndex(history, block_lines=256)
+    index.index_pending()
+    query = LogQuery(text, regex=regex)
+    live = [n for n, line in enumerate(lines) if query.match_line(line)]
+    assert live
+    assert [n for n, _ in index.search(query).lines] == live
+    history.close()
@@ -0,0 +1,64 @@
+import pytest
+
+from logcat_capture import LogcatFilter, LogcatFormatError, LogcatParser, LogcatCapture, build_entry
+
+
+def entries(count, sec=1700000000, tag="CarService"):
+    return [build_entry(100, 200, sec, i * 1000000, 4, tag, f"msg {i}") for i in range(count)]
+
+
+def test_entry_split_across_chunks():
+    parser = LogcatParser()
+    data = b"".join(entries(3))
+    lines = []
+    for i in range(0, len(data), 7):
+        lines += parser.feed(data[i:i + 7])
+    assert [line.split(": ", 1)[1] for line in lines] == ["msg 0", "msg 1", "msg 2"]
+    assert parser.entries == 3
+    assert " I CarService: " in lines[0]
+
+
+@pytest.mark.parametrize("version", [1, 2, 4])
+def test_header_versions(version):
+    parser = LogcatParser()
+    lines = parser.feed(build_entry(1, 2, 1700000000, 0, 6, "Tag", "boom", version=version))
+    assert len(lines) == 1 and lines[0].endswith(" E Tag: boom")
+
+
+def test_multiline_message_repeats_header():
+    parser = LogcatParser()
+    lines = parser.feed(build_entry(1, 2, 1700000000, 0, 4, "Tag", "a\nb"))
+    assert [line.split(": ", 1)[1] for line in lines] == ["a", "b"]
+
+
+def test_filter_by_tag_priority_and_pid():
+    parser = LogcatParser(LogcatFilter(tags="Keep,-Drop", min_priority="W", pids="7"))
+    data = (build_entry(7, 1, 1, 0, 5, "Keep", "ok") + build_entry(7, 1, 1, 0, 4, "Keep", "low")
+            + build_entry(8, 1, 1, 0, 6, "Keep", "pid") + build_entry(7, 1, 1, 0, 6, "Other", "tag"))
+    lines = parser.feed(data)
+    assert [line.split(": ", 1)[1] for line in lines] == ["ok"]
+    assert parser.entries == 4 and parser.kept == 1
+
+
+def test_garbage_header_raises():
+    with pytest.raises(LogcatFormatError):
+        LogcatParser().feed(b"\xff\xff\x05\x00" + b"\0" * 30)
+
+
+def test_reconnect_discards_partial_entry_and_skips_repeated_entries():
+    parser = LogcatParser()
+    first = entries(4)
+    # 连接在第 3 条条目中途断开
+    lines = parser.feed(first[0] + first[1] + first[2][:9])
+    assert len(lines) == 2
+    # 新连接以 -T 从最后一条的时刻重新输出（含最后一条本身）
+    parser.reset(parser.last_time)
+    lines = parser.feed(first[1] + first[2] + first[3])
+    assert [line.split(": ", 1)[1] for line in lines] == ["msg 2", "msg 3"]
+    assert parser.entries == 4
+
+
+def test_resume_command_uses_last_timestamp():
+    capture = LogcatCapture(None, "unused", buffers="main,crash")
+    assert capture.command() == "logcat -B -b main -b crash *:V"
+    assert capture.command((1700000000, 123456789)) == "logcat -B -b main -b crash -T 1700000000.123 *:V"
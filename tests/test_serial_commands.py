@@ -0,0 +1,126 @@
+import time
+import threading
+
+import pytest
+
+from serial_commands import SerialCommandEngine, split_timeout
+
+
+class FakeShell:
+    """模拟串口另一端的 shell：回显收到的每行命令，按 respond(cmd) 返回的 [(延迟秒, 字节)] 输出"""
+
+    def __init__(self, respond, timeout=0.05):
+        self.respond = respond
+        self.timeout = timeout
+        self.is_open = True
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            return len(self._buf)
+
+    def read(self, n=1):
+        with self._cond:
+            if not self._buf:
+                self._cond.wait(self.timeout)
+            data = bytes(self._buf[:n])
+            del self._buf[:n]
+            return data
+
+    def write(self, data):
+        for cmd in data.decode().splitlines():
+            self.feed(cmd.encode() + b"\r\n")
+            for delay, out in self.respond(cmd):
+                if delay:
+                    threading.Timer(delay, self.feed, (out,)).start()
+                else:
+                    self.feed(out)
+
+    def feed(self, data):
+        with self._cond:
+            self._buf += data
+            self._cond.notify_all()
+
+    def close(self):
+        self.is_open = False
+
+
+def sh(outputs, code=0, marker_delay=0):
+    """sh 兼容的 shell：普通命令输出 outputs[cmd]，echo 标记命令输出带退出码的标记"""
+    def respond(cmd):
+        if cmd.startswith("echo __CDT_"):
+            marker = cmd[len("echo "):].replace("''", "").replace("$?", str(code))
+            return [(marker_delay, marker.encode() + b"\r\n")]
+        return [(0, outputs.get(cmd, b""))]
+    return respond
+
+
+@pytest.fixture
+def start():
+    engines = []
+
+    def start(respond, **kwargs):
+        shell = FakeShell(respond)
+        background = []
+        engine = SerialCommandEngine(shell, lambda line, ts: background.append(line), **kwargs)
+        running = [True]
+        thread = threading.Thread(target=engine.run, args=(lambda: running[0],), daemon=True)
+        thread.start()
+        engines.append((running, thread))
+        return engine, shell, background
+
+    yield start
+    for running, thread in engines:
+        running[0] = False
+        thread.join(1)
+
+
+def test_split_timeout():
+    assert split_timeout("@timeout=60 dmesg") == (60.0, "dmesg")
+    assert split_timeout("dmesg") == (None, "dmesg")
+
+
+def test_sentinel_output_and_exit_code(start):
+    engine, _, background = start(sh({"ls": b"a\r\nb\r\n"}, code=2), mode="sentinel")
+    r = engine.execute("ls", timeout=2)
+    assert r.completed
+    assert r.exit_code == 2
+    assert r.lines == ["a", "b"]
+    assert background == []
+
+
+def test_only_own_sentinels_are_dropped(start):
+    engine, shell, background = start(sh({}, marker_delay=0.5), mode="sentinel")
+    r = engine.execute("slow", timeout=0.2)
+    assert not r.completed
+    shell.feed(b"user text __CDT_9__ kept\r\n")
+    time.sleep(0.7)
+    # 超时命令迟到的标记被丢弃，其它含 __CDT_ 的行照常进入后台日志
+    assert background == ["user text __CDT_9__ kept"]
+
+
+def test_prompt_detected_without_waiting_for_timeout(start):
+    engine, _, background = start(sh({"uname": b"Linux\r\n/ # "}))
+    r = engine.execute("uname", timeout=5)
+    assert r.completed
+    assert r.lines == ["Linux"]
+    assert r.elapsed < 2
+
+
+def test_prompt_mode_timeout_extends_while_output_arrives(start):
+    trickle = [(0.3 * i, f"line {i}\r\n".encode()) for i in range(1, 6)]
+    engine, _, background = start(lambda cmd: trickle if cmd == "dmesg" else [])
+    r = engine.execute("dmesg", timeout=0.6)
+    assert not r.completed
+    assert r.lines == [f"line {i}" for i in range(1, 6)]
+    assert background == []
+
+
+def test_prompt_mode_total_wait_capped_by_max_wait(start):
+    endless = [(0.1 * i, b"tick\r\n") for i in range(1, 30)]
+    engine, _, _ = start(lambda cmd: endless if cmd == "top" else [], max_wait=0.8)
+    r = engine.execute("top", timeout=0.5)
+    assert not r.completed
+    assert 0.7 < r.elapsed < 1.5
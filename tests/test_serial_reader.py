@@ -0,0 +1,92 @@
+import time
+import threading
+
+import serial
+
+from serial_reader import SerialLineReader
+
+
+def collect(**kwargs):
+    lines = []
+    reader = SerialLineReader(None, lambda line, ts: lines.append(line), **kwargs)
+    return reader, lines
+
+
+def test_split_utf8_character_across_reads():
+    reader, lines = collect()
+    data = "温度正常\n".encode("utf-8")
+    reader.feed(data[:2])
+    reader.feed(data[2:5])
+    reader.feed(data[5:])
+    assert lines == ["温度正常"]
+
+
+def test_final_flush_keeps_truncated_character():
+    reader, lines = collect()
+    reader.feed("温度".encode("utf-8")[:5])
+    reader.flush(final=True)
+    assert lines == ["温\ufffd"]
+
+
+def test_final_flush_with_local_encoding():
+    reader, lines = collect(encoding="gbk")
+    reader.feed("正常\n".encode("gbk") + "温".encode("gbk")[:1])
+    reader.flush(final=True)
+    assert lines == ["正常", "\ufffd"]
+
+
+def test_crlf_and_multiple_lines_in_one_chunk():
+    reader, lines = collect()
+    reader.feed(b"first\r\nsecond\nthi")
+    assert lines == ["first", "second"]
+    reader.feed(b"rd\r\n")
+    assert lines == ["first", "second", "third"]
+
+
+def test_strip_ansi():
+    reader, lines = collect(strip_ansi=True)
+    reader.feed(b"\x1b[0;32mOK\x1b[0m\n")
+    assert lines == ["OK"]
+
+
+def test_partial_line_kept_by_default():
+    reader, lines = collect()
+    reader.feed(b"slow li")
+    reader.idle()
+    assert lines == []
+    assert reader.pending() == "slow li"
+    reader.feed(b"ne\n")
+    assert lines == ["slow line"]
+
+
+def test_partial_flushed_only_after_quiet_period():
+    reader, lines = collect(flush_partial=True, partial_quiet=0.05)
+    reader.feed(b"root@car:/ # ")
+    reader.idle()
+    assert lines == []
+    time.sleep(0.06)
+    reader.idle()
+    assert lines == ["root@car:/ # "]
+
+
+def test_run_over_loopback_keeps_slow_line_whole():
+    conn = serial.serial_for_url("loop://", timeout=0.05)
+    lines = []
+    reader = SerialLineReader(conn, lambda line, ts: lines.append(line))
+    running = threading.Event()
+    running.set()
+    thread = threading.Thread(target=reader.run, args=(running.is_set,), daemon=True)
+    thread.start()
+    try:
+        data = "车速 42 km/h\r\n".encode("utf-8")
+        conn.write(data[:4])
+        time.sleep(0.2)   # 超过多个读取超时
+        conn.write(data[4:] + b"next\n")
+        deadline = time.time() + 2
+        while len(lines) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        running.clear()
+        thread.join(1)
+        conn.close()
+    assert lines == ["车速 42 km/h", "next"]
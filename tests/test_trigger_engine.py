@@ -0,0 +1,95 @@
+import pytest
+
+from debugger_core import DEFAULT_CONFIG, DebugPipeline
+from trigger_engine import Trigger, TriggerMatcher, load_triggers, trie_pattern
+
+
+def names(matcher, line):
+    return [t.name for t in matcher.match(line)]
+
+
+def test_trie_pattern_matches_every_word():
+    import re
+    words = ["panic", "pan", "watchdog", "oops"]
+    pattern = re.compile(trie_pattern(words))
+    for word in words:
+        assert pattern.search(f"xx {word} yy").group(0) == word
+    assert pattern.search("nothing here") is None
+
+
+def test_literals_and_regexes_in_one_pass():
+    matcher = TriggerMatcher([Trigger("oom", "Out of memory"), Trigger("oops", "Oops"),
+                              Trigger("bug", r"re:BUG: \w+ lockup")])
+    assert names(matcher, "Out of memory: Killed process 123") == ["oom"]
+    assert names(matcher, "BUG: soft lockup - CPU#1 stuck") == ["bug"]
+    assert names(matcher, "Oops: Out of memory") == ["oom", "oops"]
+    assert names(matcher, "all good") == []
+
+
+def test_backreference_rule_matched_separately():
+    matcher = TriggerMatcher([Trigger("dup", r"re:(\w+) \1"), Trigger("lit", "hello")])
+    assert matcher.standalone and matcher.standalone[0].name == "dup"
+    assert names(matcher, "again again") == ["dup"]
+    assert names(matcher, "hello world") == ["lit"]
+
+
+def test_ignore_case_only_for_that_rule():
+    matcher = TriggerMatcher([Trigger("any", "fatal", ignore_case=True), Trigger("exact", "Crash")])
+    assert names(matcher, "FATAL error") == ["any"]
+    assert names(matcher, "crash") == []
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("[  12.345] Kernel panic - not syncing: Fatal exception", ["Kernel panic"]),
+    ("watchdog: Watchdog detected hard LOCKUP on cpu 2", ["watchdog"]),
+    ("[   5.0] msm_watchdog: bark", ["watchdog"]),
+    ("F DEBUG   : Tombstone written to: /data/tombstones/tombstone_03", ["tombstone"]),
+    ("[   1.2] watchdog: watchdog0: registered as /dev/watchdog", []),
+    ("I tombstoned: cleaning up old tombstone files", []),
+    ("echo Kernel panic test", []),
+])
+def test_default_signatures(line, expected):
+    assert names(TriggerMatcher(load_triggers(DEFAULT_CONFIG)), line) == expected
+
+
+def test_trigger_file(tmp_path):
+    path = tmp_path / "triggers.txt"
+    path.write_text("# 注释\nAudioFlinger died\nanr | re:ANR in \\S+ | snapshot; adb:dumpsys activity\n",
+                    encoding="utf-8")
+    config = dict(DEFAULT_CONFIG, triggers=[], trigger_file=str(path))
+    triggers = load_triggers(config)
+    assert [t.name for t in triggers] == ["AudioFlinger died", "anr"]
+    assert triggers[1].regex and triggers[1].actions == ["snapshot", "adb:dumpsys activity"]
+    assert names(TriggerMatcher(triggers), "ANR in com.car.launcher") == ["anr"]
+
+
+def test_inline_global_flags_do_not_break_combined_pattern():
+    matcher = TriggerMatcher([Trigger("oops", "re:(?i)oops"), Trigger("lit", "panic")])
+    assert names(matcher, "OOPS: kernel") == ["oops"]
+    assert names(matcher, "panic") == ["lit"]
+
+
+def test_duplicate_group_names_do_not_break_combined_pattern():
+    matcher = TriggerMatcher([Trigger("died", r"re:pid (?P<pid>\d+) died"),
+                              Trigger("crashed", r"re:(?P<pid>\d+) crashed"), Trigger("lit", "panic")])
+    assert names(matcher, "pid 12 died") == ["died"]
+    assert names(matcher, "12 crashed") == ["crashed"]
+    assert names(matcher, "panic") == ["lit"]
+
+
+def test_serial_monitor_starts_with_uncombinable_triggers(tmp_path):
+    logs = []
+    config = dict(DEFAULT_CONFIG, log_dir=str(tmp_path), auto_connect=False, triggers=[
+        {"name": "oops", "pattern": "re:(?i)oops"},
+        {"name": "a", "pattern": r"re:pid (?P<pid>\d+) died"},
+        {"name": "b", "pattern": r"re:(?P<pid>\d+) crashed"},
+    ])
+    pipeline = DebugPipeline(config, logs.append, logs.append)
+    try:
+        assert pipeline.connect_serial("loop://", 115200)
+        assert pipeline.serial_running and pipeline.serial_thread.is_alive()
+        assert pipeline.trigger_engine is not None
+        pipeline.trigger_engine.feed("OOPS here")
+        assert pipeline.trigger_engine.matcher.triggers[0].hits == 1
+    finally:
+        pipeline.close()
@@ -0,0 +1,317 @@
+import os
+import re
+import time
+import queue
+import shlex
+import threading
+from collections import deque
+
+# 以 re: 开头的模式按正则处理，其余按字面子串匹配
+_REGEX_PREFIX = "re:"
+_BACKREF_RE = re.compile(r"\\\d|\(\?P=")
+# 内联全局标志（如 (?i)）只能位于整个正则开头，不能放进合并的分支里
+_GLOBAL_FLAGS_RE = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+class Trigger:
+    """一条触发规则：模式（字面子串，或以 re: 开头的正则）+ 动作列表
+
+    动作：snapshot 保存匹配行前后的日志；adb:<命令> 在车机执行 shell 命令并保存输出；
+    pull:<设备路径> 拉取文件/目录（如 /data/tombstones）。
+    """
+
+    def __init__(self, name, pattern, actions=("snapshot",), cooldown=60.0, ignore_case=False):
+        self.name = name
+        self.regex = pattern.startswith(_REGEX_PREFIX)
+        self.source = pattern[len(_REGEX_PREFIX):] if self.regex else pattern
+        self.actions = [a.strip() for a in actions if a.strip()]
+        self.cooldown = float(cooldown)
+        self.ignore_case = ignore_case
+        flags = re.IGNORECASE if ignore_case else 0
+        self.compiled = re.compile(self.source if self.regex else re.escape(self.source), flags)
+        self.last_fired = None
+        self.hits = 0
+        self.suppressed = 0
+
+    def search(self, line):
+        return self.compiled.search(line) is not None
+
+
+def trie_pattern(words):
+    """把一组字面串编译成前缀树形状的正则：每个位置只沿一条分支匹配，效果接近 Aho-Corasick"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # 某个字面串在此结束，后续字符可有可无（贪婪，优先匹配更长的串）
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class TriggerMatcher:
+    """把全部规则合并为一个正则，每行只扫描一遍；命中后再逐条核对具体是哪些规则"""
+
+    def __init__(self, triggers):
+        self.triggers = list(triggers)
+        literals = {t.source.lower() if t.ignore_case else t.source
+                    for t in self.triggers if not t.regex and t.source}
+        # 含分组、反向引用或内联全局标志的正则合并后会改变含义或无法编译（组名重复等），单独匹配
+        self.standalone = [t for t in self.triggers if t.regex and _standalone(t)]
+        parts = [f"(?:{t.source})" for t in self.triggers if t.regex and t not in self.standalone]
+        if literals:
+            parts.insert(0, trie_pattern(literals))
+        flags = re.IGNORECASE if any(t.ignore_case for t in self.triggers) else 0
+        try:
+            self.combined = re.compile("|".join(parts), flags) if parts else None
+        except re.error:
+            # 兜底：合并失败时全部规则逐条匹配，不影响串口监控
+            self.combined = None
+            self.standalone = list(self.triggers)
+
+    def match(self, line):
+        """返回该行命中的全部规则（绝大多数行只经过一次合并正则就返回空列表）"""
+        hit = self.combined is not None and self.combined.search(line) is not None
+        if not hit and not self.standalone:
+            return []
+        candidates = self.triggers if hit else self.standalone
+        return [t for t in candidates if t.search(line)]
+
+
+def _standalone(trigger):
+    """该正则规则能否放进合并的分支：已单独编译成功（见 Trigger），这里只看合并后会出问题的结构"""
+    return bool(trigger.compiled.groups or _BACKREF_RE.search(trigger.source)
+                or _GLOBAL_FLAGS_RE.search(trigger.source))
+
+
+def load_triggers(config):
+    """由配置得到规则列表：config["triggers"] 中的规则 + trigger_file 中每行一条的签名
+
+    trigger_file 每行格式：模式，或 名称 | 模式 | 动作1; 动作2（# 开头为注释），模式以 re: 开头表示正则。
+    """
+    cooldown = float(config["trigger_cooldown"])
+    default_actions = [a for a in config["trigger_default_actions"].split(";") if a.strip()]
+    triggers = []
+    for item in config["triggers"]:
+        actions = item.get("actions", default_actions)
+        if isinstance(actions, str):
+            actions = actions.split(";")
+        triggers.append(Trigger(item.get("name") or item["pattern"], item["pattern"], actions,
+                                item.get("cooldown", cooldown), bool(item.get("ignore_case", False))))
+    path = config["trigger_file"]
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                fields = [p.strip() for p in line.split("|")]
+                if len(fields) == 1:
+                    triggers.append(Trigger(fields[0], fields[0], default_actions, cooldown))
+                else:
+                    actions = fields[2].split(";") if len(fields) > 2 and fields[2] else default_actions
+                    triggers.append(Trigger(fields[0], fields[1], actions, cooldown))
+    return triggers
+
+
+class _Capture:
+    def __init__(self, trigger, before, line, received_at):
+        self.trigger = trigger
+        self.before = before
+        self.line = line
+        self.received_at = received_at
+        self.after = []
+
+
+class TriggerEngine:
+    """串口触发器：逐行匹配（在读取线程中，只做匹配与入队），动作在独立工作线程中执行
+
+    命中后先继续收集 after_lines 行（最多等待 after_seconds 秒），再执行动作，
+    结果保存到 log_dir/triggers/<时间>_<规则名>/。限流：每条规则有冷却时间，
+    所有规则合计每分钟最多执行 max_per_minute 次，期间的命中只计数不执行。
+    """
+
+    def __init__(self, triggers, log_dir, device_factory=None, on_event=None, context_lines=50,
+                 after_lines=20, after_seconds=5.0, max_per_minute=6):
+        self.matcher = TriggerMatcher(triggers)
+        self.log_dir = os.path.join(log_dir, "triggers")
+        self.device_factory = device_factory
+        self.on_event = on_event
+        self.after_lines = after_lines
+        self.after_seconds = after_seconds
+        self.max_per_minute = max_per_minute
+        self.lines_seen = 0
+
+        self._before = deque(maxlen=context_lines)
+        self._pending = []
+        self._fired = deque()          # 最近一分钟内执行动作的时间
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="TriggerEngine", daemon=True)
+        self._thread.start()
+
+    def _event(self, msg):
+        if self.on_event:
+            self.on_event(msg)
+
+    def feed(self, line, received_at=None):
+        """读取线程回调：记录上下文、匹配规则（不做任何 I/O）"""
+        if received_at is None:
+            received_at = time.time()
+        with self._lock:
+            self.lines_seen += 1
+            if self._pending:
+                for capture in self._pending:
+                    capture.after.append(line)
+                self._collect_ready(received_at)
+            for trigger in self.matcher.match(line):
+                self._on_match(trigger, line, received_at)
+            self._before.append(line)
+
+    def _on_match(self, trigger, line, now):
+        trigger.hits += 1
+        if trigger.last_fired is not None and now - trigger.last_fired < trigger.cooldown:
+            trigger.suppressed += 1
+            return
+        while self._fired and now - self._fired[0] >= 60:
+            self._fired.popleft()
+        if len(self._fired) >= self.max_per_minute:
+            trigger.suppressed += 1
+            return
+        trigger.last_fired = now
+        self._fired.append(now)
+        self._pending.append(_Capture(trigger, list(self._before), line, now))
+
+    def _collect_ready(self, now):
+        """把后续行已收集够（或等待超时）的命中交给工作线程"""
+        ready = [c for c in self._pending
+                 if len(c.after) >= self.after_lines or now - c.received_at >= self.after_seconds]
+        for capture in ready:
+            self._pending.remove(capture)
+            self._jobs.put(capture)
+
+    def _worker(self):
+        while True:
+            try:
+                capture = self._jobs.get(timeout=0.5)
+            except queue.Empty:
+                # 设备没有后续输出（如已死机）时，按超时把命中交出去
+                with self._lock:
+                    self._collect_ready(time.time())
+                continue
+            if capture is None:
+                return
+            try:
+                self._run_actions(capture)
+            except Exception as e:
+                self._event(f"[✗] 触发器动作失败 ({capture.trigger.name}): {e}")
+
+    def _run_actions(self, capture):
+        trigger = capture.trigger
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(capture.received_at))
+        safe_name = re.sub(r"[^\w.-]+", "_", trigger.name)[:40]
+        folder = base = os.path.join(self.log_dir, f"{stamp}_{safe_name}")
+        n = 1
+        while os.path.exists(folder):
+            n += 1
+            folder = f"{base}-{n}"
+        os.makedirs(folder)
+        suppressed = f"（冷却/限流期间另有 {trigger.suppressed} 次命中）" if trigger.suppressed else ""
+        trigger.suppressed = 0
+        self._event(f"[⚠] 触发 [{trigger.name}]: {capture.line.strip()}{suppressed}")
+        saved = []
+        for action in trigger.actions:
+            kind, _, arg = action.partition(":")
+            kind = kind.strip().lower()
+            arg = arg.strip()
+            try:
+                if kind == "snapshot":
+                    path = os.path.join(folder, "context.log")
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write("\n".join(capture.before + [capture.line] + capture.after) + "\n")
+                    saved.append(path)
+                elif kind == "adb":
+                    output = self._device().shell(arg, timeout=60)
+                    name = re.sub(r"[^\w.-]+", "_", arg)[:40] or "shell"
+                    path = os.path.join(folder, f"adb_{name}.txt")
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(output + "\n")
+                    saved.append(path)
+                elif kind == "pull":
+                    saved.extend(self._pull(arg, folder))
+                else:
+                    self._event(f"[⚠] 未知的触发器动作: {action}")
+            except Exception as e:
+                self._event(f"[✗] 动作 {action} 失败: {e}")
+        self._event(f"[ℹ] 已保存 {len(saved)} 个文件到 {folder}")
+
+    def _device(self):
+        if self.device_factory is None:
+            raise RuntimeError("未配置 ADB 设备")
+        return self.device_factory()
+
+    def _pull(self, remote, folder):
+        """拉取设备上的文件或目录（目录只拉取第一层文件）"""
+        d = self._device()
+        names = d.shell(f"ls -1 {shlex.quote(remote)} 2>/dev/null").splitlines()
+        # ls 单个文件时输出其自身路径
+        if names == [remote]:
+            names = [os.path.basename(remote)]
+            remote = os.path.dirname(remote)
+        saved = []
+        for name in names:
+            name = name.strip()
+            if not name:
+                continue
+            local = os.path.join(folder, name)
+            d.sync.pull(f"{remote.rstrip('/')}/{name}", local)
+            saved.append(local)
+        return saved
+
+    def close(self):
+        with self._lock:
+            self._collect_ready(float("inf"))
+        self._jobs.put(None)
+        self._thread.join(5)
+
+    def stats(self):
+        return {"lines": self.lines_seen,
+                "hits": {t.name: t.hits for t in self.matcher.triggers if t.hits}}
+
+
+def benchmark(lines=200000, signatures=200):
+    """比较逐条正则与合并匹配的速率（行/秒）"""
+    import random
+    rng = random.Random(3)
+    words = ["init", "binder", "vold", "audio", "hal", "service", "started", "ok", "done", "thermal"]
+    triggers = [Trigger(f"sig{i}", f"SIG{i:03d}_{rng.choice(words)}_{rng.getrandbits(24):06x}") for i in range(signatures)]
+    triggers += [Trigger("panic", "Kernel panic"), Trigger("wd", "watchdog"),
+                 Trigger("tomb", r"re:tombstone_\d+")]
+    text = [f"[{i * 0.001:10.3f}] " + " ".join(rng.choice(words) for _ in range(10)) for i in range(lines)]
+    for i in range(0, lines, 10000):
+        text[i] += " Kernel panic - not syncing"
+
+    start = time.perf_counter()
+    naive = sum(1 for line in text for t in triggers if t.compiled.search(line))
+    naive_s = time.perf_counter() - start
+    matcher = TriggerMatcher(triggers)
+    start = time.perf_counter()
+    combined = sum(len(matcher.match(line)) for line in text)
+    combined_s = time.perf_counter() - start
+    return {"triggers": len(triggers), "lines": lines, "hits": combined,
+            "naive_lines_per_s": lines / naive_s, "combined_lines_per_s": lines / combined_s,
+            "speedup": naive_s / combined_s}
+
+
+if __name__ == "__main__":
+    r = benchmark()
+    print(f"{r['triggers']} 条规则, {r['lines']} 行: 逐条匹配 {r['naive_lines_per_s']:.0f} 行/s, "
+          f"合并匹配 {r['combined_lines_per_s']:.0f} 行/s ({r['speedup']:.0f}x), 命中 {r['hits']}")